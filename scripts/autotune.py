@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import argparse
+import itertools
+import platform
+import time
+from datetime import datetime
+
+import torch
+from stable_baselines3.common.callbacks import BaseCallback
+
+# Add parent directory to path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+from scripts.train_snake import (
+    BATCH_SIZE, GRID_SIZE, N_STEPS, OBSERVATION_DTYPE, OBSERVATION_MODE, TUNED_CONFIG_FILE, WINDOW_SIZE,
+    make_model, make_vec_env,
+)
+
+# Process-based environments with more processes than this per core are not tried
+MAX_PROCESSES_PER_CORE = 2
+
+class RolloutTimer(BaseCallback):
+    """Collection and update time of each rollout (the update runs between two rollouts)."""
+
+    def __init__(self):
+        super().__init__(verbose=0)
+        self.rollouts = []
+        self._start = None
+        self._start_steps = 0
+        self._end = None
+
+    def _close_update(self):
+        if self._end is not None:
+            self.rollouts[-1]["update_seconds"] = time.perf_counter() - self._end
+            self._end = None
+
+    def _on_rollout_start(self) -> None:
+        self._close_update()
+        self._start = time.perf_counter()
+        self._start_steps = self.num_timesteps
+
+    def _on_rollout_end(self) -> None:
+        self._end = time.perf_counter()
+        self.rollouts.append({
+            "steps": self.num_timesteps - self._start_steps,
+            "collect_seconds": self._end - self._start,
+            "update_seconds": None,
+        })
+
+    def _on_training_end(self) -> None:
+        self._close_update()
+
+    def _on_step(self) -> bool:
+        return True
+
+def get_default_grid(cpu_count):
+    """Env counts, vec env types, torch threads and minibatch sizes tried by default."""
+    threads = sorted({1, max(1, cpu_count // 4), max(1, cpu_count // 2), cpu_count})
+    return {
+        "n_envs": [12, 32, 64, 128],
+        "vec_env_types": ["batched", "shared"],
+        "torch_threads": threads,
+        "batch_sizes": [BATCH_SIZE, 1024],
+    }
+
+def get_trials(grid, cpu_count, observation_mode):
+    """Configurations of the grid worth trying on this machine."""
+    trials = []
+    for n_envs, vec_env_type, torch_threads, batch_size in itertools.product(
+        grid["n_envs"], grid["vec_env_types"], grid["torch_threads"], grid["batch_sizes"]
+    ):
+        # One process per environment: oversubscribing the cores only adds context switches
+        if vec_env_type != "batched" and n_envs > MAX_PROCESSES_PER_CORE * cpu_count:
+            continue
+        # VecSnakeEnv has no egocentric observation
+        if vec_env_type == "batched" and observation_mode == "egocentric":
+            continue
+        trials.append({"n_envs": n_envs, "vec_env_type": vec_env_type, "torch_threads": torch_threads,
+                       "batch_size": batch_size})
+    return trials
+
+def run_trial(config, trial_n_steps, rollouts, device):
+    """
+    Trains a new model for 1 + rollouts rollouts of trial_n_steps steps per environment (the first one
+    warms up and is not measured), returns the throughput of the measured ones.
+    """
+    torch.set_num_threads(config["torch_threads"])
+    env = make_vec_env(config["n_envs"], config["vec_env_type"], OBSERVATION_MODE, OBSERVATION_DTYPE,
+                       GRID_SIZE, WINDOW_SIZE)
+    try:
+        model = make_model(
+            env, OBSERVATION_MODE, OBSERVATION_DTYPE,
+            n_steps=trial_n_steps, batch_size=config["batch_size"], learning_rate=1e-4, ent_coef=0.01,
+            verbose=0, device=device,
+        )
+        timer = RolloutTimer()
+        model.learn(total_timesteps=trial_n_steps * config["n_envs"] * (rollouts + 1), callback=timer)
+    finally:
+        env.close()
+
+    measured = timer.rollouts[1:]
+    steps = sum(rollout["steps"] for rollout in measured)
+    collect_seconds = sum(rollout["collect_seconds"] for rollout in measured)
+    update_seconds = sum(rollout["update_seconds"] for rollout in measured)
+    return {
+        **config,
+        "collect_steps_per_second": steps / collect_seconds,
+        # Update time per 1000 collected steps: comparable across env counts
+        "update_seconds_per_1k_steps": 1000 * update_seconds / steps,
+        "steps_per_second": steps / (collect_seconds + update_seconds),
+    }
+
+def format_trial(result):
+    return (f"{result['n_envs']:>6} {result['vec_env_type']:>8} {result['torch_threads']:>7} "
+            f"{result['batch_size']:>6} {result['collect_steps_per_second']:>12.0f} "
+            f"{result['update_seconds_per_1k_steps']:>12.3f} {result['steps_per_second']:>10.0f}")
+
+if __name__ == "__main__":
+    cpu_count = os.cpu_count() or 1
+    default_grid = get_default_grid(cpu_count)
+
+    parser = argparse.ArgumentParser(description="Find the fastest training settings for this machine")
+    parser.add_argument("--n_envs", type=int, nargs="+", default=default_grid["n_envs"],
+                        help="Numbers of environments")
+    parser.add_argument("--vec_env_types", nargs="+", choices=["batched", "subproc", "shared"],
+                        default=default_grid["vec_env_types"], help="Vectorized environment types")
+    parser.add_argument("--torch_threads", type=int, nargs="+", default=default_grid["torch_threads"],
+                        help="Numbers of torch threads")
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=default_grid["batch_sizes"],
+                        help="Minibatch sizes")
+    parser.add_argument("--trial_n_steps", type=int, default=256,
+                        help="Steps per environment of each timed rollout (training uses N_STEPS)")
+    parser.add_argument("--rollouts", type=int, default=2, help="Timed rollouts per trial (after a warm-up one)")
+    parser.add_argument("--output", type=str, default=TUNED_CONFIG_FILE,
+                        help="Configuration file loaded by train_snake.py")
+    args = parser.parse_args()
+
+    grid = {"n_envs": args.n_envs, "vec_env_types": args.vec_env_types, "torch_threads": args.torch_threads,
+            "batch_sizes": args.batch_sizes}
+    trials = get_trials(grid, cpu_count, OBSERVATION_MODE)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"{len(trials)} trials on {cpu_count} cores ({device}), "
+          f"{OBSERVATION_MODE} {OBSERVATION_DTYPE} observations of a {GRID_SIZE[0]}x{GRID_SIZE[1]} grid")
+    print(f"{'envs':>6} {'vec env':>8} {'threads':>7} {'batch':>6} {'collect/s':>12} {'update/1k':>12} "
+          f"{'steps/s':>10}")
+
+    results = []
+    for config in trials:
+        try:
+            result = run_trial(config, args.trial_n_steps, args.rollouts, device)
+        except Exception as e:
+            print(f"Trial {config} failed: {e}")
+            continue
+        results.append(result)
+        print(format_trial(result))
+
+    if not results:
+        print("No trial succeeded.")
+        sys.exit(1)
+
+    best = max(results, key=lambda result: result["steps_per_second"])
+    print(f"\nBest: {format_trial(best)}")
+
+    tuned = {
+        "n_envs": best["n_envs"],
+        "vec_env_type": best["vec_env_type"],
+        "torch_threads": best["torch_threads"],
+        "batch_size": best["batch_size"],
+        "n_steps": N_STEPS,
+        "steps_per_second": best["steps_per_second"],
+        "machine": {
+            "cpu_count": cpu_count,
+            "processor": platform.processor() or platform.machine(),
+            "device": device,
+            "torch": torch.__version__,
+        },
+        "observation": {"mode": OBSERVATION_MODE, "dtype": OBSERVATION_DTYPE, "grid_size": list(GRID_SIZE)},
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "trials": sorted(results, key=lambda result: -result["steps_per_second"]),
+    }
+    with open(args.output, "w") as f:
+        json.dump(tuned, f, indent=2)
+    print(f"Configuration saved to {args.output}, loaded by scripts/train_snake.py")
@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import numpy as np
+
+# Add parent path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+from src.core.game import game
+from src.rl.snake_env import SnakeEnv
+
+GRID_SIZES = [10, 20, 40]
+# Snake lengths as a fraction of the cells (0 = initial snake of 3 cells)
+SNAKE_FILLS = [0, 0.5, 0.9]
+BENCHMARKS = ["move", "place_food", "check_collision", "step", "reset", "get_observation", "reward"]
+PERCENTILES = [50, 90, 99]
+
+def hamiltonian_cycle(width, height):
+    """
+    Cells of a cycle going through the whole grid (height must be even).
+
+    Row 0 from left to right, then rows 1 to height - 1 in zigzag over
+    columns 1 to width - 1, then back up column 0. A snake following it never
+    collides, so long snakes can be benchmarked on any number of steps.
+    """
+    assert height % 2 == 0, "The cycle needs an even number of rows"
+    cycle = [(x, 0) for x in range(width)]
+    for y in range(1, height):
+        columns = range(width - 1, 0, -1) if y % 2 else range(1, width)
+        cycle.extend((x, y) for x in columns)
+    cycle.extend((0, y) for y in range(height - 1, 0, -1))
+    return cycle
+
+def cycle_action(cycle, index):
+    """Action moving the head from cycle[index] to the next cell of the cycle."""
+    (x, y), (next_x, next_y) = cycle[index % len(cycle)], cycle[(index + 1) % len(cycle)]
+    # 0: up, 1: down, 2: left, 3: right
+    return {(0, -1): 0, (0, 1): 1, (-1, 0): 2, (1, 0): 3}[(next_x - x, next_y - y)]
+
+def set_long_snake(g, cycle, length):
+    """Lays a snake of length cells (head included) along the cycle, returns the cycle index of the head."""
+    head = length - 1
+    body = [cycle[index] for index in range(head - 1, -1, -1)]
+    g.set_snake(cycle[head], body)
+    g.update_snake()
+    return head
+
+def get_snake_length(size, fill):
+    return max(3, int(size * size * fill))
+
+def time_calls(run, setup, samples):
+    """
+    Times samples batches of calls.
+
+    :param run: Function running a batch on the state returned by setup, returns the number of calls.
+    :param setup: Function preparing an untimed state for each sample.
+    :return: Per-call times in seconds of each sample and the total number of calls.
+    """
+    times = []
+    total_calls = 0
+    for _ in range(samples):
+        state = setup()
+        start = time.perf_counter_ns()
+        calls = run(state)
+        elapsed = time.perf_counter_ns() - start
+        times.append(elapsed / calls * 1e-9)
+        total_calls += calls
+    return np.array(times), total_calls
+
+def make_benchmark(name, size, length, batch):
+    """Returns the (setup, run) functions of a benchmark on a size x size grid with a snake of length cells."""
+    cycle = hamiltonian_cycle(size, size)
+    # Moves allowed before the snake could fill the grid
+    safe_moves = max(1, min(batch, size * size - length - 1))
+
+    if name in ("move", "place_food", "check_collision"):
+        def setup():
+            g = game(size, size, seed=0)
+            g.init_grid()
+            head = set_long_snake(g, cycle, length)
+            # The actions are computed before timing, only the calls are measured
+            return g, [cycle_action(cycle, index) for index in range(head, head + safe_moves)]
+
+        if name == "move":
+            def run(state):
+                g, actions = state
+                for action in actions:
+                    g.move(action)
+                return len(actions)
+        elif name == "place_food":
+            def run(state):
+                g, _ = state
+                for _ in range(batch):
+                    g.place_food()
+                return batch
+        else:
+            def run(state):
+                g, _ = state
+                headx, heady = g.snakehead
+                for _ in range(batch // 4):
+                    g.check_collision(headx, heady - 1)
+                    g.check_collision(headx, heady + 1)
+                    g.check_collision(headx - 1, heady)
+                    g.check_collision(headx + 1, heady)
+                return batch // 4 * 4
+        return setup, run
+
+    env = SnakeEnv(grid_size=(size, size))
+
+    def setup():
+        env.reset(seed=0)
+        if name == "reset":
+            return None
+        head = set_long_snake(env.game, cycle, length)
+        env.previous_food_eaten = len(env.game.snake)
+        env.clear_visited()
+        return [cycle_action(cycle, index) for index in range(head, head + safe_moves)]
+
+    if name == "step":
+        def run(actions):
+            for action in actions:
+                env.step(action)
+            return len(actions)
+    elif name == "reward":
+        # Distance before and after the move and visited cells, without the move and the observation
+        def run(actions):
+            for _ in actions:
+                env._get_food_distance()
+                env._get_food_distance()
+                env._visit_head()
+            return len(actions)
+    elif name == "reset":
+        def run(_):
+            for _ in range(batch):
+                env.reset()
+            return batch
+    else:
+        out = np.zeros((11, size, size), dtype=env.observation_dtype)
+
+        def run(_):
+            for _ in range(batch):
+                env._get_observation(out=out)
+            return batch
+    return setup, run
+
+def run_benchmarks(grid_sizes, snake_fills, benchmarks, samples, batch):
+    results = []
+    for size in grid_sizes:
+        lengths = sorted({get_snake_length(size, fill) for fill in snake_fills})
+        for name in benchmarks:
+            # reset always starts from the initial snake
+            for length in ([3] if name == "reset" else lengths):
+                setup, run = make_benchmark(name, size, length, batch)
+                # Warm up
+                time_calls(run, setup, 2)
+                times, calls = time_calls(run, setup, samples)
+                result = {
+                    "benchmark": name,
+                    "grid_size": size,
+                    "snake_length": length,
+                    "calls": calls,
+                    "calls_per_second": float(1 / np.average(times)),
+                    "mean_us": float(times.mean() * 1e6),
+                }
+                for percentile in PERCENTILES:
+                    result[f"p{percentile}_us"] = float(np.percentile(times, percentile) * 1e6)
+                results.append(result)
+                print(format_result(result))
+    return results
+
+def format_result(result):
+    percentiles = " ".join(f"{result[f'p{percentile}_us']:>9.2f}" for percentile in PERCENTILES)
+    return (f"{result['benchmark']:>16} {result['grid_size']:>5} {result['snake_length']:>7} "
+            f"{result['calls_per_second']:>14.0f} {percentiles}")
+
+def result_key(result):
+    return result["benchmark"], result["grid_size"], result["snake_length"]
+
+def compare(results, baseline, threshold):
+    """
+    Compares the median time per call with a baseline.
+
+    :return: List of (result, baseline result, ratio) slower than the baseline by more than threshold.
+    """
+    baseline_results = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+    print(f"\n{'benchmark':>16} {'grid':>5} {'length':>7} {'base p50':>10} {'p50':>10} {'change':>8}")
+    for result in results:
+        base = baseline_results.get(result_key(result))
+        if base is None:
+            continue
+        ratio = result["p50_us"] / base["p50_us"]
+        flag = "  REGRESSION" if ratio > 1 + threshold else ""
+        print(f"{result['benchmark']:>16} {result['grid_size']:>5} {result['snake_length']:>7} "
+              f"{base['p50_us']:>10.2f} {result['p50_us']:>10.2f} {ratio - 1:>+8.1%}{flag}")
+        if flag:
+            regressions.append((result, base, ratio))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the game engine and the environment hot paths.")
+    parser.add_argument("--grid_sizes", type=int, nargs="+", default=GRID_SIZES, help="Grid sizes (even).")
+    parser.add_argument("--snake_fills", type=float, nargs="+", default=SNAKE_FILLS,
+                        help="Snake lengths as a fraction of the cells (0 = initial snake).")
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=BENCHMARKS,
+                        help="Benchmarks to run.")
+    parser.add_argument("--samples", type=int, default=200, help="Number of timed batches per benchmark.")
+    parser.add_argument("--batch", type=int, default=100, help="Calls per timed batch.")
+    parser.add_argument("--output", type=str, default="benchmark_engine.json", help="JSON file of the results.")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="Results of a previous run to compare with (exit code 1 on regression).")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Slowdown of the median time per call flagged as a regression.")
+    args = parser.parse_args()
+
+    print(f"{'benchmark':>16} {'grid':>5} {'length':>7} {'calls/s':>14} "
+          + " ".join(f"{f'p{percentile} (us)':>9}" for percentile in PERCENTILES))
+    results = run_benchmarks(args.grid_sizes, args.snake_fills, args.benchmarks, args.samples, args.batch)
+
+    with open(args.output, "w") as file:
+        json.dump({
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "samples": args.samples,
+            "batch": args.batch,
+            "results": results,
+        }, file, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+            sys.exit(1)
+        print("\nNo regression")
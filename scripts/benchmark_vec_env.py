@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+# Add parent path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+from src.rl.snake_env import SnakeEnv
+
+VEC_ENV_TYPES = ["subproc", "shared"]
+
+def make_env(rank):
+    """Creates a Snake environment with a specific seed."""
+    def _init():
+        env = SnakeEnv(grid_size=(10, 10), copy_observations=False)
+        env.seed(rank)
+        return env
+    return _init
+
+def benchmark(vec_env_type, n_envs, n_steps):
+    """Measures the number of environment steps per second of a vectorized environment."""
+    # Imported here: worker processes re-import this script and should not load torch for nothing
+    from stable_baselines3.common.vec_env import SubprocVecEnv
+    from src.rl.shared_memory_vec_env import SharedMemoryVecEnv
+
+    vec_env_class = SubprocVecEnv if vec_env_type == "subproc" else SharedMemoryVecEnv
+    env = vec_env_class([make_env(i) for i in range(n_envs)])
+    env.reset()
+    actions = np.random.default_rng(0).integers(0, 4, size=(n_steps, n_envs))
+
+    # Warm up
+    for step in range(min(100, n_steps)):
+        env.step(actions[step])
+
+    start = time.perf_counter()
+    for step in range(n_steps):
+        env.step(actions[step])
+    elapsed = time.perf_counter() - start
+
+    env.close()
+    return n_steps * n_envs / elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare SubprocVecEnv and SharedMemoryVecEnv throughput.")
+    parser.add_argument("--n_envs", type=int, nargs="+", default=[12, 24, 48], help="Numbers of workers.")
+    parser.add_argument("--n_steps", type=int, default=2000, help="Number of vectorized steps per run.")
+    parser.add_argument("--types", nargs="+", choices=VEC_ENV_TYPES, default=VEC_ENV_TYPES,
+                        help="Vectorized environments to compare.")
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'type':>8} {'steps/s':>12}")
+    for n_envs in args.n_envs:
+        for vec_env_type in args.types:
+            steps_per_second = benchmark(vec_env_type, n_envs, args.n_steps)
+            print(f"{n_envs:>8} {vec_env_type:>8} {steps_per_second:>12.0f}")
@@ -0,0 +1,204 @@
+import copy
+import os
+import queue
+import re
+import threading
+import traceback
+
+from stable_baselines3.common.save_util import save_to_zip_file
+
+CHECKPOINT_PATTERN = re.compile(r"^model_(\d+)_steps\.zip$")
+
+def snapshot_model(model):
+    """
+    Copy in memory of what model.save writes (same exclusions as BaseAlgorithm.save).
+
+    Copying the parameters is fast; the slow part (pickling, torch.save and
+    zip) can then run in another thread while training goes on.
+    """
+    data = model.__dict__.copy()
+    exclude = set(model._excluded_save_params())
+    state_dicts_names, torch_variable_names = model._get_torch_save_params()
+    for name in state_dicts_names + torch_variable_names:
+        exclude.add(name.split(".")[0])
+    for name in exclude:
+        data.pop(name, None)
+
+    pytorch_variables = None
+    if torch_variable_names:
+        pytorch_variables = {name: copy.deepcopy(getattr(model, name)) for name in torch_variable_names}
+
+    return copy.deepcopy(data), copy.deepcopy(model.get_parameters()), pytorch_variables
+
+class RetentionPolicy:
+    def __init__(self, max_total_gb=None, keep_every=None, keep_best=0, keep_last=1):
+        """
+        Which checkpoints are kept once the checkpoint folder exceeds max_total_gb.
+
+        :param max_total_gb: Maximum size of the checkpoints in GB (None = keep everything).
+        :param keep_every: Checkpoints whose number of steps is a multiple of keep_every are never removed.
+        :param keep_best: Number of checkpoints with the best scores (see CheckpointWriter.set_score) never removed.
+        :param keep_last: Number of most recent checkpoints never removed.
+        """
+        self.max_total_gb = max_total_gb
+        self.keep_every = keep_every
+        self.keep_best = keep_best
+        self.keep_last = keep_last
+
+    def select_removals(self, sizes, scores, protected=()):
+        """
+        Checkpoints to remove, oldest first, until the total size fits in max_total_gb.
+
+        :param sizes: Size in bytes of each checkpoint, by number of steps.
+        :param scores: Score of the evaluated checkpoints, by number of steps.
+        :param protected: Other checkpoints never removed (e.g. keyframes of delta-encoded checkpoints).
+        :return: Numbers of steps of the checkpoints to remove.
+        """
+        if self.max_total_gb is None:
+            return []
+
+        steps = sorted(sizes)
+        protected = set(protected)
+        if self.keep_last > 0:
+            protected.update(steps[-self.keep_last:])
+        if self.keep_every:
+            protected.update(step for step in steps if step % self.keep_every == 0)
+        if self.keep_best > 0:
+            evaluated = sorted((step for step in steps if step in scores), key=scores.get, reverse=True)
+            protected.update(evaluated[:self.keep_best])
+
+        excess = sum(sizes.values()) - self.max_total_gb * 1024 ** 3
+        removals = []
+        for step in steps:
+            if excess <= 0:
+                break
+            if step not in protected:
+                removals.append(step)
+                excess -= sizes[step]
+        return removals
+
+class CheckpointWriter:
+    def __init__(self, save_path, retention=None, max_pending=2, verbose=1, store=None, resumable_every=None,
+                 delta=False):
+        """
+        Writes checkpoints in a background thread and applies a retention policy.
+
+        save() only snapshots the model; the checkpoint is written by the thread. At most
+        max_pending snapshots wait in memory: beyond that save() blocks until
+        one is written. The size of the checkpoints is tracked as they are written
+        and removed, the folder is only listed once at startup.
+
+        :param save_path: Folder of the checkpoints (model_<steps>_steps.zip).
+        :param retention: RetentionPolicy applied after each write (None = keep everything).
+        :param max_pending: Maximum number of snapshots waiting to be written.
+        :param verbose: Verbosity level (0 = silent, 1 = display removals and errors).
+        :param store: CheckpointStore the checkpoints are written to instead of SB3 zips in save_path (optional).
+        :param resumable_every: With a store, checkpoints whose number of steps is a multiple of
+            resumable_every keep the optimizer state (None = none, 1 = all).
+        :param delta: With a store, delta-encode the weights (see CheckpointStore).
+        """
+        self.store = store
+        self.save_path = store.folder if store else save_path
+        self.retention = retention or RetentionPolicy()
+        self.verbose = verbose
+        self.resumable_every = resumable_every
+        self.delta = delta
+        self.scores = {}
+        self.lock = threading.Lock()
+
+        # Existing checkpoints, e.g. when a training is resumed
+        self.sizes = {}
+        if store:
+            for entry in store.entries():
+                self.sizes[entry["steps"]] = entry["bytes"]
+                if entry["score"] is not None:
+                    self.scores[entry["steps"]] = entry["score"]
+        else:
+            for entry in os.scandir(save_path):
+                match = CHECKPOINT_PATTERN.match(entry.name)
+                if match:
+                    self.sizes[int(match.group(1))] = entry.stat().st_size
+
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def get_path(self, steps):
+        if self.store:
+            return self.store.get_path(steps)
+        return os.path.join(self.save_path, f"model_{steps}_steps.zip")
+
+    @property
+    def total_bytes(self):
+        with self.lock:
+            return sum(self.sizes.values())
+
+    def save(self, model, steps):
+        """Snapshot the model and queue it, returns the path the checkpoint will be written to."""
+        self.queue.put((steps, snapshot_model(model)))
+        return self.get_path(steps)
+
+    def set_score(self, steps, score):
+        """Score of a checkpoint (higher is better), used by RetentionPolicy.keep_best."""
+        with self.lock:
+            self.scores[steps] = score
+            written = steps in self.sizes
+        if self.store and written:
+            self.store.set_score(steps, score)
+
+    def close(self):
+        """Wait until every queued checkpoint is written."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            steps, (data, params, pytorch_variables) = item
+            path = self.get_path(steps)
+            try:
+                if self.store:
+                    resumable = bool(self.resumable_every) and steps % self.resumable_every == 0
+                    entry = self.store.write(steps, data, params, pytorch_variables, resumable, self.delta)
+                    with self.lock:
+                        self.sizes[steps] = entry["bytes"]
+                        score = self.scores.get(steps)
+                    if score is not None:
+                        self.store.set_score(steps, score)
+                else:
+                    # Written under a temporary name so a crash never leaves a truncated checkpoint
+                    with open(path + ".tmp", "wb") as file:
+                        save_to_zip_file(file, data=data, params=params, pytorch_variables=pytorch_variables)
+                    os.replace(path + ".tmp", path)
+                    with self.lock:
+                        self.sizes[steps] = os.path.getsize(path)
+                self._prune()
+            except Exception:
+                if self.verbose > 0:
+                    print(f"Error while writing checkpoint {path}:\n{traceback.format_exc()}")
+
+    def _prune(self):
+        removals = True
+        while removals:
+            # The keyframes of delta-encoded checkpoints are needed to read them, a keyframe whose
+            # checkpoints were all removed can go at the next iteration
+            keyframes = {entry["base"] for entry in self.store.entries()} if self.store else set()
+            with self.lock:
+                removals = self.retention.select_removals(dict(self.sizes), dict(self.scores), keyframes)
+            for steps in removals:
+                if self.store:
+                    self.store.remove(steps)
+                else:
+                    os.remove(self.get_path(steps))
+                with self.lock:
+                    del self.sizes[steps]
+                if self.verbose > 0:
+                    print(f"Removed checkpoint {self.get_path(steps)} (retention policy)")
+
+        max_total_gb = self.retention.max_total_gb
+        if max_total_gb is not None and self.total_bytes > max_total_gb * 1024 ** 3 and self.verbose > 0:
+            print(f"Warning: the protected checkpoints alone exceed {max_total_gb} GB "
+                  f"({self.total_bytes / 1024 ** 3:.2f} GB).")
@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import argparse
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+# Add parent directory to path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+from scripts.train_snake import make_model, make_vec_env
+
+class TargetApplesCallback(BaseCallback):
+    def __init__(self, target_apples, window=100):
+        """
+        Stops the training once the mean apples of the last window training episodes reach target_apples.
+
+        :param target_apples: Mean apples per episode to reach.
+        :param window: Number of finished episodes in the mean.
+        """
+        super().__init__(verbose=0)
+        self.target_apples = target_apples
+        self.apples = deque(maxlen=window)
+        self.start = None
+        self.reached = None  # (seconds, steps, episodes) when the target was reached
+        self.episodes = 0
+
+    def _on_training_start(self):
+        self.start = perf_counter()
+
+    def _on_step(self) -> bool:
+        infos = self.locals["infos"]
+        for index in np.flatnonzero(self.locals["dones"]):
+            self.apples.append(infos[index].get("apples_eaten", 0))
+            self.episodes += 1
+        if len(self.apples) == self.apples.maxlen and np.mean(self.apples) >= self.target_apples:
+            self.reached = (perf_counter() - self.start, self.num_timesteps, self.episodes)
+            return False
+        return True
+
+def run(action_masking, args):
+    """Trains until the target or the step budget, returns the time, steps and episodes to the target."""
+    env = make_vec_env(args.n_envs, args.vec_env, args.observation_mode, args.observation_dtype)
+    model = make_model(
+        env, args.observation_mode, args.observation_dtype, action_masking,
+        n_steps=args.n_steps, batch_size=args.batch_size, learning_rate=1e-4, ent_coef=0.01,
+        seed=args.seed, verbose=0, device="cpu",
+    )
+    callback = TargetApplesCallback(args.target_apples, args.window)
+    model.learn(total_timesteps=args.max_steps, callback=callback)
+    env.close()
+
+    result = {
+        "action_masking": action_masking,
+        "reached": callback.reached is not None,
+        "seconds": callback.reached[0] if callback.reached else perf_counter() - callback.start,
+        "steps": callback.reached[1] if callback.reached else model.num_timesteps,
+        "episodes": callback.reached[2] if callback.reached else callback.episodes,
+        "final_mean_apples": float(np.mean(callback.apples)) if callback.apples else 0.0,
+    }
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the wall-clock time to reach a mean apple count with and without action masking"
+    )
+    # A masked random policy already eats a few apples per episode, the target must be above that
+    parser.add_argument("--target_apples", type=float, default=10.0,
+                        help="Mean apples of the last --window training episodes to reach")
+    parser.add_argument("--window", type=int, default=100, help="Number of training episodes in the mean")
+    parser.add_argument("--max_steps", type=int, default=5_000_000, help="Step budget of each run")
+    parser.add_argument("--n_envs", type=int, default=12, help="Number of environments")
+    parser.add_argument("--vec_env", choices=["batched", "subproc", "shared"], default="batched",
+                        help="Type of vectorized environment")
+    parser.add_argument("--observation_mode", choices=["full", "compact"], default="full")
+    parser.add_argument("--observation_dtype", choices=["float32", "uint8"], default="float32")
+    parser.add_argument("--n_steps", type=int, default=4096, help="Steps per environment and rollout")
+    parser.add_argument("--batch_size", type=int, default=256, help="Mini-batch size")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the models")
+    parser.add_argument("--output", type=str, default=None, help="JSON file for the results")
+    args = parser.parse_args()
+
+    results = []
+    for action_masking in (False, True):
+        print(f"Training {'MaskablePPO' if action_masking else 'PPO'} "
+              f"until {args.target_apples} apples (at most {args.max_steps:,} steps)...")
+        results.append(run(action_masking, args))
+
+    print("\n| Algorithm   | Target reached | Time (s) | Env steps  | Episodes | Mean apples |")
+    print("|-------------|----------------|----------|------------|----------|-------------|")
+    for result in results:
+        name = "MaskablePPO" if result["action_masking"] else "PPO"
+        print(f"| {name:<11} | {str(result['reached']):<14} | {result['seconds']:>8.1f} | {result['steps']:>10,} | "
+              f"{result['episodes']:>8,} | {result['final_mean_apples']:>11.2f} |")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+        print(f"Results saved to {args.output}")
@@ -1,108 +1,364 @@
 import os
 import sys
 import argparse
-from stable_baselines3 import PPO
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 
 parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 print(f"Path added to sys.path: {parent_path}")
 sys.path.append(parent_path)
 
-from src.rl.snake_env import SnakeEnv
+from src.core.replay import EpisodeRecorder, ReplayWriter
+from src.rl.checkpoint_store import CheckpointStore, get_checkpoint_steps, list_checkpoints
+from src.rl.evaluation_cache import EvaluationCache
+from src.rl.inference_server import stack_observations
+from src.rl.snake_env import SnakeEnv, get_grid_size, get_observation_settings
 
-def evaluate_model(model_path, num_episodes=100, max_steps=1000):
+# Environment used for the evaluation
+GRID_SIZE = (10, 10)
+MAX_STEPS_WITHOUT_FOOD = 300
+
+def get_episode_end(steps, max_steps, terminated, truncated):
+    """
+    (done, timeout) of an evaluated episode after its step number steps, shared with play_games.py so
+    that both report the same timeout rates: reaching max_steps is a timeout, even if the game also
+    ends on that step.
+    """
+    if steps >= max_steps:
+        return True, True
+    return terminated or truncated, False
+
+def play_episodes(model, seeds, max_steps, batch_size=None, recorders=None, grid_size=None):
+    """
+    Plays one episode per seed, with one batched predict per step across all live episodes.
+
+    :param model: Loaded PPO model.
+    :param seeds: Seed of each episode, the results of an episode only depend on its seed.
+    :param max_steps: Maximum number of steps per episode.
+    :param batch_size: Number of episodes played at the same time (all of them by default).
+    :param recorders: List receiving an EpisodeRecorder per episode, in the order of the seeds (optional).
+    :param grid_size: Size of the grid (width, height), by default the one the model was trained on
+        (GRID_SIZE for egocentric models, which can play on any size).
+    :return: List of (apples, steps, timeout) for each episode, in the order of the seeds.
+    """
+    if not batch_size:
+        batch_size = len(seeds)
+
+    # Same observation mode and dtype as the ones used to train the model
+    settings = get_observation_settings(model.observation_space)
+    # Imported here: the report mode reads the cache without loading torch
+    from src.rl.policy_export import uses_action_masks
+    # Models trained with MaskablePPO play with the same masks as in training
+    masked = uses_action_masks(model)
+    if grid_size is None:
+        grid_size = get_grid_size(model.observation_space) or GRID_SIZE
+    results = [None] * len(seeds)
+
+    for start in range(0, len(seeds), batch_size):
+        episodes = list(range(start, min(start + batch_size, len(seeds))))
+        envs = {
+            ep: SnakeEnv(grid_size=grid_size, max_steps_without_food=MAX_STEPS_WITHOUT_FOOD, **settings)
+            for ep in episodes
+        }
+        observations = {ep: envs[ep].reset(seed=seeds[ep])[0] for ep in episodes}
+        if recorders is not None:
+            episode_recorders = {ep: EpisodeRecorder(seeds[ep], grid_size) for ep in episodes}
+            for ep in episodes:
+                episode_recorders[ep].record_food(envs[ep].game)
+            recorders.extend(episode_recorders[ep] for ep in episodes)
+        apples = {ep: 0 for ep in episodes}
+        steps = {ep: 0 for ep in episodes}
+        live = episodes
+
+        while live:
+            batch = stack_observations([observations[ep] for ep in live])
+            if masked:
+                masks = np.stack([envs[ep].action_masks() for ep in live])
+                actions, _ = model.predict(batch, deterministic=True, action_masks=masks)
+            else:
+                actions, _ = model.predict(batch, deterministic=True)
+            still_live = []
+            for ep, action in zip(live, actions):
+                obs, reward, terminated, truncated, info = envs[ep].step(int(action))
+                if recorders is not None:
+                    episode_recorders[ep].record_step(action, envs[ep].game)
+                apples[ep] = info.get("apples_eaten", 0)
+                steps[ep] += 1
+
+                done, timeout = get_episode_end(steps[ep], max_steps, terminated, truncated)
+                if done:
+                    results[ep] = (apples[ep], steps[ep], timeout)
+                else:
+                    observations[ep] = obs
+                    still_live.append(ep)
+            live = still_live
+
+    return results
+
+def evaluate_model(model_path, num_episodes=100, max_steps=1000, seed=0, batch_size=None, replay_dir=None,
+                   grid_size=None):
+    """
+    Evaluates a model on num_episodes episodes seeded with seed, seed + 1, ...
+
+    :param replay_dir: Folder where the episodes are archived as <model>.replay.jsonl (optional),
+        see scripts/render_replay.py.
+    :param grid_size: Size of the grid, by default the one of the model (see play_episodes).
+
+    :return: Dictionary with the averages and the per-episode results, None if the model can't be loaded.
+    """
     if not os.path.exists(model_path):
         print(f"Model file {model_path} not found.")
         return
-    
+
+    # Imported here: the report mode reads the cache without loading torch
+    from src.rl.policy_export import load_model
+
     try:
-        model = PPO.load(model_path)
+        # Exported policies (see scripts/export_policy.py) load about 10x faster than the SB3 zips
+        model = load_model(model_path)
     except Exception as e:
         print(f"Error loading model {model_path}: {e}")
         return
-    
-    env = SnakeEnv(grid_size=(10, 10))
-    
-    total_apples = 0
-    total_steps = 0
-    total_episodes = 0
-    timeouts = 0
 
     print(f"Evaluating {model_path}...")
 
-    for ep in range(num_episodes):
-        obs, _ = env.reset()
-        done = False
-        apples = 0
-        steps = 0
-
-        while not done and steps < max_steps:
-            action, _ = model.predict(obs, deterministic=True)
-            obs, reward, terminated, truncated, info = env.step(action)
-            apples = info.get("apples_eaten", 0)
-            steps += 1
-            
-            if steps >= max_steps:
-                timeouts += 1
-                break
-            
-            done = terminated or truncated
-
-        total_apples += apples
-        total_steps += steps
-        total_episodes += 1
-
-    avg_apples = total_apples / num_episodes
-    avg_steps = total_steps / num_episodes
-    timeout_rate = (timeouts / num_episodes) * 100
-
-    print(f"\nSummary for {model_path}:")
-    print(f"  Average apples eaten: {avg_apples:.2f}")
-    print(f"  Average steps: {avg_steps:.2f}")
-    print(f"  Timeout percentage: {timeout_rate:.1f}%")
-    print(f"  Total games played: {total_episodes}")
-    print(f"  Total steps taken: {total_steps}\n")
-
-    return avg_apples, avg_steps, timeout_rate
+    seeds = list(range(seed, seed + num_episodes))
+    recorders = [] if replay_dir else None
+    episodes = play_episodes(model, seeds, max_steps, batch_size, recorders, grid_size)
+
+    if replay_dir:
+        # A few bytes per step: thousands of episodes can be kept and rendered later
+        model_name = os.path.splitext(os.path.basename(model_path))[0]
+        replay_path = os.path.join(replay_dir, f"{model_name}.replay.jsonl")
+        if os.path.exists(replay_path):
+            os.remove(replay_path)
+        with ReplayWriter(replay_path) as writer:
+            for recorder, (apples, steps, timeout) in zip(recorders, episodes):
+                writer.write(recorder, model=model_name, apples=apples, timeout=timeout)
+
+    total_apples = sum(apples for apples, _, _ in episodes)
+    total_steps = sum(steps for _, steps, _ in episodes)
+    timeouts = sum(timeout for _, _, timeout in episodes)
+
+    return {
+        "model_path": model_path,
+        "avg_apples": total_apples / num_episodes,
+        "avg_steps": total_steps / num_episodes,
+        "timeout_rate": (timeouts / num_episodes) * 100,
+        "total_episodes": num_episodes,
+        "total_steps": total_steps,
+        "episodes": episodes,
+    }
+
+def print_summary(results):
+    """Displays the evaluation summary of a model."""
+    print(f"\nSummary for {results['model_path']}:")
+    print(f"  Average apples eaten: {results['avg_apples']:.2f}")
+    print(f"  Average steps: {results['avg_steps']:.2f}")
+    print(f"  Timeout percentage: {results['timeout_rate']:.1f}%")
+    print(f"  Total games played: {results['total_episodes']}")
+    print(f"  Total steps taken: {results['total_steps']}\n")
+
+def get_model_grid_size(model_path, grid_size=None):
+    """Grid a model is evaluated on: grid_size if given, else the one of the model (GRID_SIZE for egocentric models)."""
+    if grid_size:
+        return tuple(grid_size)
+    # Imported here: the report mode reads the cache without loading torch
+    from src.rl.policy_export import load_observation_space
+    try:
+        observation_space = load_observation_space(model_path)
+    except Exception:
+        # The model can't be read: evaluate_model reports it and nothing is cached
+        return GRID_SIZE
+    # ValueError for the full observations of non-square grids, which need --grid_size
+    return get_grid_size(observation_space) or GRID_SIZE
+
+def get_evaluation_settings(num_episodes, max_steps, seed, grid_size):
+    """Settings that change the results of an evaluation, used as cache key (grid_size resolved per model)."""
+    return {
+        "num_episodes": num_episodes,
+        "max_steps": max_steps,
+        "seed": seed,
+        "grid_size": list(grid_size),
+        "max_steps_without_food": MAX_STEPS_WITHOUT_FOOD,
+    }
+
+def print_report(cache, settings):
+    """Displays the learning curve table of the README from the cached results."""
+    print("| Model (steps) | Apples (average) | Average duration (steps) | Timeout rate |")
+    print("|----------------|------------------|------------------------|-----------------|")
+    for training_steps, avg_apples, avg_steps, timeout_rate in cache.report(settings):
+        steps = f"{training_steps:,}" if training_steps is not None else "?"
+        print(f"| {steps:<14} | {avg_apples:<16.2f} | {avg_steps:<22.2f} | {f'{timeout_rate:g}%':<15} |")
+
+def init_worker(torch_threads):
+    """Limits the number of torch threads in each evaluation process."""
+    import torch
+    torch.set_num_threads(torch_threads)
+
+def evaluate_models(model_paths, num_episodes=100, max_steps=1000, seed=0, batch_size=None,
+                    workers=1, torch_threads=1, replay_dir=None, grid_size=None):
+    """Evaluates several checkpoints, spread across a pool of processes, and yields their results in order."""
+    if workers <= 1:
+        init_worker(torch_threads)
+        for model_path in model_paths:
+            yield evaluate_model(model_path, num_episodes, max_steps, seed, batch_size, replay_dir, grid_size)
+        return
+
+    # forkserver, like SubprocVecEnv: forking a process that already uses torch is not safe
+    start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context(start_method),
+                             initializer=init_worker, initargs=(torch_threads,)) as executor:
+        futures = [
+            executor.submit(evaluate_model, model_path, num_episodes, max_steps, seed, batch_size, replay_dir,
+                            grid_size)
+            for model_path in model_paths
+        ]
+        for future in futures:
+            yield future.result()
 
 if __name__ == "__main__":
     # 1. Creating an argument parser with a description
     parser = argparse.ArgumentParser(description="Evaluate Snake models.")
-    
+
     # 2. Defining arguments accepted by the script
     parser.add_argument("--folder",
                         type=str,
-                        default="checkpoints_by_steps", 
+                        default="checkpoints_by_steps",
                         help="Folder containing the models.")
     parser.add_argument("--num_episodes",
                         type=int,
-                        default=100, 
+                        default=100,
                         help="Number of episodes.")
     parser.add_argument("--max_steps",
                         type=int,
-                        default=1000, 
+                        default=1000,
                         help="Maximum number of steps per episode.")
-    
+    parser.add_argument("--seed",
+                        type=int,
+                        default=0,
+                        help="Seed of the first episode (episode i uses seed + i).")
+    parser.add_argument("--grid_size",
+                        type=int,
+                        nargs=2,
+                        default=None,
+                        metavar=("WIDTH", "HEIGHT"),
+                        help="Size of the grid (default: the one of each model, 10x10 for egocentric models).")
+    parser.add_argument("--batch_size",
+                        type=int,
+                        default=0,
+                        help="Episodes played at the same time per model (0 = all, 1 = one after the other).")
+    parser.add_argument("--workers",
+                        type=int,
+                        default=1,
+                        help="Number of processes evaluating checkpoints in parallel.")
+    parser.add_argument("--torch_threads",
+                        type=int,
+                        default=1,
+                        help="Number of torch threads per process.")
+    parser.add_argument("--cache",
+                        type=str,
+                        default=None,
+                        help="SQLite file caching the results (default: evaluations.sqlite in the folder).")
+    parser.add_argument("--no_cache",
+                        action="store_true",
+                        help="Evaluate every checkpoint without reading or writing the cache.")
+    parser.add_argument("--replays",
+                        type=str,
+                        default=None,
+                        help="Folder where the evaluated episodes are archived (seed, foods and actions).")
+    parser.add_argument("--slim",
+                        action="store_true",
+                        help="Evaluate the exported policies (model_<N>_steps.policy.pt, see scripts/export_policy.py).")
+    parser.add_argument("--report",
+                        action="store_true",
+                        help="Only print the table of the cached results for these settings.")
+
     # 3. Parsing arguments provided by the user
     args = parser.parse_args()
     # 4. Using arguments in the code
     checkpoint_dir = args.folder
+    grid_size = tuple(args.grid_size) if args.grid_size else None
+    cache_path = args.cache or os.path.join(checkpoint_dir, "evaluations.sqlite")
+
+    if args.report:
+        if not os.path.exists(cache_path):
+            print(f"Cache {cache_path} not found.")
+            sys.exit(1)
+        cache = EvaluationCache(cache_path)
+        print_report(cache, get_evaluation_settings(args.num_episodes, args.max_steps, args.seed,
+                                                    grid_size or GRID_SIZE))
+        cache.close()
+        sys.exit(0)
 
     if not os.path.exists(checkpoint_dir):
         print(f"Folder {checkpoint_dir} not found.")
         sys.exit(1)
 
-    models = []
-    for file in os.listdir(checkpoint_dir):
-        if file.endswith(".zip"):
-            models.append(file)
-    
+    # Checkpoints of a store are listed by its manifest, which also gives their hashes
+    store = CheckpointStore(checkpoint_dir) if not args.slim and CheckpointStore.exists(checkpoint_dir) else None
+    if args.slim:
+        models = [file for file in os.listdir(checkpoint_dir) if file.endswith(".policy.pt")]
+        models.sort(key=lambda x: int(x.split("_")[1]))
+        model_paths = [os.path.join(checkpoint_dir, model) for model in models]
+    else:
+        model_paths = [path for _, path in list_checkpoints(checkpoint_dir)]
+        models = [os.path.basename(path) for path in model_paths]
+
     if not models:
         print(f"No models found in folder {checkpoint_dir}.")
         sys.exit(1)
 
-    models.sort(key=lambda x: int(x.split("_")[1]))
+    if args.replays:
+        os.makedirs(args.replays, exist_ok=True)
 
-    for model in models:
-        model_path = os.path.join(checkpoint_dir, model)
+    # Each model is evaluated (and cached) on its own grid unless --grid_size is given
+    try:
+        settings = {
+            path: get_evaluation_settings(args.num_episodes, args.max_steps, args.seed,
+                                          get_model_grid_size(path, grid_size))
+            for path in model_paths
+        }
+    except ValueError as e:
+        print(f"Error: {e} (--grid_size).")
+        sys.exit(1)
+
+    # Only new or changed checkpoints are evaluated
+    cache = None if args.no_cache else EvaluationCache(cache_path)
+    if store:
+        entries = {entry["steps"]: entry for entry in store.entries()}
+        hashes = {path: entries[get_checkpoint_steps(path)]["hash"] for path in model_paths}
+    else:
+        hashes = {path: cache.checkpoint_hash(path) for path in model_paths} if cache else {}
+    cached = {path: cache.get(hashes[path], settings[path]) for path in model_paths} if cache else {}
+    missing = [path for path in model_paths if not cached.get(path)]
+    if cache:
+        print(f"{len(model_paths) - len(missing)} cached results, {len(missing)} checkpoints to evaluate.")
+
+    results = evaluate_models(
+        missing,
+        num_episodes=args.num_episodes,
+        max_steps=args.max_steps,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        torch_threads=args.torch_threads,
+        replay_dir=args.replays,
+        grid_size=grid_size,
+    )
+    for model, model_path in zip(models, model_paths):
         print(f"\nTesting model: {model}")
-        evaluate_model(model_path, num_episodes=args.num_episodes, max_steps=args.max_steps)
\ No newline at end of file
+        model_results = cached.get(model_path)
+        if not model_results:
+            model_results = next(results)
+            if model_results and cache:
+                cache.put(hashes[model_path], settings[model_path], model_results)
+            if model_results and store:
+                store.set_evaluation(get_checkpoint_steps(model_path), EvaluationCache.settings_key(settings[model_path]),
+                                     model_results["avg_apples"])
+        if model_results:
+            print_summary(model_results)
+
+    if cache:
+        cache.close()
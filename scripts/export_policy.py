@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+from time import perf_counter
+
+import numpy as np
+
+# Add parent directory to path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+from src.rl.checkpoint_store import list_checkpoints
+from src.rl.inference_server import stack_observations
+from src.rl.policy_export import export_policy, load_model, load_policy, uses_action_masks
+from src.rl.snake_env import SnakeEnv, get_grid_size, get_observation_settings
+
+def get_export_paths(model_path):
+    """model_<N>_steps.zip (or .ckpt) -> (model_<N>_steps.policy.pt, model_<N>_steps.policy.ts)"""
+    base = os.path.splitext(model_path)[0]
+    return f"{base}.policy.pt", f"{base}.policy.ts"
+
+def collect_observations(model, num_steps, seed=0):
+    """Observations (and action masks) of the episodes played by the model, to compare and time the predictions."""
+    settings = get_observation_settings(model.observation_space)
+    env = SnakeEnv(get_grid_size(model.observation_space) or (10, 10), **settings)
+    observations = []
+    masks = []
+    obs, _ = env.reset(seed=seed)
+    while len(observations) < num_steps:
+        # Copied: the observations of SnakeEnv are views on its history buffer
+        observations.append({key: value.copy() for key, value in obs.items()} if isinstance(obs, dict) else obs.copy())
+        masks.append(env.action_masks())
+        action, _ = predict(model, obs, masks[-1])
+        obs, reward, terminated, truncated, info = env.step(int(action))
+        if terminated or truncated:
+            seed += 1
+            obs, _ = env.reset(seed=seed)
+    return observations, np.array(masks)
+
+def predict(model, observation, action_masks):
+    """Deterministic action, with the action masks for the models trained with them."""
+    if uses_action_masks(model):
+        return model.predict(observation, deterministic=True, action_masks=action_masks)
+    return model.predict(observation, deterministic=True)
+
+def time_loads(load, path, repeats):
+    """Median time of load(path) in seconds."""
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        load(path)
+        times.append(perf_counter() - start)
+    return float(np.median(times))
+
+def time_cold_load(path):
+    """Time of a new Python process to import the loader and load path (what a worker pays once per checkpoint)."""
+    code = (
+        "import sys, time; start = time.perf_counter(); sys.path.append(sys.argv[2]); "
+        "from src.rl.policy_export import load_model; load_model(sys.argv[1]); "
+        "print(time.perf_counter() - start)"
+    )
+    output = subprocess.run([sys.executable, "-c", code, path, parent_path], capture_output=True, text=True,
+                            check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+def time_predictions(model, observations, masks):
+    """Latency percentiles in milliseconds of single-observation predictions."""
+    times = []
+    for obs, action_masks in zip(observations, masks):
+        start = perf_counter()
+        predict(model, obs, action_masks)
+        times.append(perf_counter() - start)
+    times = np.array(times) * 1000
+    return {f"p{p}": float(np.percentile(times, p)) for p in (50, 90, 99)}
+
+def benchmark(model_path, num_steps=2000, repeats=5):
+    """Compares PPO.load with the exports: identical actions, load time and per-step latency."""
+    policy_path, torchscript_path = get_export_paths(model_path)
+    model = load_model(model_path)
+    loaders = {"sb3_zip": (load_model, model_path), "policy_pt": (load_policy, policy_path)}
+    if os.path.exists(torchscript_path):
+        loaders["torchscript"] = (load_policy, torchscript_path)
+
+    observations, masks = collect_observations(model, num_steps)
+    expected_single = np.array([predict(model, obs, mask)[0] for obs, mask in zip(observations, masks)])
+    expected_batch, _ = predict(model, stack_observations(observations), masks)
+
+    results = {}
+    for name, (load, path) in loaders.items():
+        loaded = load(path)
+        single = np.array([predict(loaded, obs, mask)[0] for obs, mask in zip(observations, masks)])
+        batch, _ = predict(loaded, stack_observations(observations), masks)
+        results[name] = {
+            "file_bytes": os.path.getsize(path),
+            "identical_actions": bool(np.array_equal(single, expected_single) and
+                                      np.array_equal(batch, expected_batch)),
+            "load_seconds": time_loads(load, path, repeats),
+            "cold_load_seconds": time_cold_load(path),
+            "predict_ms": time_predictions(loaded, observations, masks),
+        }
+    return results
+
+def print_benchmark(results):
+    print(f"{'':<12} {'size':>10} {'identical':>10} {'load':>10} {'cold load':>10} {'predict p50':>12} "
+          f"{'predict p99':>12}")
+    for name, result in results.items():
+        print(f"{name:<12} {result['file_bytes'] / 1024:>8.0f}kB {str(result['identical_actions']):>10} "
+              f"{result['load_seconds'] * 1000:>8.1f}ms {result['cold_load_seconds']:>9.2f}s "
+              f"{result['predict_ms']['p50']:>10.3f}ms {result['predict_ms']['p99']:>10.3f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the inference-only policy of checkpoints")
+    parser.add_argument("--model", type=str, default=None, help="Checkpoint to export")
+    parser.add_argument("--folder", type=str, default=None, help="Export every checkpoint of a folder")
+    parser.add_argument("--torchscript", action="store_true", help="Also write a TorchScript module (.policy.ts)")
+    parser.add_argument("--force", action="store_true", help="Export again the checkpoints already exported")
+    parser.add_argument("--grid_size", type=int, nargs=2, default=None, metavar=("WIDTH", "HEIGHT"),
+                        help="Grid of the observations of egocentric models (default: 10x10), required "
+                             "for the full observations of non-square grids")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Compare the exports of --model with PPO.load (actions, load time, latency)")
+    parser.add_argument("--steps", type=int, default=2000, help="Number of observations of the benchmark")
+    parser.add_argument("--output", type=str, default=None, help="JSON file for the benchmark results")
+    args = parser.parse_args()
+
+    if args.model:
+        model_paths = [args.model]
+    elif args.folder:
+        model_paths = [path for _, path in list_checkpoints(args.folder)]
+    else:
+        parser.error("--model or --folder is required")
+
+    for model_path in model_paths:
+        policy_path, torchscript_path = get_export_paths(model_path)
+        if not args.force and os.path.exists(policy_path) and (not args.torchscript or os.path.exists(torchscript_path)):
+            continue
+        export_policy(load_model(model_path), policy_path, torchscript_path if args.torchscript else None,
+                      args.grid_size)
+        print(f"{model_path}: {os.path.getsize(model_path) / 1024:.0f} kB -> "
+              f"{policy_path}: {os.path.getsize(policy_path) / 1024:.0f} kB")
+
+    if args.benchmark:
+        if not args.model:
+            parser.error("--benchmark needs --model")
+        results = benchmark(args.model, args.steps)
+        print_benchmark(results)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
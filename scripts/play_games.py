@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import argparse
+import threading
+from time import perf_counter
+
+# Add parent directory to path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+from scripts.evaluate_models import get_episode_end
+from src.rl.inference_server import InferenceServer, format_stats
+from src.rl.policy_export import uses_action_masks
+from src.rl.snake_env import SnakeEnv, get_grid_size, get_observation_settings
+
+MAX_STEPS_WITHOUT_FOOD = 300
+
+def play_game(server, env, seeds, max_steps, results, masked=False):
+    """Plays one episode per seed with the actions of the server, appends (seed, apples, steps, timeout) to results."""
+    for seed in seeds:
+        obs, _ = env.reset(seed=seed)
+        apples = steps = 0
+        while True:
+            action = server.predict(obs, env.action_masks() if masked else None)
+            obs, reward, terminated, truncated, info = env.step(int(action))
+            apples = info.get("apples_eaten", apples)
+            steps += 1
+            done, timeout = get_episode_end(steps, max_steps, terminated, truncated)
+            if done:
+                results.append((seed, apples, steps, timeout))
+                break
+
+def play_games(model, num_games, episodes_per_game=1, max_steps=1000, seed=0, max_batch_size=None,
+               max_latency=0.002, grid_size=None):
+    """
+    Plays num_games games at the same time, one thread each, against one model behind an InferenceServer.
+
+    Game i plays the seeds seed + i * episodes_per_game, seed + i * episodes_per_game + 1, ...
+
+    :param max_batch_size: Maximum batch size of the server (default: num_games, one request per game in flight).
+    :return: (results sorted by seed, server statistics, elapsed seconds).
+    """
+    settings = get_observation_settings(model.observation_space)
+    masked = uses_action_masks(model)
+    grid_size = grid_size or get_grid_size(model.observation_space) or (10, 10)
+    results = []
+
+    start = perf_counter()
+    with InferenceServer(model, max_batch_size or num_games, max_latency) as server:
+        threads = []
+        for game_index in range(num_games):
+            env = SnakeEnv(grid_size, max_steps_without_food=MAX_STEPS_WITHOUT_FOOD, **settings)
+            first_seed = seed + game_index * episodes_per_game
+            seeds = range(first_seed, first_seed + episodes_per_game)
+            threads.append(threading.Thread(target=play_game, args=(server, env, seeds, max_steps, results, masked)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = perf_counter() - start
+
+    return sorted(results), server.get_stats(), elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play many games against one model with batched predictions")
+    parser.add_argument("--model", type=str, required=True,
+                        help="Path to the model (SB3 zip or exported policy, see scripts/export_policy.py)")
+    parser.add_argument("--games", type=int, default=256, help="Number of games played at the same time")
+    parser.add_argument("--episodes", type=int, default=1, help="Number of episodes per game")
+    parser.add_argument("--max_steps", type=int, default=1000, help="Maximum number of steps per episode")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the first episode")
+    parser.add_argument("--max_batch_size", type=int, default=None,
+                        help="Maximum number of predictions per batch (default: number of games)")
+    parser.add_argument("--max_latency_ms", type=float, default=2.0,
+                        help="Maximum time a prediction waits for the others to fill its batch")
+    parser.add_argument("--grid_size", type=int, nargs=2, default=None, metavar=("WIDTH", "HEIGHT"),
+                        help="Size of the grid (default: the one of the model, 10x10 for egocentric models)")
+    parser.add_argument("--torch_threads", type=int, default=1, help="Number of torch threads")
+    parser.add_argument("--output", type=str, default=None, help="JSON file for the results and the statistics")
+    args = parser.parse_args()
+
+    # Imported here so --help does not load torch
+    import torch
+    from src.rl.policy_export import load_model
+
+    torch.set_num_threads(args.torch_threads)
+    model = load_model(args.model)
+
+    results, stats, elapsed = play_games(
+        model, args.games, args.episodes, args.max_steps, args.seed,
+        args.max_batch_size, args.max_latency_ms / 1000, args.grid_size,
+    )
+
+    total_steps = sum(steps for _, _, steps, _ in results)
+    print(f"{len(results)} episodes, {total_steps} steps in {elapsed:.1f} s ({total_steps / elapsed:.0f} steps/s)")
+    print(f"Average apples: {sum(apples for _, apples, _, _ in results) / len(results):.2f}")
+    print(format_stats(stats))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "model": args.model,
+                "elapsed_seconds": elapsed,
+                "episodes": [
+                    {"seed": s, "apples": apples, "steps": steps, "timeout": timeout}
+                    for s, apples, steps, timeout in results
+                ],
+                "stats": stats,
+            }, f, indent=2)
+        print(f"Results saved to {args.output}")
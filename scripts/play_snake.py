@@ -2,18 +2,19 @@ import os
 import sys
 import time
 import argparse
-import numpy as np
-import pygame
-import cv2
-from stable_baselines3 import PPO
+import random
 
 # Add parent directory to path
 parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 print(f"Path added to sys.path: {parent_path}")
 sys.path.append(parent_path)
 
-from src.rl.snake_env import SnakeEnv
+from src.rl.checkpoint_store import CheckpointStore, list_checkpoints
+from src.rl.policy_export import load_model, uses_action_masks
+from src.rl.snake_env import SnakeEnv, get_grid_size, get_observation_settings
 from src.core.snake import SnakeVisualizer
+from src.core.replay import EpisodeRecorder, ReplayWriter
+from src.core.video import open_video_writer, upscale_cells
 
 def find_latest_model():
     base_path = "checkpoints_by_steps"
@@ -21,126 +22,145 @@ def find_latest_model():
     if not os.path.exists(base_path):
         print(f"The folder {base_path} doesn't exist.")
         sys.exit(1)
-    
-    files = [f for f in os.listdir(base_path) if f.endswith(".zip")]
+
+    if CheckpointStore.exists(base_path):
+        # Read from the manifest of the store, without listing the folder
+        latest = CheckpointStore(base_path).latest()
+        files = [latest["file"]] if latest else []
+    else:
+        files = [f for f in os.listdir(base_path) if f.endswith(".zip")]
+        files.sort(key=lambda f: os.path.getmtime(os.path.join(base_path, f)))
     
     if len(files) == 0:
         print(f"No models found in {base_path}.")
         sys.exit(1)
     
-    files.sort(key=lambda f: os.path.getmtime(os.path.join(base_path, f)))
     latest_model = os.path.join(base_path, files[-1])
     print(f"Model loaded: {latest_model}")
     return latest_model
 
-def play_snake(model_path=None, record=False, format="gif"):
-    grid_size = (10, 10)
+def play_snake(model_path=None, record=False, format="gif", seed=None, replay_path=None, headless=False,
+               grid_size=None):
     cell_size = 20
     
-    env = SnakeEnv(grid_size)
-    
     if not model_path:
         model_path = find_latest_model()
     else:
         model_path = os.path.normpath(model_path)
         
         if not os.path.exists(model_path):
-            if model_path.endswith('.zip'):
-                model_path = model_path[:-4]
+            if model_path.endswith(('.zip', '.ckpt')):
+                model_path = os.path.splitext(model_path)[0]
             
-            if not os.path.exists(model_path) and not os.path.exists(model_path + '.zip'):
+            if not any(os.path.exists(model_path + extension) for extension in ('', '.zip', '.ckpt')):
                 print(f"Error: Model file {model_path} doesn't exist.")
                 base_dir = "checkpoints_by_steps"
                 print(f"\nAvailable models in {base_dir}:")
                 if os.path.exists(base_dir):
-                    for f in os.listdir(base_dir):
-                        if f.endswith('.zip'):
-                            print(f"  - {f}")
+                    for _, path in list_checkpoints(base_dir):
+                        print(f"  - {os.path.basename(path)}")
                 sys.exit(1)
                 
             if os.path.exists(model_path):
                 pass
             elif os.path.exists(model_path + '.zip'):
                 model_path += '.zip'
+            elif os.path.exists(model_path + '.ckpt'):
+                model_path += '.ckpt'
                 
         print(f"Model loaded: {model_path}")
     
     try:
-        model = PPO.load(model_path)
+        # SB3 zip, checkpoint of a store, or policy exported by scripts/export_policy.py
+        model = load_model(model_path)
     except Exception as e:
         print(f"Error loading model: {e}")
         sys.exit(1)
     
-    visualizer = SnakeVisualizer(grid_size)
+    # Same observation mode, dtype and grid as the ones used to train the model,
+    # egocentric models play on any grid (10x10 by default)
+    try:
+        model_grid_size = get_grid_size(model.observation_space)
+    except ValueError as e:
+        # Full observation of a non-square grid: only --grid_size gives its width and height
+        if not grid_size:
+            print(f"Error: {e} (--grid_size).")
+            sys.exit(1)
+        model_grid_size = None
+    if model_grid_size and grid_size and tuple(grid_size) != model_grid_size:
+        print(f"Error: the model was trained on a {model_grid_size[0]}x{model_grid_size[1]} grid.")
+        sys.exit(1)
+    grid_size = tuple(grid_size or model_grid_size or (10, 10))
+    cell_size = max(2, min(cell_size, 640 // max(grid_size)))  # Large grids fit in the window
+    env = SnakeEnv(grid_size, **get_observation_settings(model.observation_space))
+
+    # Headless: no window and no waiting between steps, e.g. to record on a server
+    visualizer = SnakeVisualizer(grid_size, cell_size, headless=headless)
 
-    obs, _ = env.reset()
+    # The seed and the actions are enough to replay the episode (see scripts/render_replay.py)
+    if seed is None:
+        seed = random.randrange(2 ** 31)
+    obs, _ = env.reset(seed=seed)
+    recorder = EpisodeRecorder(seed, grid_size)
+    recorder.record_food(env.game)
     done = False
     total_apples = 0
     
-    frames = []
     video_writer = None
     
     if record:
         os.makedirs("recordings", exist_ok=True)
         model_name = os.path.basename(model_path)
         steps = model_name.split('_')[1]
-        
-        if format == "mp4":
-            output_path = f"recordings/snake_{steps}_steps.mp4"
-            frame_size = (grid_size[0] * cell_size, grid_size[1] * cell_size)
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            video_writer = cv2.VideoWriter(output_path, fourcc, 10, frame_size)
-        else:
-            output_path = f"recordings/snake_{steps}_steps.gif"
+        output_path = f"recordings/snake_{steps}_steps.{format}"
+        frame_size = (grid_size[0] * cell_size, grid_size[1] * cell_size)
+        try:
+            # Frames are encoded as they come instead of being kept in memory
+            video_writer = open_video_writer(output_path, frame_size, fps=10)
+        except ImportError:
+            print("PIL (GIF) or OpenCV (MP4) is required to record. Try 'pip install pillow opencv-python'")
+            record = False
 
     while not done:
-        action, _ = model.predict(obs, deterministic=True)
+        if uses_action_masks(model):
+            action, _ = model.predict(obs, deterministic=True, action_masks=env.action_masks())
+        else:
+            action, _ = model.predict(obs, deterministic=True)
         obs, reward, terminated, truncated, info = env.step(action)
+        recorder.record_step(action, env.game)
         done = terminated or truncated
         total_apples = info.get("apples_eaten", total_apples)
         print(f"Head: {env.game.snakehead}, Body: {env.game.snake}")
 
-        num_channels = 11
-        last_state = obs[-(num_channels * grid_size[0] * grid_size[1]):]
-        last_state = last_state.reshape((num_channels, grid_size[0], grid_size[1]))
+        if env.observation_mode == "compact":
+            # The 4 spatial channels of the last state
+            last_state = obs["grid"][-env.num_channels:]
+        elif env.observation_mode == "egocentric":
+            # The window only shows the surroundings of the head, the whole board is drawn
+            last_state = env._get_spatial_channels()
+        else:
+            num_channels = 11
+            last_state = obs[-(num_channels * grid_size[0] * grid_size[1]):]
+            last_state = last_state.reshape((num_channels, grid_size[1], grid_size[0]))
         visualizer.render(last_state)
         
         if record:
-            screen_array = pygame.surfarray.array3d(visualizer.screen)
-            screen_array = np.flip(screen_array, axis=2)
-            screen_array = screen_array.transpose(1, 0, 2)
-            
-            if format == "mp4" and video_writer:
-                video_writer.write(screen_array)
-            else:
-                frames.append(screen_array)
+            # Same picture as the window, built from the game grid
+            video_writer.write(upscale_cells(env.game.grid, cell_size))
 
-        time.sleep(0.1)
+        if not headless:
+            time.sleep(0.1)
 
     print(f"Total apples eaten: {total_apples}")
     
     if record:
-        if format == "mp4" and video_writer:
-            video_writer.release()
-            print(f"MP4 video saved to {output_path}")
-        elif format == "gif" and frames:
-            try:
-                from PIL import Image
-                pil_frames = []
-                for frame in frames:
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    pil_frames.append(Image.fromarray(frame_rgb))
-                
-                pil_frames[0].save(
-                    output_path,
-                    save_all=True,
-                    append_images=pil_frames[1:],
-                    duration=100,
-                    loop=0
-                )
-                print(f"GIF saved to {output_path}")
-            except ImportError:
-                print("PIL is required to create GIFs. Try 'pip install pillow'")
+        video_writer.close()
+        print(f"{format.upper()} saved to {output_path}")
+
+    if replay_path:
+        with ReplayWriter(replay_path) as writer:
+            writer.write(recorder, model=os.path.basename(model_path), apples=total_apples)
+        print(f"Episode (seed {seed}) appended to {replay_path}")
     
     visualizer.close()
 
@@ -149,5 +169,12 @@ if __name__ == "__main__":
     parser.add_argument("--model", type=str, help="Path to a specific model")
     parser.add_argument("--record", action="store_true", help="Record the game")
     parser.add_argument("--format", choices=["gif", "mp4"], default="gif", help="Recording format")
+    parser.add_argument("--headless", action="store_true", help="Play without window (as fast as possible)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the episode (random by default)")
+    parser.add_argument("--replay", type=str, default=None,
+                        help="Replay file (JSONL) the episode is appended to, see scripts/render_replay.py")
+    parser.add_argument("--grid_size", type=int, nargs=2, default=None, metavar=("WIDTH", "HEIGHT"),
+                        help="Size of the grid (default: the one of the model, 10x10 for egocentric models)")
     args = parser.parse_args()
-    play_snake(model_path=args.model, record=args.record, format=args.format)
\ No newline at end of file
+    play_snake(model_path=args.model, record=args.record, format=args.format, seed=args.seed,
+               replay_path=args.replay, headless=args.headless, grid_size=args.grid_size)
\ No newline at end of file
@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+# Add parent directory to path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+from src.rl.checkpoint_store import list_checkpoints
+from scripts.evaluate_models import init_worker, play_episodes
+from scripts.render_replay import render_episode
+
+INDEX_FILE = "gallery.json"
+
+def render_checkpoint(model_path, output_path, seed=0, max_steps=1000, cell_size=20, fps=10):
+    """Plays one seeded episode with a checkpoint and renders it headless, returns its index entry."""
+    # Imported here: the main process only lists files and does not need torch
+    from src.rl.policy_export import load_model
+
+    model = load_model(model_path)
+    recorders = []
+    (apples, steps, timeout), = play_episodes(model, [seed], max_steps, recorders=recorders)
+    record = recorders[0].to_record()
+    render_episode(record, output_path, cell_size, fps)
+    return {
+        "model": os.path.basename(model_path),
+        "file": os.path.basename(output_path),
+        "seed": seed,
+        "apples": apples,
+        "steps": steps,
+        "timeout": timeout,
+        "replay": record,
+    }
+
+def write_index(output_dir, entries):
+    """Writes gallery.json and a README-style table (gallery.md) of the rendered checkpoints."""
+    with open(os.path.join(output_dir, INDEX_FILE), "w") as f:
+        json.dump(entries, f, indent=2)
+
+    rows = sorted(entries.items(), key=lambda item: int(item[0]))
+    with open(os.path.join(output_dir, "gallery.md"), "w") as f:
+        f.write("| Model (steps) | Apples | Duration (steps) | Episode |\n")
+        f.write("|----------------|--------|------------------|---------|\n")
+        for training_steps, entry in rows:
+            f.write(f"| {int(training_steps):,} | {entry['apples']} | {entry['steps']} | "
+                    f"<img src=\"{entry['file']}\" width=\"200\"/> |\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render one episode per checkpoint for the learning evolution gallery")
+    parser.add_argument("--folder", type=str, default="checkpoints_by_steps", help="Folder containing the models")
+    parser.add_argument("--steps", type=int, nargs="+", default=None,
+                        help="Training steps of the checkpoints to render (default: all)")
+    parser.add_argument("--output_dir", type=str, default="recordings", help="Folder of the videos and the index")
+    parser.add_argument("--format", choices=["gif", "mp4"], default="gif", help="Recording format")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the episode played by every checkpoint")
+    parser.add_argument("--max_steps", type=int, default=1000, help="Maximum number of steps per episode")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of processes")
+    parser.add_argument("--torch_threads", type=int, default=1, help="Number of torch threads per process")
+    parser.add_argument("--force", action="store_true", help="Render again the checkpoints already rendered")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.folder):
+        print(f"Folder {args.folder} not found.")
+        sys.exit(1)
+
+    checkpoints = dict(list_checkpoints(args.folder))
+
+    selected = sorted(checkpoints) if args.steps is None else args.steps
+    missing = [steps for steps in selected if steps not in checkpoints]
+    if missing:
+        print(f"No checkpoint for steps: {', '.join(map(str, missing))}")
+    selected = [steps for steps in selected if steps in checkpoints]
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    index_path = os.path.join(args.output_dir, INDEX_FILE)
+    entries = {}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            entries = json.load(f)
+
+    # Checkpoints already rendered with the same seed are skipped
+    jobs = {}
+    for steps in selected:
+        output_path = os.path.join(args.output_dir, f"snake_{steps}_steps.{args.format}")
+        entry = entries.get(str(steps))
+        if not args.force and os.path.exists(output_path) and entry and entry["seed"] == args.seed:
+            continue
+        jobs[steps] = output_path
+    print(f"{len(selected) - len(jobs)} checkpoints already rendered, {len(jobs)} to render.")
+
+    if jobs:
+        start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(jobs)), mp_context=mp.get_context(start_method),
+                                 initializer=init_worker, initargs=(args.torch_threads,)) as executor:
+            futures = {
+                steps: executor.submit(render_checkpoint, checkpoints[steps], output_path, args.seed, args.max_steps)
+                for steps, output_path in jobs.items()
+            }
+            for steps, future in futures.items():
+                try:
+                    entries[str(steps)] = future.result()
+                except Exception as e:
+                    print(f"Error rendering {checkpoints[steps]}: {e}")
+                    continue
+                entry = entries[str(steps)]
+                print(f"{entry['file']}: {entry['apples']} apples in {entry['steps']} steps")
+                # Saved after each checkpoint so an interrupted run keeps its progress
+                write_index(args.output_dir, entries)
+
+    write_index(args.output_dir, entries)
+    print(f"Index saved to {os.path.join(args.output_dir, 'gallery.md')}")
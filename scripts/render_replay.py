@@ -0,0 +1,51 @@
+import os
+import sys
+import argparse
+
+# Add parent directory to path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+from src.core.replay import read_replays, replay_episode
+from src.core.video import open_video_writer, upscale_cells
+
+def render_episode(record, output_path, cell_size=20, fps=10):
+    """Rebuild a recorded episode and stream its frames to a GIF or MP4 file, returns the number of frames."""
+    width, height = record["grid_size"]
+    writer = open_video_writer(output_path, (width * cell_size, height * cell_size), fps)
+    num_frames = 0
+    try:
+        for g in replay_episode(record):
+            writer.write(upscale_cells(g.grid, cell_size))
+            num_frames += 1
+    finally:
+        writer.close()
+    return num_frames
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render episodes recorded in a replay file")
+    parser.add_argument("--replay", type=str, required=True, help="Replay file (JSONL, one episode per line)")
+    parser.add_argument("--episodes", type=int, nargs="+", default=None,
+                        help="Indices of the episodes to render (default: all)")
+    parser.add_argument("--output_dir", type=str, default="recordings", help="Folder of the videos")
+    parser.add_argument("--format", choices=["gif", "mp4"], default="gif", help="Recording format")
+    parser.add_argument("--cell_size", type=int, default=20, help="Size of a cell in pixels")
+    parser.add_argument("--fps", type=int, default=10, help="Frames per second")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.replay):
+        print(f"Replay file {args.replay} not found.")
+        sys.exit(1)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(args.replay))[0]
+    selected = set(args.episodes) if args.episodes is not None else None
+
+    # Records are read one at a time, only the selected ones are rebuilt
+    for index, record in enumerate(read_replays(args.replay)):
+        if selected is not None and index not in selected:
+            continue
+        output_path = os.path.join(args.output_dir, f"{name}_episode_{index}.{args.format}")
+        num_frames = render_episode(record, output_path, args.cell_size, args.fps)
+        print(f"Episode {index} (seed {record['seed']}, {record['num_steps']} steps) saved to {output_path}"
+              f" ({num_frames} frames)")
@@ -1,8 +1,38 @@
-from stable_baselines3.common.callbacks import BaseCallback
+import json
+import os
+import sys
+import time
 from datetime import datetime
 
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+from src.rl.snake_env import aggregate_profiles, format_profile
+
+# Telemetry rows kept in memory before being written to the file
+TELEMETRY_FLUSH_ROWS = 20
+
+def get_rss_bytes():
+    """
+    Resident memory of the current process (peak resident memory where /proc is not available),
+    None where neither is (Windows).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        # Imported here: resource is Unix only
+        try:
+            import resource
+        except ImportError:
+            return None
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+
 class SaveAndLogCallback(BaseCallback):
-    def __init__(self, save_freqs, save_path, log_file=None, verbose=1):
+    def __init__(self, save_freqs, save_path, log_file=None, verbose=1, profile_env=False, telemetry_file=None,
+                 checkpoint_writer=None):
         """
         Callback to save the model and record logs.
 
@@ -10,12 +40,80 @@ class SaveAndLogCallback(BaseCallback):
         :param save_path: Path to the folder where models will be saved.
         :param log_file: Path to the log file (optional).
         :param verbose: Verbosity level (0 = silent, 1 = display logs).
+        :param profile_env: Report the time spent in each phase of SnakeEnv.step since the last
+            checkpoint (the environments must be profiled, see SnakeEnv.enable_profiling).
+        :param telemetry_file: Path to a JSONL file receiving one row per rollout (optional):
+            env steps/sec, collection and update times, episode lengths, apples and memory.
+            Read it with scripts/summarize_telemetry.py.
+        :param checkpoint_writer: CheckpointWriter saving the models in a background thread (optional,
+            models are saved synchronously otherwise). Each checkpoint is scored with the mean apples
+            of the training episodes finished since the previous one, for RetentionPolicy.keep_best.
         """
         super().__init__(verbose)
         self.save_freqs = set(save_freqs)
         self.save_path = save_path
         self.log_file = log_file
         self.last_checkpoint_time = None  # To calculate time between checkpoints
+        self.profile_env = profile_env
+        self.telemetry_file = telemetry_file
+        self._telemetry_rows = []
+        self._rollout = None  # Last rollout, written once its update time is known
+        self._rollout_start_time = None
+        self._rollout_end_time = None
+        self._rollout_start_steps = 0
+        self._episode_lengths = None
+        self._finished_lengths = []
+        self._finished_apples = []
+        self.checkpoint_writer = checkpoint_writer
+        self._checkpoint_apples = []  # Apples of the episodes finished since the last checkpoint
+
+    def _on_training_start(self) -> None:
+        if self.telemetry_file or self.checkpoint_writer:
+            self._episode_lengths = np.zeros(self.training_env.num_envs, dtype=np.int64)
+
+    def _on_rollout_start(self) -> None:
+        now = time.perf_counter()
+        if self._rollout is not None:
+            # Time between the end of the last rollout and this one = PPO update
+            self._rollout["update_seconds"] = now - self._rollout_end_time
+            elapsed = self._rollout["collect_seconds"] + self._rollout["update_seconds"]
+            self._rollout["steps_per_second"] = self._rollout["steps"] / elapsed
+            self._add_telemetry_row(self._rollout)
+            self._rollout = None
+        self._rollout_start_time = now
+        self._rollout_start_steps = self.num_timesteps
+
+    def _on_rollout_end(self) -> None:
+        if not self.telemetry_file:
+            return
+        self._rollout_end_time = time.perf_counter()
+        collect_seconds = self._rollout_end_time - self._rollout_start_time
+        rss_bytes = get_rss_bytes()
+        steps = self.num_timesteps - self._rollout_start_steps
+        self._rollout = {
+            "time": time.time(),
+            "num_timesteps": self.num_timesteps,
+            "steps": steps,
+            "collect_seconds": collect_seconds,
+            "update_seconds": None,
+            "collect_steps_per_second": steps / collect_seconds if collect_seconds > 0 else None,
+            "steps_per_second": None,
+            "episodes": len(self._finished_lengths),
+            "mean_episode_length": float(np.mean(self._finished_lengths)) if self._finished_lengths else None,
+            "mean_apples": float(np.mean(self._finished_apples)) if self._finished_apples else None,
+            "rss_mb": rss_bytes / 1024 ** 2 if rss_bytes is not None else None,
+        }
+        self._finished_lengths = []
+        self._finished_apples = []
+
+    def _on_training_end(self) -> None:
+        if self._rollout is not None:
+            # No update after the last rollout
+            self._add_telemetry_row(self._rollout)
+            self._rollout = None
+        self._flush_telemetry()
+        if self.checkpoint_writer:
+            self.checkpoint_writer.close()
 
     def _on_step(self) -> bool:
         """
@@ -24,16 +122,49 @@ class SaveAndLogCallback(BaseCallback):
         # Save the model at specified steps
         if self.num_timesteps in self.save_freqs:
             self._save_model(self.num_timesteps)
+
+        if self._episode_lengths is not None:
+            self._episode_lengths += 1
+            infos = self.locals["infos"]
+            for index in np.flatnonzero(self.locals["dones"]):
+                apples = infos[index].get("apples_eaten", 0)
+                # Each list is only emptied by its consumer (telemetry rows, checkpoint scores)
+                if self.telemetry_file:
+                    self._finished_lengths.append(int(self._episode_lengths[index]))
+                    self._finished_apples.append(apples)
+                if self.checkpoint_writer:
+                    self._checkpoint_apples.append(apples)
+                self._episode_lengths[index] = 0
         return True
 
+    def _add_telemetry_row(self, row):
+        self._telemetry_rows.append(row)
+        if len(self._telemetry_rows) >= TELEMETRY_FLUSH_ROWS:
+            self._flush_telemetry()
+
+    def _flush_telemetry(self):
+        """Append the buffered rows to the telemetry file."""
+        if not self._telemetry_rows:
+            return
+        with open(self.telemetry_file, "a") as f:
+            f.writelines(json.dumps(row) + "\n" for row in self._telemetry_rows)
+        self._telemetry_rows = []
+
     def _save_model(self, steps):
         """
         Saves the model and writes logs.
 
         :param steps: Number of training steps.
         """
-        path = f"{self.save_path}/model_{steps}_steps"
-        self.model.save(path)
+        if self.checkpoint_writer:
+            # Only a snapshot is taken here, the checkpoint is written in the background
+            path = self.checkpoint_writer.save(self.model, steps)
+            if self._checkpoint_apples:
+                self.checkpoint_writer.set_score(steps, float(np.mean(self._checkpoint_apples)))
+            self._checkpoint_apples = []
+        else:
+            path = f"{self.save_path}/model_{steps}_steps"
+            self.model.save(path)
 
         # Calculate time elapsed since last checkpoint
         now = datetime.now()
@@ -49,4 +180,14 @@ class SaveAndLogCallback(BaseCallback):
 
         if self.log_file:
             with open(self.log_file, "a") as f:
-                f.write(f"Model saved at {path}, Time since last checkpoint: {time_since_last:.2f} seconds\n")
\ No newline at end of file
+                f.write(f"Model saved at {path}, Time since last checkpoint: {time_since_last:.2f} seconds\n")
+
+        if self.profile_env:
+            # Times of all the workers, then start again for the next checkpoint
+            profile = format_profile(aggregate_profiles(self.training_env.env_method("get_profile")))
+            self.training_env.env_method("reset_profile")
+            if self.verbose > 0:
+                print(f"Environment profile since last checkpoint:\n{profile}")
+            if self.log_file:
+                with open(self.log_file, "a") as f:
+                    f.write(f"Environment profile at {steps} steps:\n{profile}\n")
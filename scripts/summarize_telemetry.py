@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import argparse
+
+def read_rows(path):
+    """Yields the rollouts of a telemetry file written by SaveAndLogCallback."""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def weighted_mean(pairs):
+    """Mean of values weighted by counts, None values ignored."""
+    pairs = [(value, weight) for value, weight in pairs if value is not None and weight]
+    total = sum(weight for _, weight in pairs)
+    return sum(value * weight for value, weight in pairs) / total if total else None
+
+def summarize(rows, window):
+    """
+    Groups the rollouts by windows of training steps.
+
+    :param rows: Telemetry rows.
+    :param window: Number of training steps per window.
+    :return: One dict per window with the throughput, time split, episodes and memory.
+    """
+    windows = {}
+    for row in rows:
+        windows.setdefault((row["num_timesteps"] - 1) // window, []).append(row)
+
+    summary = []
+    for index in sorted(windows):
+        rollouts = windows[index]
+        # The last rollout of a run has no update time: left out of the throughput, not counted as 100% collection
+        timed = [row for row in rollouts if row["update_seconds"] is not None]
+        steps = sum(row["steps"] for row in timed)
+        collect = sum(row["collect_seconds"] for row in timed)
+        update = sum(row["update_seconds"] for row in timed)
+        elapsed = collect + update
+        summary.append({
+            "start": index * window,
+            "end": rollouts[-1]["num_timesteps"],
+            "steps_per_second": steps / elapsed if elapsed else None,
+            "collect_share": collect / elapsed if elapsed else None,
+            "episode_length": weighted_mean((row["mean_episode_length"], row["episodes"]) for row in rollouts),
+            "apples": weighted_mean((row["mean_apples"], row["episodes"]) for row in rollouts),
+            "rss_mb": max((row["rss_mb"] for row in rollouts if row["rss_mb"] is not None), default=None),
+        })
+    return summary
+
+def format_value(value, spec):
+    return "-" if value is None else format(value, spec)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the throughput telemetry of a training run.")
+    parser.add_argument("--file", type=str, default=os.path.join("logs", "telemetry.jsonl"),
+                        help="Telemetry file written during training.")
+    parser.add_argument("--window", type=int, default=None,
+                        help="Training steps per row of the summary (default: 20 rows over the run).")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        print(f"Telemetry file {args.file} not found.")
+        sys.exit(1)
+
+    rows = list(read_rows(args.file))
+    if not rows:
+        print(f"No rollout in {args.file}.")
+        sys.exit(1)
+
+    window = args.window or max(1, rows[-1]["num_timesteps"] // 20)
+    summary = summarize(rows, window)
+
+    print(f"{'steps':>25} {'steps/s':>10} {'collect':>8} {'ep length':>10} {'apples':>8} {'RSS (MB)':>9}")
+    for row in summary:
+        print(f"{row['start']:>12,}-{row['end']:<12,} {format_value(row['steps_per_second'], '10.0f'):>10} "
+              f"{format_value(row['collect_share'], '8.0%'):>8} {format_value(row['episode_length'], '10.1f'):>10} "
+              f"{format_value(row['apples'], '8.2f'):>8} {format_value(row['rss_mb'], '9.0f'):>9}")
+
+    total_seconds = sum(row["collect_seconds"] + (row["update_seconds"] or 0.0) for row in rows)
+    print(f"\n{rows[-1]['num_timesteps']:,} steps in {total_seconds / 3600:.2f} h", end="")
+    throughputs = [row["steps_per_second"] for row in summary if row["steps_per_second"] is not None]
+    if throughputs:
+        first, last = throughputs[0], throughputs[-1]
+        print(f", throughput {first:.0f} -> {last:.0f} steps/s ({last / first - 1:+.1%})", end="")
+    print()
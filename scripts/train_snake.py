@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 import torch
 from stable_baselines3 import PPO
 from stable_baselines3.common.vec_env import SubprocVecEnv
@@ -10,49 +11,181 @@ print(f"Path added to sys.path: {parent_path}")
 sys.path.append(parent_path)
 
 from src.rl.snake_env import SnakeEnv
+from src.rl.vec_snake_env import VecSnakeEnv
+from src.rl.shared_memory_vec_env import SharedMemoryVecEnv
+from src.rl.feature_extractor import CompactSnakeExtractor, SnakeExtractor
+from src.rl.frame_buffer import get_frame_stack_buffer_class
 from scripts.save_callback import SaveAndLogCallback
+from scripts.checkpoint_writer import CheckpointWriter, RetentionPolicy
+from src.rl.checkpoint_store import CheckpointStore
 
 # Limit PyTorch to 12 threads to avoid CPU overload
-torch.set_num_threads(12)
+TORCH_THREADS = 12
 
 # Number of parallel environments
 N_ENVS = 12
 
-# Maximum folder size in GB before stopping training
+# Steps collected per environment between two updates, and minibatch size of the updates
+N_STEPS = 4096
+BATCH_SIZE = 256
+
+# Type of vectorized environment:
+# "batched" steps all the games in one process with NumPy (VecSnakeEnv), it scales to hundreds of envs,
+# "subproc" runs one SnakeEnv per process (SubprocVecEnv),
+# "shared" runs one SnakeEnv per process exchanging data through shared memory (SharedMemoryVecEnv)
+VEC_ENV_TYPE = "batched"
+
+# Size of the board (width, height)
+GRID_SIZE = (10, 10)
+
+# Observation mode: "full" (11 channels as planes) or "compact" (4 planes and a small
+# vector for direction, dx, dy and danger, about 3x smaller), or "egocentric" for large
+# boards (e.g. 32x32 or 64x64): a WINDOW_SIZE x WINDOW_SIZE window centred on the head and
+# global features, same size whatever GRID_SIZE ("subproc" and "shared" environments only)
+OBSERVATION_MODE = "full"
+WINDOW_SIZE = 11
+
+# Observation dtype: "float32", or "uint8" to divide the rollout buffer and IPC traffic by 4
+# (dx and dy are quantized with an error below 1/254, see src/rl/snake_env.py)
+OBSERVATION_DTYPE = "float32"
+
+# Mask the moves that end the game at once (walls, body) with MaskablePPO (requires sb3-contrib):
+# no rollout sample is spent on a suicidal move
+ACTION_MASKING = False
+
+# Store each state of the stacked observations once in the rollout buffer instead of history_length
+# times (about 4x less rollout memory, identical minibatches), see src/rl/frame_buffer.py
+FRAME_STACK_BUFFER = False
+
+# Time the phases of SnakeEnv.step and report them at each checkpoint
+# (only for the "subproc" and "shared" environments, VecSnakeEnv has no per-phase timing)
+PROFILE_ENV = False
+
+# Retention policy of the checkpoints: above MAX_FOLDER_SIZE_GB the oldest checkpoints are removed,
+# except multiples of KEEP_EVERY_STEPS, the KEEP_BEST best ones (mean apples of the training
+# episodes before each checkpoint) and the last one
 MAX_FOLDER_SIZE_GB = 30
+KEEP_EVERY_STEPS = 10_000_000
+KEEP_BEST = 5
+
+# Checkpoints are written to a CheckpointStore (see src/rl/checkpoint_store.py): indexed by a manifest,
+# compressed weights only, except every RESUMABLE_EVERY_STEPS steps where the optimizer state is kept to
+# resume the training, and delta-encoded with DELTA_CHECKPOINTS. CHECKPOINT_STORE = False writes SB3 zips
+CHECKPOINT_STORE = True
+RESUMABLE_EVERY_STEPS = 10_000_000
+DELTA_CHECKPOINTS = True
 
-def make_env(rank):
+# Throughput settings measured on this machine by scripts/autotune.py: when the file exists, its
+# n_envs, vec_env_type, torch_threads, n_steps and batch_size replace the values above (ignored if
+# it was tuned for other observations or its vectorized environment cannot run the ones above)
+TUNED_CONFIG_FILE = os.path.join(parent_path, "train_config.json")
+
+# Vectorized environments whose SnakeEnvs can time the phases of their steps (PROFILE_ENV)
+PROFILED_VEC_ENV_TYPES = ("subproc", "shared")
+
+def get_tuned_config_mismatch(tuned):
+    """Why the autotune settings tuned cannot be used with the constants above, None if they can."""
+    observation = tuned.get("observation")
+    if observation is None:
+        return "no observation settings recorded"
+    current = {"mode": OBSERVATION_MODE, "dtype": OBSERVATION_DTYPE, "grid_size": list(GRID_SIZE)}
+    for key, value in current.items():
+        if observation.get(key) != value:
+            return f"tuned for observation {key} {observation.get(key)}, training uses {value}"
+    vec_env_type = tuned.get("vec_env_type", VEC_ENV_TYPE)
+    # VecSnakeEnv has no egocentric observation and no per-phase timing
+    if vec_env_type == "batched" and OBSERVATION_MODE == "egocentric":
+        return "the batched vectorized environment has no egocentric observation"
+    if PROFILE_ENV and vec_env_type not in PROFILED_VEC_ENV_TYPES:
+        return f"PROFILE_ENV is not supported by the {vec_env_type!r} vectorized environment"
+    return None
+
+def load_tuned_config(path=TUNED_CONFIG_FILE):
+    """Throughput settings of train_snake.py, from the autotune file when there is one that fits."""
+    config = {
+        "n_envs": N_ENVS,
+        "vec_env_type": VEC_ENV_TYPE,
+        "torch_threads": TORCH_THREADS,
+        "n_steps": N_STEPS,
+        "batch_size": BATCH_SIZE,
+    }
+    if os.path.exists(path):
+        with open(path) as f:
+            tuned = json.load(f)
+        mismatch = get_tuned_config_mismatch(tuned)
+        if mismatch:
+            print(f"Warning: tuned settings of {path} ignored ({mismatch}), rerun scripts/autotune.py. "
+                  f"Using the defaults of train_snake.py")
+            return config
+        config.update({key: tuned[key] for key in config if key in tuned})
+        print(f"Tuned settings loaded from {path}: " + ", ".join(f"{key}={value}" for key, value in config.items()))
+    return config
+
+def make_env(rank, observation_mode="full", observation_dtype="float32", grid_size=(10, 10), window_size=11):
     """Creates a Snake environment with a specific seed."""
     def _init():
-        env = SnakeEnv(grid_size=(10, 10))
+        # The vectorized environments copy each observation at once (pipe or shared memory): no copy in SnakeEnv
+        env = SnakeEnv(grid_size=grid_size, observation_mode=observation_mode, observation_dtype=observation_dtype,
+                       window_size=window_size, copy_observations=False)
         env.seed(rank)
         return env
     return _init
 
-def get_folder_size(folder_path):
-    """Calculates the total size of a folder in bytes."""
-    total_size = 0
-    for dirpath, dirnames, filenames in os.walk(folder_path):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            total_size += os.path.getsize(fp)
-    return total_size
-
-def check_folder_size_and_warn(folder_path, max_size_gb):
-    """Checks if the folder size exceeds the limit."""
-    folder_size_bytes = get_folder_size(folder_path)
-    folder_size_gb = folder_size_bytes / (1024 ** 3)  # Conversion to GB
-    if folder_size_gb > max_size_gb:
-        warning_file = os.path.join(folder_path, "warning_30go.txt")
-        with open(warning_file, "w") as f:
-            f.write(f"Warning: Folder size has exceeded {max_size_gb} GB ({folder_size_gb:.2f} GB).\n")
-        print(f"Training stopped: Folder size has exceeded {max_size_gb} GB.")
-        exit(1)  # Stop the script
+def make_vec_env(n_envs, vec_env_type, observation_mode="full", observation_dtype="float32", grid_size=(10, 10),
+                 window_size=11, profile=False):
+    """Creates the vectorized environment used for training, with profile its environments time their steps."""
+    if profile and vec_env_type not in PROFILED_VEC_ENV_TYPES:
+        raise ValueError(
+            f"PROFILE_ENV is not supported by the {vec_env_type!r} vectorized environment, "
+            f"use one of: {', '.join(PROFILED_VEC_ENV_TYPES)}"
+        )
+    if vec_env_type == "batched":
+        return VecSnakeEnv(
+            n_envs, grid_size=grid_size, seed=0,
+            observation_mode=observation_mode, observation_dtype=observation_dtype
+        )
+    env_fns = [make_env(i, observation_mode, observation_dtype, grid_size, window_size) for i in range(n_envs)]
+    if vec_env_type == "subproc":
+        env = SubprocVecEnv(env_fns)
+    elif vec_env_type == "shared":
+        env = SharedMemoryVecEnv(env_fns)
+    else:
+        raise ValueError(f"Unknown vectorized environment type: {vec_env_type}")
+    if profile:
+        env.env_method("enable_profiling")
+    return env
+
+def make_model(env, observation_mode="full", observation_dtype="float32", action_masking=False,
+               frame_stack_buffer=False, **kwargs):
+    """
+    PPO (or MaskablePPO with action_masking) with the policy matching the observation mode and dtype,
+    and with frame_stack_buffer a rollout buffer storing each observed state once.
+    """
+    # The compact and egocentric observations are Dicts, flattened by their own feature extractor,
+    # uint8 observations need SnakeExtractor to decode dx and dy
+    if observation_mode in ("compact", "egocentric"):
+        policy = "MultiInputPolicy"
+        policy_kwargs = dict(features_extractor_class=CompactSnakeExtractor)
+    elif observation_dtype == "uint8":
+        policy = "MlpPolicy"
+        policy_kwargs = dict(features_extractor_class=SnakeExtractor)
+    else:
+        policy = "MlpPolicy"
+        policy_kwargs = None
+
+    if frame_stack_buffer:
+        kwargs["rollout_buffer_class"] = get_frame_stack_buffer_class(
+            observation_mode in ("compact", "egocentric"), action_masking
+        )
+
+    if action_masking:
+        # Imported here: sb3-contrib is only needed to train with action masks
+        from sb3_contrib import MaskablePPO
+        return MaskablePPO(policy, env, policy_kwargs=policy_kwargs, **kwargs)
+    return PPO(policy, env, policy_kwargs=policy_kwargs, **kwargs)
 
 if __name__ == "__main__":
-    # Check folder size before starting
     project_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    check_folder_size_and_warn(project_folder, MAX_FOLDER_SIZE_GB)
 
     # Create logs directory
     logs_dir = os.path.join(project_folder, "logs")
@@ -60,9 +193,17 @@ if __name__ == "__main__":
 
     # Log file for steps
     log_file_steps = os.path.join(logs_dir, "logs_steps.txt")
+    # One JSON row per rollout (throughput, episodes, memory), see scripts/summarize_telemetry.py
+    telemetry_file = os.path.join(logs_dir, "telemetry.jsonl")
+
+    config = load_tuned_config()
+    torch.set_num_threads(config["torch_threads"])
 
     # Create multiple parallel environments
-    env = SubprocVecEnv([make_env(i) for i in range(N_ENVS)])
+    env = make_vec_env(
+        config["n_envs"], config["vec_env_type"], OBSERVATION_MODE, OBSERVATION_DTYPE, GRID_SIZE, WINDOW_SIZE,
+        profile=PROFILE_ENV
+    )
 
     # Folder to save models
     save_path_steps = "checkpoints_by_steps"
@@ -78,11 +219,14 @@ if __name__ == "__main__":
     )
 
     # Model initialization
-    model = PPO(
-        "MlpPolicy",
+    model = make_model(
         env,
-        n_steps=4096,  # Collected trajectories
-        batch_size=256,  # Mini-batch size
+        OBSERVATION_MODE,
+        OBSERVATION_DTYPE,
+        ACTION_MASKING,
+        FRAME_STACK_BUFFER,
+        n_steps=config["n_steps"],  # Collected trajectories
+        batch_size=config["batch_size"],  # Mini-batch size
         learning_rate=1e-4,  # Learning rate
         ent_coef=0.01,  # Exploration
         verbose=0,
@@ -93,7 +237,19 @@ if __name__ == "__main__":
     callback_steps = SaveAndLogCallback(
         save_freqs=save_freqs_steps,
         save_path=save_path_steps,
-        log_file=log_file_steps
+        log_file=log_file_steps,
+        profile_env=PROFILE_ENV,
+        telemetry_file=telemetry_file,
+        # Checkpoints are written in a background thread, old ones pruned to stay under MAX_FOLDER_SIZE_GB
+        checkpoint_writer=CheckpointWriter(
+            save_path_steps,
+            retention=RetentionPolicy(
+                max_total_gb=MAX_FOLDER_SIZE_GB, keep_every=KEEP_EVERY_STEPS, keep_best=KEEP_BEST
+            ),
+            store=CheckpointStore(save_path_steps) if CHECKPOINT_STORE else None,
+            resumable_every=RESUMABLE_EVERY_STEPS,
+            delta=DELTA_CHECKPOINTS,
+        )
     )
 
     model.learn(total_timesteps=1_000_000_000, callback=callback_steps)
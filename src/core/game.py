@@ -1,51 +1,76 @@
+import random
+from collections import deque
+
+import numpy as np
+
+
 class game:
-    def __init__(self, width, height) -> None:
+    def __init__(self, width, height, seed=None) -> None:
         """Initialize the Snake game with a grid of specified dimensions"""
         self.width = width
         self.height = height
-        self.grid = []
-        self.snake = []
+        # Random generator used to place the food
+        self.rng = random.Random(seed)
+        self.grid = np.zeros((height, width), dtype=np.int8)
+        self.snake = deque()
         self.snakehead = []
+        # Occupancy bitmap of the body segments, indexed by y * width + x
+        self.body_cells = bytearray(width * height)
+        # Index of the free cells (neither head nor body): free_cells holds the cell numbers
+        # and free_index gives the position of each cell in free_cells (-1 if occupied)
+        self.free_cells = []
+        self.free_index = [-1] * (width * height)
         self.food = None
         self.game_over = False
         self.win = False
 
+    def seed(self, seed=None):
+        """Seed the random generator used to place the food"""
+        self.rng.seed(seed)
+
     def init_grid(self):
         """Create an empty grid filled with zeros"""
-        self.grid = []
-        for ligne in range(self.height):
-            self.grid.append([])
-            for colonne in range(self.width):
-                self.grid[ligne].append(0)
+        self.grid = np.zeros((self.height, self.width), dtype=np.int8)
 
     def clear_grid(self):
-        """Reset the grid"""
-        self.grid = []
-        self.init_grid()
+        """Reset the grid (in place)"""
+        self.grid.fill(0)
 
     def print_grid(self):
         """Display the grid in the console"""
         for ligne in range(len(self.grid)):
-            print(self.grid[ligne])
+            print(self.grid[ligne].tolist())
 
     def init_snake(self):
         """Initialize the snake at the center of the grid"""
         firstx = int(self.width / 2)
         firsty = int(self.height / 2)
-        self.snakehead = [firstx, firsty]
         
         # Create a snake with 2 body segments
-        self.snake = [
-            [firstx - 1, firsty],
-            [firstx - 2, firsty]
-        ]
+        self.set_snake([firstx, firsty], [[firstx - 1, firsty], [firstx - 2, firsty]])
+
+    def set_snake(self, head, body):
+        """Put the snake at the given position (body from the neck to the tail) and place the food"""
+        self.snakehead = list(head)
+        self.snake = deque([list(segment) for segment in body])
+        self.body_cells = bytearray(self.width * self.height)
+        for posx, posy in self.snake:
+            self.body_cells[posy * self.width + posx] = 1
+        
+        self.free_cells = []
+        self.free_index = [-1] * (self.width * self.height)
+        for cell in range(self.width * self.height):
+            self.release_cell(cell)
+        self.occupy_cell(self.snakehead[1] * self.width + self.snakehead[0])
+        for posx, posy in self.snake:
+            self.occupy_cell(posy * self.width + posx)
         
         self.game_over = False
         self.win = False
         self.place_food()
 
     def update_snake(self):
-        """Update the snake display on the grid"""
+        """Redraw the whole snake on the grid (only needed after a reset, move patches the grid)"""
         self.clear_grid()
         
         # Head = 2, Body = 1, Food = 3
@@ -61,18 +86,25 @@ class game:
             foodx, foody = self.food
             self.grid[foody][foodx] = 3
 
+    def occupy_cell(self, cell):
+        """Remove a cell from the free cells (swap with the last one and pop)"""
+        position = self.free_index[cell]
+        last = self.free_cells[-1]
+        self.free_cells[position] = last
+        self.free_index[last] = position
+        self.free_cells.pop()
+        self.free_index[cell] = -1
+
+    def release_cell(self, cell):
+        """Add a cell to the free cells"""
+        self.free_index[cell] = len(self.free_cells)
+        self.free_cells.append(cell)
+
     def place_food(self):
         """Place food randomly on an empty cell"""
-        import random
-        
-        free_positions = []
-        for y in range(self.height):
-            for x in range(self.width):
-                if [x, y] != self.snakehead and [x, y] not in self.snake:
-                    free_positions.append([x, y])
-        
-        if free_positions:
-            self.food = random.choice(free_positions)
+        if self.free_cells:
+            cell = self.free_cells[self.rng.randrange(len(self.free_cells))]
+            self.food = [cell % self.width, cell // self.width]
         else:
             self.food = None
             self.win = True
@@ -84,7 +116,7 @@ class game:
         if next_x < 0 or next_x >= self.width or next_y < 0 or next_y >= self.height:
             return True
         
-        if [next_x, next_y] in self.snake:
+        if self.body_cells[next_y * self.width + next_x]:
             return True
         
         return False
@@ -120,18 +152,29 @@ class game:
             
             eat_food = (self.food and next_x == self.food[0] and next_y == self.food[1])
             
-            self.snake.insert(0, self.snakehead.copy())
+            # Only the cells that change are patched on the grid
+            # (old head becomes body, tail is freed, new head, new food)
+            headx, heady = self.snakehead
+            self.snake.appendleft(self.snakehead.copy())
+            self.body_cells[heady * self.width + headx] = 1
+            self.grid[heady, headx] = 1
             
             if not eat_food and len(self.snake) > 0:
-                self.snake.pop()
+                tailx, taily = self.snake.pop()
+                self.body_cells[taily * self.width + tailx] = 0
+                self.release_cell(taily * self.width + tailx)
+                self.grid[taily, tailx] = 0
                 
             self.snakehead = [next_x, next_y]
+            self.occupy_cell(next_y * self.width + next_x)
+            self.grid[next_y, next_x] = 2
             
             if eat_food:
                 self.food = None
                 self.place_food()
-                
-            self.update_snake()
+                if self.food:
+                    foodx, foody = self.food
+                    self.grid[foody, foodx] = 3
         else:
             self.clear_grid()
             self.init_snake()
@@ -0,0 +1,130 @@
+import base64
+import json
+
+import numpy as np
+
+from src.core.game import game
+
+# Version of the episode records written by ReplayWriter
+REPLAY_VERSION = 1
+
+def pack_actions(actions):
+    """Pack actions (0 to 3) on 2 bits each, 4 actions per byte."""
+    actions = np.asarray(actions, dtype=np.uint8)
+    padded = np.zeros(-(-len(actions) // 4) * 4, dtype=np.uint8)
+    padded[:len(actions)] = actions
+    packed = padded.reshape(-1, 4) << np.array([0, 2, 4, 6], dtype=np.uint8)
+    return np.bitwise_or.reduce(packed, axis=1).astype(np.uint8).tobytes()
+
+def unpack_actions(data, num_actions):
+    """Inverse of pack_actions."""
+    packed = np.frombuffer(data, dtype=np.uint8)
+    actions = (packed[:, None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3
+    return actions.reshape(-1)[:num_actions]
+
+class EpisodeRecorder:
+    def __init__(self, seed, grid_size):
+        """
+        Records an episode played from env.reset(seed=seed): the actions and the food positions.
+
+        :param seed: Seed given to the reset of the episode.
+        :param grid_size: Size of the grid (width, height).
+        """
+        self.seed = seed
+        self.grid_size = tuple(grid_size)
+        self.actions = []
+        self.foods = []
+
+    def record_food(self, g):
+        """Add the food of the game if it changed (call it after the reset and after each step)."""
+        if g.food is None:
+            return
+        cell = g.food[1] * g.width + g.food[0]
+        if not self.foods or self.foods[-1] != cell:
+            self.foods.append(cell)
+
+    def record_step(self, action, g):
+        self.actions.append(int(action))
+        self.record_food(g)
+
+    def to_record(self, **metadata):
+        """JSON-serializable record of the episode, about 1 byte per 3 steps once encoded."""
+        return {
+            "version": REPLAY_VERSION,
+            "seed": self.seed,
+            "grid_size": list(self.grid_size),
+            "num_steps": len(self.actions),
+            "actions": base64.b64encode(pack_actions(self.actions)).decode("ascii"),
+            "foods": self.foods,
+            **metadata,
+        }
+
+class ReplayWriter:
+    def __init__(self, path):
+        """
+        Appends episode records to a JSONL file, one line per episode.
+
+        :param path: Path to the replay file.
+        """
+        self.path = path
+        self.file = open(path, "a")
+
+    def write(self, recorder, **metadata):
+        """Write the episode of an EpisodeRecorder, with optional metadata (model, apples...)."""
+        self.file.write(json.dumps(recorder.to_record(**metadata)) + "\n")
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_replays(path):
+    """Yields the episode records of a replay file."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def replay_episode(record):
+    """
+    Rebuild the states of a recorded episode.
+
+    The game is reset with the recorded seed like SnakeEnv.reset, so the food
+    positions follow from the actions; they are checked against the recorded
+    ones to detect a change of the game rules.
+
+    :param record: Episode record (see EpisodeRecorder.to_record).
+    :return: Generator of the game after the reset and after each action (the same object is updated).
+    """
+    width, height = record["grid_size"]
+    g = game(width, height, seed=record["seed"])
+    g.init_grid()
+    g.init_snake()
+    g.update_snake()
+
+    foods = iter(record["foods"])
+    expected_food = next(foods, None)
+
+    def check_food(new_food_allowed=True):
+        nonlocal expected_food
+        if g.food is None:
+            return
+        cell = g.food[1] * width + g.food[0]
+        if cell != expected_food and new_food_allowed:
+            # A new food must be the next recorded one
+            expected_food = next(foods, None)
+        if cell != expected_food:
+            raise ValueError(f"Replay diverged: food at {g.food}, recorded cell {expected_food}")
+
+    check_food(new_food_allowed=False)
+    yield g
+
+    actions = unpack_actions(base64.b64decode(record["actions"]), record["num_steps"])
+    for action in actions:
+        g.move(int(action))
+        check_food()
+        yield g
@@ -1,78 +1,75 @@
-import pygame
 import numpy as np
 import sys
 
+from src.core.video import cells_to_frame
+
 class SnakeVisualizer:
-    def __init__(self, grid_size, cell_size=20):
-        """Initialize the visual display of the Snake game"""
+    def __init__(self, grid_size, cell_size=20, headless=False, fps=10):
+        """
+        Initialize the visual display of the Snake game
+
+        :param grid_size: Size of the grid (width, height).
+        :param cell_size: Size of a cell in pixels.
+        :param headless: Only build the frames (no window, no pygame display, works without X).
+        :param fps: Maximum frames per second of the window (None = no limit).
+        """
         self.grid_size = grid_size
         self.cell_size = cell_size
+        self.headless = headless
+        self.fps = fps
+        self.screen = None
         
         # Calculate screen size in pixels
         self.screen_size = (grid_size[0] * cell_size, grid_size[1] * cell_size)
         
-        # Initialize Pygame
-        pygame.init()
-        self.screen = pygame.display.set_mode(self.screen_size)
-        pygame.display.set_caption("Snake Game")
-        self.clock = pygame.time.Clock()
+        if not headless:
+            # Imported here so the headless mode does not need pygame
+            import pygame
+            self.pygame = pygame
 
-    def render(self, observation):
-        """Display the current state of the Snake game"""
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-
-        self.screen.fill((0, 0, 0))
+            # Initialize Pygame
+            pygame.init()
+            self.screen = pygame.display.set_mode(self.screen_size)
+            pygame.display.set_caption("Snake Game")
+            self.clock = pygame.time.Clock()
 
+    def observation_to_cells(self, observation):
+        """Grid of cell values (0: empty, 1: body, 2: head, 3: apple) from the channels of an observation"""
         # If the observation is flat (1D), reshape it to 3D
         if len(observation.shape) == 1:
-            # The AI uses 11 information channels
-            num_channels = 11
-            observation = observation.reshape((num_channels, self.grid_size[0], self.grid_size[1]))
+            observation = observation.reshape((-1, self.grid_size[1], self.grid_size[0]))
 
-        # Extract the 3 main channels for display
-        body_channel = observation[0]  # Where the body segments are
-        head_channel = observation[1]  # Where the head is
-        apple_channel = observation[2]  # Where the apple is
+        # Channels 0, 1 and 2 are the body, the head and the apple,
+        # drawn in this order so the apple is on top, then the head
+        cells = (observation[0] == 1).astype(np.uint8)
+        cells[observation[1] == 1] = 2
+        cells[observation[2] == 1] = 3
+        return cells
 
-        # Draw the snake BODY (in green)
-        for x in range(self.grid_size[0]):
-            for y in range(self.grid_size[1]):
-                if body_channel[x, y] == 1:  # If a body segment is present
-                    pygame.draw.rect(
-                        self.screen,
-                        (0, 255, 0),  # Green color
-                        pygame.Rect(y * self.cell_size, x * self.cell_size, 
-                                   self.cell_size, self.cell_size)
-                    )
+    def render(self, observation):
+        """
+        Display the current state of the Snake game
 
-        # Draw the snake HEAD (in blue)
-        for x in range(self.grid_size[0]):
-            for y in range(self.grid_size[1]):
-                if head_channel[x, y] == 1:  # If the head is present
-                    pygame.draw.rect(
-                        self.screen,
-                        (0, 0, 255),  # Blue color
-                        pygame.Rect(y * self.cell_size, x * self.cell_size, 
-                                   self.cell_size, self.cell_size)
-                    )
+        :return: RGB frame of shape (height * cell_size, width * cell_size, 3).
+        """
+        frame = cells_to_frame(self.observation_to_cells(observation), self.cell_size)
+        if self.headless:
+            return frame
 
-        # Draw the APPLE (in red)
-        for x in range(self.grid_size[0]):
-            for y in range(self.grid_size[1]):
-                if apple_channel[x, y] == 1:  # If an apple is present
-                    pygame.draw.rect(
-                        self.screen,
-                        (255, 0, 0),  # Red color
-                        pygame.Rect(y * self.cell_size, x * self.cell_size, 
-                                   self.cell_size, self.cell_size)
-                    )
+        pygame = self.pygame
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
 
+        # surfarray is indexed (x, y)
+        pygame.surfarray.blit_array(self.screen, frame.transpose(1, 0, 2))
         pygame.display.flip()
-        self.clock.tick(10)
+        if self.fps:
+            self.clock.tick(self.fps)
+        return frame
 
     def close(self):
         """Close the Pygame window"""
-        pygame.quit()
\ No newline at end of file
+        if not self.headless:
+            self.pygame.quit()
@@ -0,0 +1,305 @@
+import contextlib
+import hashlib
+import io
+import json
+import os
+import re
+import time
+import zipfile
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: the manifest is not locked between processes
+    fcntl = None
+
+MANIFEST_FILE = "manifest.json"
+STORE_FORMAT_VERSION = 1
+LEGACY_CHECKPOINT_PATTERN = re.compile(r"^model_(\d+)_steps\.zip$")
+
+# Saved by SB3 but useless in a snapshot: the last observations of the training environments
+# (most of the "data" entry), the environment is reset when a training is resumed
+EXCLUDED_DATA = ("_last_obs", "_last_episode_starts", "_last_original_obs")
+
+def _encode(array, base=None):
+    """
+    Bytes of an array, XORed with the bits of base (same shape and dtype) if given, then shuffled
+    byte plane by byte plane: the sign, exponent and high mantissa bytes of close weights are
+    mostly equal (zeros once XORed) and compress far better than interleaved.
+    """
+    array = np.ascontiguousarray(array)
+    if base is not None:
+        bits = np.dtype(f"u{array.itemsize}")
+        array = array.view(bits) ^ np.ascontiguousarray(base).view(bits)
+    return array.view(np.uint8).reshape(-1, array.itemsize).T.tobytes()
+
+def _decode(buffer, dtype, shape, base=None):
+    dtype = np.dtype(dtype)
+    array = np.frombuffer(buffer, dtype=np.uint8).reshape(dtype.itemsize, -1).T.copy().view(dtype).reshape(shape)
+    if base is not None:
+        bits = np.dtype(f"u{dtype.itemsize}")
+        array = (array.view(bits) ^ np.ascontiguousarray(base).view(bits)).view(dtype)
+    return array
+
+def hash_weights(weights):
+    """SHA-256 of the policy weights (names, dtypes, shapes and values): the same for the same model, whatever the encoding."""
+    digest = hashlib.sha256()
+    for name in sorted(weights):
+        array = np.ascontiguousarray(weights[name])
+        digest.update(f"{name}:{array.dtype.str}:{array.shape};".encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+class CheckpointStore:
+    def __init__(self, folder, keyframe_every=10, compression_level=6):
+        """
+        Folder of compact checkpoints indexed by a manifest (manifest.json).
+
+        Each checkpoint (model_<steps>_steps.ckpt) is a zip with the SB3 data (hyperparameters,
+        spaces...) and the policy weights, deflated byte plane by byte plane. The optimizer state,
+        two thirds of an SB3 zip, is only kept in resumable checkpoints. With delta encoding, the
+        weights are XORed with those of the last keyframe (a checkpoint stored in full, every
+        keyframe_every checkpoints): reading a checkpoint reads at most two files.
+
+        The manifest gives the steps, time, size, weight hash, training score and evaluation
+        scores of every checkpoint: listing them or finding the latest one reads one file.
+
+        :param folder: Folder of the checkpoints (created if needed).
+        :param keyframe_every: Number of checkpoints between two keyframes when delta encoding.
+        :param compression_level: zlib level of the weights (1 = fastest, 9 = smallest).
+        """
+        self.folder = folder
+        self.keyframe_every = keyframe_every
+        self.compression_level = compression_level
+        self.manifest_path = os.path.join(folder, MANIFEST_FILE)
+        self._keyframe = None  # (steps, weights) of the last keyframe written by this store
+        self._deltas_since_keyframe = 0
+        os.makedirs(folder, exist_ok=True)
+
+    @staticmethod
+    def exists(folder):
+        return os.path.exists(os.path.join(folder, MANIFEST_FILE))
+
+    def get_path(self, steps):
+        return os.path.join(self.folder, f"model_{steps}_steps.ckpt")
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Read-modify-write of the manifest, safe between the training and evaluation processes."""
+        with open(self.manifest_path + ".lock", "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            manifest = self._read_manifest()
+            yield manifest
+            # Written under a temporary name so a crash never leaves a truncated manifest
+            with open(self.manifest_path + ".tmp", "w") as file:
+                json.dump(manifest, file, indent=1)
+            os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+    def _read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {"version": STORE_FORMAT_VERSION, "latest": None, "checkpoints": {}}
+        with open(self.manifest_path) as file:
+            manifest = json.load(file)
+        if manifest["version"] > STORE_FORMAT_VERSION:
+            raise ValueError(f"Checkpoint store {self.folder} has a newer format ({manifest['version']})")
+        return manifest
+
+    def entries(self):
+        """Manifest entries of the checkpoints, sorted by steps."""
+        return sorted(self._read_manifest()["checkpoints"].values(), key=lambda entry: entry["steps"])
+
+    def get(self, steps):
+        """Manifest entry of a checkpoint, None if there is none."""
+        return self._read_manifest()["checkpoints"].get(str(steps))
+
+    def latest(self):
+        """Manifest entry of the checkpoint with the most steps, None if the store is empty."""
+        manifest = self._read_manifest()
+        if manifest["latest"] is None:
+            return None
+        return manifest["checkpoints"][str(manifest["latest"])]
+
+    def write(self, steps, data, params, pytorch_variables=None, resumable=False, delta=False):
+        """
+        Writes a checkpoint and adds it to the manifest.
+
+        :param data, params, pytorch_variables: What model.save writes (see snapshot_model).
+        :param resumable: Keep the optimizer state, to resume the training from this checkpoint.
+        :param delta: Encode the weights as a difference with the last keyframe.
+        :return: Manifest entry of the checkpoint.
+        """
+        # Imported here: reading the manifest (e.g. evaluate_models.py --report) needs neither torch nor SB3
+        import torch as th
+        from stable_baselines3.common.save_util import data_to_json
+
+        weights = {name: value.detach().cpu().numpy() for name, value in params["policy"].items()}
+        base = None
+        if delta and self._keyframe is not None and self._deltas_since_keyframe < self.keyframe_every - 1:
+            base_steps, base_weights = self._keyframe
+            same_shapes = base_weights.keys() == weights.keys() and all(
+                base_weights[name].shape == weights[name].shape and base_weights[name].dtype == weights[name].dtype
+                for name in weights
+            )
+            if same_shapes and self.get(base_steps) is not None:
+                base = base_steps
+
+        data = {key: value for key, value in data.items() if key not in EXCLUDED_DATA}
+        tensors = {}
+        path = self.get_path(steps)
+        with zipfile.ZipFile(path + ".tmp", "w", compression=zipfile.ZIP_DEFLATED,
+                             compresslevel=self.compression_level) as archive:
+            archive.writestr("data", data_to_json(data))
+            for name, array in weights.items():
+                archive.writestr(f"policy/{name}", _encode(array, base_weights[name] if base is not None else None))
+                tensors[name] = {"dtype": array.dtype.str, "shape": list(array.shape)}
+            for name, value in (("policy.optimizer", params.get("policy.optimizer") if resumable else None),
+                                ("pytorch_variables", pytorch_variables)):
+                if value is not None:
+                    buffer = io.BytesIO()
+                    th.save(value, buffer)
+                    archive.writestr(f"{name}.pth", buffer.getvalue())
+            archive.writestr("format.json", json.dumps({
+                "version": STORE_FORMAT_VERSION, "steps": steps, "base": base, "tensors": tensors,
+            }))
+        os.replace(path + ".tmp", path)
+
+        if base is None:
+            self._keyframe = (steps, weights)
+            self._deltas_since_keyframe = 0
+        else:
+            self._deltas_since_keyframe += 1
+
+        entry = {
+            "steps": steps,
+            "file": os.path.basename(path),
+            "time": time.time(),
+            "bytes": os.path.getsize(path),
+            "hash": hash_weights(weights),
+            "resumable": bool(resumable and params.get("policy.optimizer") is not None),
+            "base": base,
+            "score": None,
+            "evaluations": {},
+        }
+        with self._locked() as manifest:
+            manifest["checkpoints"][str(steps)] = entry
+            manifest["latest"] = max(int(key) for key in manifest["checkpoints"])
+        return entry
+
+    def remove(self, steps):
+        """Removes a checkpoint, refused for a keyframe other checkpoints are encoded against."""
+        with self._locked() as manifest:
+            if any(entry["base"] == steps for entry in manifest["checkpoints"].values()):
+                raise ValueError(f"Checkpoint {steps} is the keyframe of other checkpoints")
+            del manifest["checkpoints"][str(steps)]
+            manifest["latest"] = max((int(key) for key in manifest["checkpoints"]), default=None)
+        os.remove(self.get_path(steps))
+        if self._keyframe is not None and self._keyframe[0] == steps:
+            self._keyframe = None
+
+    def set_score(self, steps, score):
+        """Training score of a checkpoint (see CheckpointWriter.set_score)."""
+        with self._locked() as manifest:
+            manifest["checkpoints"][str(steps)]["score"] = score
+
+    def set_evaluation(self, steps, settings_key, avg_apples):
+        """Mean apples of a checkpoint evaluated with these settings (see EvaluationCache.settings_key)."""
+        with self._locked() as manifest:
+            entry = manifest["checkpoints"].get(str(steps))
+            if entry is not None:
+                entry["evaluations"][settings_key] = avg_apples
+
+    def read(self, steps, device="cpu"):
+        """
+        Content of a checkpoint.
+
+        :return: (data, params, pytorch_variables) like load_from_zip_file, params without
+            "policy.optimizer" unless the checkpoint is resumable.
+        """
+        import torch as th
+        from stable_baselines3.common.save_util import json_to_data
+
+        with zipfile.ZipFile(self.get_path(steps)) as archive:
+            header = json.loads(archive.read("format.json"))
+            if header["version"] > STORE_FORMAT_VERSION:
+                raise ValueError(f"Checkpoint {steps} has a newer format ({header['version']})")
+            base = self._read_weights(header["base"]) if header["base"] is not None else None
+            weights = {
+                name: _decode(archive.read(f"policy/{name}"), tensor["dtype"], tensor["shape"],
+                              base[name] if base is not None else None)
+                for name, tensor in header["tensors"].items()
+            }
+            data = json_to_data(archive.read("data").decode())
+            params = {"policy": {name: th.as_tensor(array, device=device) for name, array in weights.items()}}
+            pytorch_variables = None
+            names = archive.namelist()
+            if "policy.optimizer.pth" in names:
+                params["policy.optimizer"] = th.load(io.BytesIO(archive.read("policy.optimizer.pth")),
+                                                     map_location=device, weights_only=True)
+            if "pytorch_variables.pth" in names:
+                pytorch_variables = th.load(io.BytesIO(archive.read("pytorch_variables.pth")),
+                                            map_location=device, weights_only=True)
+        return data, params, pytorch_variables
+
+    def _read_weights(self, steps):
+        with zipfile.ZipFile(self.get_path(steps)) as archive:
+            header = json.loads(archive.read("format.json"))
+            return {
+                name: _decode(archive.read(f"policy/{name}"), tensor["dtype"], tensor["shape"])
+                for name, tensor in header["tensors"].items()
+            }
+
+    def load(self, steps, env=None, device="auto"):
+        """
+        PPO (or MaskablePPO) of a checkpoint, like PPO.load. With env, the training can go on
+        (with the saved optimizer state for a resumable checkpoint, a new one otherwise).
+        """
+        from stable_baselines3.common.utils import check_for_correct_spaces, get_device
+
+        device = get_device(device)
+        data, params, pytorch_variables = self.read(steps, device)
+        if data["policy_class"].__module__.startswith("sb3_contrib.common.maskable"):
+            from sb3_contrib import MaskablePPO as algorithm
+        else:
+            from stable_baselines3 import PPO as algorithm
+
+        data.get("policy_kwargs", {}).pop("device", None)
+        if env is not None:
+            env = algorithm._wrap_env(env, data["verbose"])
+            check_for_correct_spaces(env, data["observation_space"], data["action_space"])
+            data["n_envs"] = env.num_envs
+
+        # Same steps as BaseAlgorithm.load
+        model = algorithm(policy=data["policy_class"], env=env, device=device, _init_setup_model=False)
+        model.__dict__.update(data)
+        model._setup_model()
+        model.policy.load_state_dict(params["policy"])
+        if "policy.optimizer" in params:
+            model.policy.optimizer.load_state_dict(params["policy.optimizer"])
+        for name, value in (pytorch_variables or {}).items():
+            if value is not None:
+                getattr(model, name).data = value.data
+        return model
+
+def get_checkpoint_steps(path):
+    """Number of training steps of a checkpoint of a store (model_<steps>_steps.ckpt)."""
+    match = re.match(r"^model_(\d+)_steps\.ckpt$", os.path.basename(path))
+    if not match:
+        raise ValueError(f"{path} is not a checkpoint of a store")
+    return int(match.group(1))
+
+def list_checkpoints(folder):
+    """
+    (steps, path) of the checkpoints of a folder sorted by steps: read from the manifest of a store,
+    or from the names of the SB3 zips (model_<steps>_steps.zip) of older folders.
+    """
+    if CheckpointStore.exists(folder):
+        store = CheckpointStore(folder)
+        return [(entry["steps"], store.get_path(entry["steps"])) for entry in store.entries()]
+    checkpoints = []
+    for entry in os.scandir(folder):
+        match = LEGACY_CHECKPOINT_PATTERN.match(entry.name)
+        if match:
+            checkpoints.append((int(match.group(1)), entry.path))
+    return sorted(checkpoints)
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS evaluations (
+    checkpoint_hash TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    model_path TEXT NOT NULL,
+    training_steps INTEGER,
+    avg_apples REAL NOT NULL,
+    avg_steps REAL NOT NULL,
+    timeout_rate REAL NOT NULL,
+    total_episodes INTEGER NOT NULL,
+    total_steps INTEGER NOT NULL,
+    episodes TEXT NOT NULL,
+    PRIMARY KEY (checkpoint_hash, settings)
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    checkpoint_hash TEXT NOT NULL
+);
+"""
+
+def get_training_steps(model_path):
+    """Number of training steps in a checkpoint name (model_<steps>_steps.zip), None if there is none."""
+    match = re.search(r"model_(\d+)", os.path.basename(model_path))
+    return int(match.group(1)) if match else None
+
+def hash_file(path, chunk_size=1 << 20):
+    """SHA-256 of the content of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class EvaluationCache:
+    """
+    SQLite cache of checkpoint evaluations.
+
+    Results are keyed by the SHA-256 of the checkpoint file and the evaluation
+    settings (episodes, max steps, seed, environment parameters), so a renamed
+    checkpoint keeps its results and a changed one is evaluated again. File
+    hashes are remembered by path, size and modification time to avoid reading
+    every checkpoint on each run.
+
+    :param path: Path to the SQLite database (created if needed).
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    @staticmethod
+    def settings_key(settings):
+        """Canonical representation of the evaluation settings."""
+        return json.dumps(settings, sort_keys=True)
+
+    def checkpoint_hash(self, model_path):
+        """Hash of a checkpoint, read from the files table when the file has not changed."""
+        stat = os.stat(model_path)
+        path = os.path.abspath(model_path)
+        row = self.connection.execute(
+            "SELECT checkpoint_hash FROM files WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (path, stat.st_size, stat.st_mtime_ns),
+        ).fetchone()
+        if row:
+            return row[0]
+
+        checkpoint_hash = hash_file(model_path)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, checkpoint_hash),
+            )
+        return checkpoint_hash
+
+    def get(self, checkpoint_hash, settings):
+        """Cached results of a checkpoint for these settings, None if it has not been evaluated."""
+        row = self.connection.execute(
+            "SELECT model_path, avg_apples, avg_steps, timeout_rate, total_episodes, total_steps, episodes "
+            "FROM evaluations WHERE checkpoint_hash = ? AND settings = ?",
+            (checkpoint_hash, self.settings_key(settings)),
+        ).fetchone()
+        if row is None:
+            return None
+
+        model_path, avg_apples, avg_steps, timeout_rate, total_episodes, total_steps, episodes = row
+        return {
+            "model_path": model_path,
+            "avg_apples": avg_apples,
+            "avg_steps": avg_steps,
+            "timeout_rate": timeout_rate,
+            "total_episodes": total_episodes,
+            "total_steps": total_steps,
+            "episodes": [tuple(episode) for episode in json.loads(episodes)],
+        }
+
+    def put(self, checkpoint_hash, settings, results):
+        """Stores the results returned by evaluate_model."""
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    checkpoint_hash,
+                    self.settings_key(settings),
+                    results["model_path"],
+                    get_training_steps(results["model_path"]),
+                    results["avg_apples"],
+                    results["avg_steps"],
+                    results["timeout_rate"],
+                    results["total_episodes"],
+                    results["total_steps"],
+                    json.dumps(results["episodes"]),
+                ),
+            )
+
+    def report(self, settings):
+        """
+        Cached results for these settings, one row per checkpoint sorted by training steps.
+
+        :return: List of (training_steps, avg_apples, avg_steps, timeout_rate).
+        """
+        return self.connection.execute(
+            "SELECT training_steps, avg_apples, avg_steps, timeout_rate FROM evaluations "
+            "WHERE settings = ? ORDER BY training_steps, model_path",
+            (self.settings_key(settings),),
+        ).fetchall()
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,163 @@
+import numpy as np
+from stable_baselines3.common.buffers import DictRolloutBuffer, RolloutBuffer
+
+class FrameStore:
+    def __init__(self, buffer_size, n_envs, obs_shape, dtype, history_length=4):
+        """
+        Stacked observations of a rollout (history_length states per observation, oldest first)
+        stored once per state instead of once per observation.
+
+        Each environment has buffer_size + history_length - 1 rows: the states of the first
+        observation older than its newest one, then the newest state of each step. A last row
+        holds the empty state that fills the observations at the start of an episode.
+
+        :param buffer_size: Number of steps per environment.
+        :param n_envs: Number of environments.
+        :param obs_shape: Shape of an observation, its first dimension (or size when flat) made of
+            history_length states.
+        :param dtype: Dtype of the observations.
+        :param history_length: Number of states per observation.
+        """
+        self.buffer_size = buffer_size
+        self.n_envs = n_envs
+        self.obs_shape = tuple(obs_shape)
+        self.history_length = history_length
+        self.frame_size = int(np.prod(obs_shape)) // history_length
+        self.rows_per_env = buffer_size + history_length - 1
+        self.frames = np.zeros((n_envs * self.rows_per_env + 1, self.frame_size), dtype=dtype)
+        self.empty_row = len(self.frames) - 1
+        self.env_rows = np.arange(n_envs) * self.rows_per_env
+        self.index = None
+
+    @property
+    def nbytes(self):
+        return self.frames.nbytes
+
+    def add(self, pos, obs, episode_start):
+        """Store the newest state of the observations of step pos (and the older ones at step 0)."""
+        frames = np.asarray(obs).reshape(self.n_envs, self.history_length, self.frame_size)
+        last = self.history_length - 1
+        self.frames[self.env_rows + last + pos] = frames[:, last]
+        if pos == 0:
+            for state in range(last):
+                self.frames[self.env_rows + state] = frames[:, state]
+        starts = np.flatnonzero(episode_start)
+        if len(starts):
+            # The states before the first one of an episode are empty
+            self.frames[self.empty_row] = frames[starts[0], 0]
+        self.index = None
+
+    def build_index(self, episode_starts):
+        """
+        Rows of the states of each observation, in the order of RolloutBuffer.swap_and_flatten
+        (environment major).
+
+        :param episode_starts: Episode start flags of the rollout, shape (buffer_size, n_envs).
+        """
+        h = self.history_length
+        steps = np.arange(self.buffer_size)[:, None]
+        # Last episode start at or before each step (-h if none in the rollout: no state to hide)
+        last_start = np.where(episode_starts.astype(bool), steps, -h)
+        last_start = np.maximum.accumulate(last_start, axis=0)
+
+        state_steps = steps[:, :, None] + np.arange(1 - h, 1)  # (buffer_size, 1, h)
+        rows = self.env_rows[None, :, None] + (h - 1) + state_steps
+        rows = np.where(state_steps < last_start[:, :, None], self.empty_row, rows)
+        self.index = rows.transpose(1, 0, 2).reshape(-1, h)
+
+    def gather(self, batch_inds):
+        """Observations of the flattened indices batch_inds, rebuilt from the stored states."""
+        return self.frames[self.index[batch_inds]].reshape(len(batch_inds), *self.obs_shape)
+
+class _FrameStackMixin:
+    """
+    Rollout buffer storing each state of the stacked SnakeEnv observations once (see FrameStore):
+    consecutive observations share history_length - 1 of their states, so the observations take
+    about history_length times less memory. The minibatches are identical.
+
+    The parent buffer only holds empty observations, everything else (actions, advantages,
+    action masks of MaskablePPO...) is unchanged.
+    """
+
+    def __init__(self, buffer_size, observation_space, action_space, device="auto", gae_lambda=1, gamma=0.99,
+                 n_envs=1, history_length=4):
+        self.history_length = history_length
+        super().__init__(buffer_size, observation_space, action_space, device, gae_lambda, gamma, n_envs)
+
+    def reset(self):
+        self.frame_store = FrameStore(self.buffer_size, self.n_envs, self.obs_shape, self.observation_space.dtype,
+                                      self.history_length)
+        obs_shape, self.obs_shape = self.obs_shape, (0,)
+        super().reset()
+        self.obs_shape = obs_shape
+
+    def add(self, obs, action, reward, episode_start, value, log_prob, **kwargs):
+        self.frame_store.add(self.pos, obs, episode_start)
+        super().add(np.empty((self.n_envs, 0)), action, reward, episode_start, value, log_prob, **kwargs)
+
+    def get(self, batch_size=None):
+        if not self.generator_ready:
+            self.frame_store.build_index(self.episode_starts)
+        yield from super().get(batch_size)
+
+    def _get_samples(self, batch_inds, env=None):
+        samples = super()._get_samples(batch_inds, env)
+        return samples._replace(observations=self.to_torch(self.frame_store.gather(batch_inds)))
+
+class _FrameStackDictMixin:
+    """_FrameStackMixin for the Dict observations of the compact and egocentric modes (one FrameStore per key)."""
+
+    def __init__(self, buffer_size, observation_space, action_space, device="auto", gae_lambda=1, gamma=0.99,
+                 n_envs=1, history_length=4):
+        self.history_length = history_length
+        super().__init__(buffer_size, observation_space, action_space, device, gae_lambda, gamma, n_envs)
+
+    def reset(self):
+        self.frame_stores = {
+            key: FrameStore(self.buffer_size, self.n_envs, shape, self.observation_space[key].dtype,
+                            self.history_length)
+            for key, shape in self.obs_shape.items()
+        }
+        obs_shape, self.obs_shape = self.obs_shape, {key: (0,) for key in self.obs_shape}
+        super().reset()
+        self.obs_shape = obs_shape
+
+    def add(self, obs, action, reward, episode_start, value, log_prob, **kwargs):
+        for key, frame_store in self.frame_stores.items():
+            frame_store.add(self.pos, obs[key], episode_start)
+        empty = {key: np.empty((self.n_envs, 0)) for key in self.frame_stores}
+        super().add(empty, action, reward, episode_start, value, log_prob, **kwargs)
+
+    def get(self, batch_size=None):
+        if not self.generator_ready:
+            for frame_store in self.frame_stores.values():
+                frame_store.build_index(self.episode_starts)
+        yield from super().get(batch_size)
+
+    def _get_samples(self, batch_inds, env=None):
+        samples = super()._get_samples(batch_inds, env)
+        observations = {
+            key: self.to_torch(frame_store.gather(batch_inds)) for key, frame_store in self.frame_stores.items()
+        }
+        return samples._replace(observations=observations)
+
+class FrameStackRolloutBuffer(_FrameStackMixin, RolloutBuffer):
+    pass
+
+class FrameStackDictRolloutBuffer(_FrameStackDictMixin, DictRolloutBuffer):
+    pass
+
+def get_frame_stack_buffer_class(dict_observations=False, action_masking=False):
+    """
+    Rollout buffer class to pass to PPO (or MaskablePPO with action_masking) as rollout_buffer_class.
+
+    :param dict_observations: True for the Dict observations of the compact and egocentric modes.
+    :param action_masking: True for MaskablePPO, whose buffers also store the action masks.
+    """
+    if not action_masking:
+        return FrameStackDictRolloutBuffer if dict_observations else FrameStackRolloutBuffer
+    # Imported here: sb3-contrib is only needed to train with action masks
+    from sb3_contrib.common.maskable.buffers import MaskableDictRolloutBuffer, MaskableRolloutBuffer
+    if dict_observations:
+        return type("FrameStackMaskableDictRolloutBuffer", (_FrameStackDictMixin, MaskableDictRolloutBuffer), {})
+    return type("FrameStackMaskableRolloutBuffer", (_FrameStackMixin, MaskableRolloutBuffer), {})
@@ -0,0 +1,163 @@
+import queue
+import threading
+from time import perf_counter
+
+import numpy as np
+
+def stack_observations(observations):
+    """Stacks the observations of several environments into one batch (Box or Dict observations)."""
+    if isinstance(observations[0], dict):
+        return {key: np.stack([obs[key] for obs in observations]) for key in observations[0]}
+    return np.stack(observations)
+
+class _Request:
+    __slots__ = ("observation", "action_masks", "time", "done", "action", "error")
+
+    def __init__(self, observation, action_masks=None):
+        self.observation = observation
+        self.action_masks = action_masks
+        self.time = perf_counter()
+        self.done = threading.Event()
+        self.action = None
+        self.error = None
+
+class InferenceServer:
+    def __init__(self, model, max_batch_size=256, max_latency=0.002):
+        """
+        Groups the predictions requested by many games into batches, in a background thread.
+
+        A batch is run as soon as it holds max_batch_size requests, or max_latency seconds
+        after its first request arrived. With one request per game in flight, a
+        max_batch_size equal to the number of games never waits for the deadline.
+
+        :param model: Model with a predict(observations, deterministic=True) method (e.g. a loaded PPO).
+        :param max_batch_size: Maximum number of observations per forward pass.
+        :param max_latency: Maximum time in seconds a request waits for other requests.
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.latencies = []  # Seconds between each request and its answer
+        self.batch_sizes = []
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="inference-server", daemon=True)
+        self.thread.start()
+
+    def predict(self, observation, action_masks=None):
+        """
+        Action of the model for one observation, blocks until its batch is done (thread-safe).
+
+        :param action_masks: Allowed actions, for models trained with MaskablePPO (given for every request or none).
+        """
+        request = _Request(observation, action_masks)
+        self.requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.action
+
+    def _next_batch(self):
+        """Waits for a first request, then collects requests until the batch is full or the deadline passes."""
+        first = self.requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first.time + self.max_latency
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - perf_counter()
+            try:
+                # Requests already queued are taken even after the deadline
+                request = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # Stop once this batch is answered
+                self.requests.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                observations = stack_observations([request.observation for request in batch])
+                if batch[0].action_masks is not None:
+                    masks = np.stack([request.action_masks for request in batch])
+                    actions, _ = self.model.predict(observations, deterministic=True, action_masks=masks)
+                else:
+                    actions, _ = self.model.predict(observations, deterministic=True)
+            except Exception as e:
+                # Raised in the games instead of killing the server silently
+                actions = [None] * len(batch)
+                for request in batch:
+                    request.error = e
+
+            now = perf_counter()
+            self.batch_sizes.append(len(batch))
+            for request, action in zip(batch, actions):
+                request.action = action
+                self.latencies.append(now - request.time)
+                request.done.set()
+
+    def close(self):
+        """Answers the pending requests and stops the server thread."""
+        self.requests.put(None)
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_stats(self):
+        """Latency percentiles and histograms of the requests and batch sizes answered so far."""
+        latencies = np.array(self.latencies) * 1000
+        batch_sizes = np.array(self.batch_sizes)
+        if len(batch_sizes) == 0:
+            return {"requests": 0, "batches": 0}
+
+        # Power of 2 buckets: <= 0.125 ms, <= 0.25 ms, ... for latencies, 1, 2, 3-4, 5-8... for batch sizes
+        latency_edges = 2.0 ** np.arange(-3, max(1, int(np.ceil(np.log2(latencies.max()))) + 1))
+        latency_edges = np.concatenate([[0.0], latency_edges])
+        size_edges = np.concatenate([[0], 2 ** np.arange(0, int(np.ceil(np.log2(batch_sizes.max()))) + 1)])
+        return {
+            "requests": len(latencies),
+            "batches": len(batch_sizes),
+            "mean_batch_size": float(batch_sizes.mean()),
+            "batch_utilization": float(batch_sizes.mean() / self.max_batch_size),
+            "latency_ms": {f"p{p}": float(np.percentile(latencies, p)) for p in (50, 90, 99)},
+            "latency_histogram_ms": [
+                (float(high), int(count))
+                for high, count in zip(latency_edges[1:], np.histogram(latencies, latency_edges)[0])
+            ],
+            "batch_size_histogram": [
+                (int(high), int(count))
+                for high, count in zip(size_edges[1:], np.histogram(batch_sizes, size_edges + 0.5)[0])
+            ],
+        }
+
+def format_stats(stats):
+    """Text table of InferenceServer.get_stats."""
+    if not stats["requests"]:
+        return "No request."
+    latency = stats["latency_ms"]
+    lines = [
+        f"{stats['requests']} requests in {stats['batches']} batches, "
+        f"mean batch size {stats['mean_batch_size']:.1f} ({stats['batch_utilization']:.0%} of the maximum)",
+        f"Latency: p50 {latency['p50']:.3f} ms, p90 {latency['p90']:.3f} ms, p99 {latency['p99']:.3f} ms",
+        "Latency histogram:",
+    ]
+    total = stats["requests"]
+    for high, count in stats["latency_histogram_ms"]:
+        if count:
+            lines.append(f"  <= {high:8.3f} ms: {count:8d} {'#' * int(round(40 * count / total))}")
+    lines.append("Batch size histogram:")
+    total = stats["batches"]
+    for high, count in stats["batch_size_histogram"]:
+        if count:
+            lines.append(f"  <= {high:8d}   : {count:8d} {'#' * int(round(40 * count / total))}")
+    return "\n".join(lines)
@@ -0,0 +1,290 @@
+import inspect
+import json
+import os
+import zipfile
+
+import numpy as np
+import torch as th
+from torch import nn
+
+from src.rl.snake_env import NUM_FEATURES, QUANTIZATION_OFFSET, QUANTIZATION_SCALE, make_observation_space
+
+# Version of the files written by export_policy (2: the networks return logits, so that actions can be masked)
+POLICY_FORMAT_VERSION = 2
+
+def _dequantize(values):
+    # Same operations as feature_extractor.dequantize_direction, so the results are bit-for-bit identical
+    return (values - QUANTIZATION_OFFSET) / QUANTIZATION_SCALE
+
+def _features_spec(policy):
+    """Description of the (parameter-free) feature extractor of an SB3 policy."""
+    # Imported here: the exported policies are loaded without stable_baselines3
+    from stable_baselines3.common.torch_layers import FlattenExtractor
+    from src.rl.feature_extractor import CompactSnakeExtractor, SnakeExtractor
+
+    extractor = policy.features_extractor if policy.share_features_extractor else policy.pi_features_extractor
+    if isinstance(extractor, CompactSnakeExtractor):
+        return {"type": "compact", "spatial_key": extractor.spatial_key, "quantized": bool(extractor.quantized),
+                "history_length": extractor.history_length}
+    if isinstance(extractor, SnakeExtractor):
+        return {"type": "snake", "quantized": bool(extractor.quantized), "history_length": extractor.history_length,
+                "num_channels": extractor.num_channels}
+    if isinstance(extractor, FlattenExtractor):
+        return {"type": "flatten"}
+    raise ValueError(f"Unsupported feature extractor: {type(extractor).__name__}")
+
+def export_policy(model, path, torchscript_path=None, grid_size=None):
+    """
+    Writes the weights needed by model.predict(obs, deterministic=True), without optimizer,
+    value network or pickled objects (about 6x smaller than the SB3 zip, see the README).
+
+    :param model: PPO model trained on SnakeEnv.
+    :param path: Output file (.pt), read by load_policy.
+    :param torchscript_path: Also write a TorchScript module (.ts), also read by load_policy (optional).
+    :param grid_size: Grid of the observations (inferred from the observation space, except for egocentric models).
+    :return: The SlimPolicy written.
+    """
+    from stable_baselines3.common.preprocessing import is_image_space
+    from src.rl.snake_env import get_grid_size, get_observation_settings
+
+    policy = model.policy
+    space = model.observation_space
+    if policy.squash_output or not hasattr(policy, "action_net"):
+        raise ValueError("Only PPO policies with a discrete action space can be exported")
+
+    # Images are divided by 255 by SB3 (never the case with the SnakeEnv spaces, kept to be exact)
+    if hasattr(space, "spaces"):
+        normalize = {key: bool(policy.normalize_images and is_image_space(subspace))
+                     for key, subspace in space.spaces.items()}
+    else:
+        normalize = bool(policy.normalize_images and is_image_space(space))
+
+    layers = []
+    for module in policy.mlp_extractor.policy_net:
+        if isinstance(module, nn.Linear):
+            layers.append({"type": "linear", "in": module.in_features, "out": module.out_features})
+        else:
+            layers.append({"type": type(module).__name__})
+
+    settings = get_observation_settings(space)
+    spec = {
+        "version": POLICY_FORMAT_VERSION,
+        "observation": {
+            **settings,
+            "grid_size": list(grid_size or get_grid_size(space) or (10, 10)),
+            "history_length": 4,
+        },
+        "normalize": normalize,
+        "features": _features_spec(policy),
+        "layers": layers,
+        "num_actions": policy.action_net.out_features,
+        # Trained with MaskablePPO: the actions are predicted with SnakeEnv.action_masks
+        "action_masks": type(policy).__module__.startswith("sb3_contrib.common.maskable"),
+    }
+
+    state_dict = {}
+    for name, value in policy.state_dict().items():
+        if name.startswith("mlp_extractor.policy_net."):
+            state_dict[name[len("mlp_extractor."):]] = value.detach().cpu().clone()
+        elif name.startswith("action_net."):
+            state_dict[name] = value.detach().cpu().clone()
+
+    slim = SlimPolicy(spec)
+    slim.load_state_dict(state_dict)
+    th.save({"spec": spec, "state_dict": state_dict}, path)
+
+    if torchscript_path:
+        example = slim.observation_space.sample()
+        if isinstance(example, dict):
+            example = {key: th.as_tensor(value[None]) for key, value in example.items()}
+        else:
+            example = th.as_tensor(example[None])
+        scripted = th.jit.trace(slim, (example,), strict=False)
+        th.jit.save(scripted, torchscript_path, _extra_files={"spec.json": json.dumps(spec)})
+    return slim
+
+def predict_actions(network, observation_space, observation, action_masks=None):
+    """
+    Deterministic actions of network for an observation or a batch, like model.predict(obs, deterministic=True).
+
+    :param action_masks: Allowed actions (see SnakeEnv.action_masks), as MaskablePPO.predict (optional).
+    :return: (actions, None), actions of shape () for a single observation and (batch,) for a batch.
+    """
+    if isinstance(observation, dict):
+        shapes = {key: observation_space[key].shape for key in observation}
+        vectorized = observation["features"].ndim > len(shapes["features"])
+        tensors = {key: th.as_tensor(value).reshape((-1, *shapes[key])) for key, value in observation.items()}
+    else:
+        vectorized = observation.ndim > len(observation_space.shape)
+        tensors = th.as_tensor(observation).reshape((-1, *observation_space.shape))
+
+    with th.no_grad():
+        # Mode of the SB3 categorical distribution: argmax of the normalized probabilities, not of the logits,
+        # so that rounding ties are broken the same way (normalized again once masked, like MaskableCategorical)
+        logits = network(tensors)
+        logits = logits - logits.logsumexp(dim=-1, keepdim=True)
+        if action_masks is not None:
+            masks = th.as_tensor(action_masks, dtype=th.bool).reshape(logits.shape)
+            logits = th.where(masks, logits, th.tensor(-1e8, dtype=logits.dtype))
+            logits = logits - logits.logsumexp(dim=-1, keepdim=True)
+        actions = th.argmax(th.softmax(logits, dim=-1), dim=1).numpy()
+    if not vectorized:
+        actions = actions.squeeze(axis=0)
+    return actions, None
+
+class SlimPolicy(nn.Module):
+    def __init__(self, spec):
+        """
+        Actor of a PPO policy exported by export_policy: feature extraction, policy network and action layer.
+
+        :param spec: Description of the network (the "spec" entry of the exported file).
+        """
+        super().__init__()
+        self.spec = spec
+        features = spec["features"]
+        self.features_type = features["type"]
+        self.quantized = features.get("quantized", False)
+        self.history_length = features.get("history_length", 4)
+        self.num_channels = features.get("num_channels", 11)
+        self.spatial_key = features.get("spatial_key", "grid")
+        self.normalize = spec["normalize"]
+
+        modules = []
+        for layer in spec["layers"]:
+            if layer["type"] == "linear":
+                modules.append(nn.Linear(layer["in"], layer["out"]))
+            else:
+                modules.append(getattr(nn, layer["type"])())
+        self.policy_net = nn.Sequential(*modules)
+        last_size = next(layer["out"] for layer in reversed(spec["layers"]) if layer["type"] == "linear")
+        self.action_net = nn.Linear(last_size, spec["num_actions"])
+
+        observation = spec["observation"]
+        self.observation_space = make_observation_space(
+            tuple(observation["grid_size"]), observation["observation_mode"],
+            np.dtype(observation["observation_dtype"]), observation["history_length"],
+            observation.get("window_size"),
+        )
+
+    def _preprocess(self, observation, normalize):
+        observation = observation.float()
+        return observation / 255.0 if normalize else observation
+
+    def extract_features(self, observations):
+        """Same computations as the feature extractors of src/rl/feature_extractor.py."""
+        if self.features_type == "compact":
+            grid = th.flatten(self._preprocess(observations[self.spatial_key], self.normalize[self.spatial_key]),
+                              start_dim=1)
+            features = self._preprocess(observations["features"], self.normalize["features"])
+            if self.quantized:
+                features = features.reshape(features.shape[0], self.history_length, -1)
+                features = th.cat([
+                    features[:, :, :4],
+                    _dequantize(features[:, :, 4:6]),
+                    features[:, :, 6:NUM_FEATURES],
+                    _dequantize(features[:, :, NUM_FEATURES:]),
+                ], dim=2)
+                features = th.flatten(features, start_dim=1)
+            return th.cat([grid, features], dim=1)
+
+        observations = self._preprocess(observations, self.normalize)
+        if self.features_type == "snake" and self.quantized:
+            states = observations.reshape(observations.shape[0], self.history_length, self.num_channels, -1)
+            states = th.cat([states[:, :, :8], _dequantize(states[:, :, 8:10]), states[:, :, 10:]], dim=2)
+            return th.flatten(states, start_dim=1)
+        return th.flatten(observations, start_dim=1)
+
+    def forward(self, observations):
+        """Action logits of a batch of observations (tensors)."""
+        return self.action_net(self.policy_net(self.extract_features(observations)))
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=True, action_masks=None):
+        """Same interface as model.predict (MaskablePPO.predict), only deterministic."""
+        if not deterministic:
+            raise ValueError("Exported policies only predict deterministic actions")
+        return predict_actions(self, self.observation_space, observation, action_masks)
+
+class ScriptedPolicy:
+    def __init__(self, module, spec):
+        """
+        TorchScript module written by export_policy, with the predict interface of SlimPolicy.
+
+        :param module: Loaded TorchScript module.
+        :param spec: Description of the network, gives the observation space.
+        """
+        self.module = module
+        self.spec = spec
+        self.observation_space = SlimPolicy(spec).observation_space
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=True, action_masks=None):
+        if not deterministic:
+            raise ValueError("Exported policies only predict deterministic actions")
+        return predict_actions(self.module, self.observation_space, observation, action_masks)
+
+def load_policy(path):
+    """Loads a policy exported by export_policy (.pt weights or .ts TorchScript module)."""
+    if path.endswith(".ts"):
+        extra_files = {"spec.json": ""}
+        module = th.jit.load(path, _extra_files=extra_files)
+        spec = json.loads(extra_files["spec.json"])
+        if spec["version"] != POLICY_FORMAT_VERSION:
+            raise ValueError(f"TorchScript policy {path} has format {spec['version']}, export it again")
+        return ScriptedPolicy(module, spec)
+
+    # Only tensors and plain containers: no unpickling of arbitrary objects
+    data = th.load(path, weights_only=True)
+    if data["spec"]["version"] > POLICY_FORMAT_VERSION:
+        raise ValueError(f"Policy file {path} has a newer format ({data['spec']['version']})")
+    policy = SlimPolicy(data["spec"])
+    policy.load_state_dict(data["state_dict"])
+    policy.eval()
+    return policy
+
+def is_maskable_checkpoint(path):
+    """True if an SB3 zip was saved by MaskablePPO (read from its JSON data, without loading the model)."""
+    with zipfile.ZipFile(path) as archive:
+        data = json.loads(archive.read("data"))
+    return data.get("policy_class", {}).get("__module__", "").startswith("sb3_contrib.common.maskable")
+
+def load_observation_space(path):
+    """Observation space of a model file (.pt, .ts, .ckpt or .zip), read without loading the model."""
+    if path.endswith(".ts"):
+        extra_files = {"spec.json": ""}
+        th.jit.load(path, _extra_files=extra_files)
+        spec = json.loads(extra_files["spec.json"])
+    elif path.endswith(".pt"):
+        spec = th.load(path, weights_only=True)["spec"]
+    else:
+        # SB3 zips and checkpoints of a CheckpointStore: only the observation space of the "data" entry
+        from stable_baselines3.common.save_util import json_to_data
+        with zipfile.ZipFile(path) as archive:
+            data = json.loads(archive.read("data"))
+        return json_to_data(json.dumps({"observation_space": data["observation_space"]}))["observation_space"]
+    observation = spec["observation"]
+    return make_observation_space(
+        tuple(observation["grid_size"]), observation["observation_mode"], np.dtype(observation["observation_dtype"]),
+        observation["history_length"], observation.get("window_size"),
+    )
+
+def uses_action_masks(model):
+    """True if the actions of a model loaded by load_model must be predicted with action masks."""
+    spec = getattr(model, "spec", None)
+    if isinstance(spec, dict):
+        return spec.get("action_masks", False)
+    return "action_masks" in inspect.signature(model.predict).parameters
+
+def load_model(path):
+    """
+    Loads an exported policy (.pt or .ts), a checkpoint of a CheckpointStore (.ckpt) or a full SB3
+    checkpoint (.zip, PPO or MaskablePPO).
+    """
+    if path.endswith((".pt", ".ts")):
+        return load_policy(path)
+    if path.endswith(".ckpt"):
+        from src.rl.checkpoint_store import CheckpointStore, get_checkpoint_steps
+        return CheckpointStore(os.path.dirname(path) or ".").load(get_checkpoint_steps(path))
+    if is_maskable_checkpoint(path):
+        from sb3_contrib import MaskablePPO
+        return MaskablePPO.load(path)
+    from stable_baselines3 import PPO
+    return PPO.load(path)
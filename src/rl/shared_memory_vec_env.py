@@ -0,0 +1,170 @@
+import multiprocessing as mp
+
+import cloudpickle
+import numpy as np
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+from stable_baselines3.common.vec_env.util import dict_to_obs, obs_space_info
+
+from src.rl.shared_memory_worker import CLOSE, REMOTE, RESET, STEP, create_buffer, worker
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Multiprocess vectorized environment exchanging data through shared memory.
+
+    Works like SubprocVecEnv (one environment per process), but observations,
+    rewards, dones and actions live in multiprocessing.shared_memory buffers:
+    workers write their results in place and only a wake-up event crosses the
+    process boundary on each step.
+
+    :param env_fns: Environments to run in subprocesses.
+    :param info_keys: Integer values of the info dict sent back to the main process.
+    :param start_method: Method used to start the subprocesses (see SubprocVecEnv).
+    """
+
+    def __init__(self, env_fns, info_keys=("apples_eaten",), start_method=None):
+        self.waiting = False
+        self.closed = False
+        self.info_keys = tuple(info_keys)
+        n_envs = len(env_fns)
+
+        if start_method is None:
+            forkserver_available = "forkserver" in mp.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+        ctx = mp.get_context(start_method)
+
+        self.remotes, work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.wake_events = [ctx.Event() for _ in range(n_envs)]
+        self.ready_events = [ctx.Event() for _ in range(n_envs)]
+        self.processes = []
+        for index, (work_remote, remote, env_fn) in enumerate(zip(work_remotes, self.remotes, env_fns)):
+            args = (index, work_remote, remote, cloudpickle.dumps(env_fn),
+                    self.wake_events[index], self.ready_events[index])
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        spaces = [remote.recv() for remote in self.remotes]
+        observation_space, action_space = spaces[0]
+
+        # Allocate all the buffers shared with the workers
+        self.keys, shapes, dtypes = obs_space_info(observation_space)
+        layout = {
+            "actions": ((n_envs, *action_space.shape), action_space.dtype),
+            "commands": ((n_envs,), np.int8),
+            "seeds": ((n_envs,), np.int64),
+            "rewards": ((n_envs,), np.float32),
+            "dones": ((n_envs,), bool),
+            "truncated": ((n_envs,), bool),
+            "errors": ((n_envs,), bool),
+            "infos": ((n_envs, len(self.info_keys)), np.int64),
+        }
+        for key in self.keys:
+            name = "" if key is None else key
+            layout["obs:" + name] = ((n_envs, *shapes[key]), dtypes[key])
+            layout["terminal:" + name] = ((n_envs, *shapes[key]), dtypes[key])
+
+        self._blocks = {}
+        self._buffers = {}
+        for name, (shape, dtype) in layout.items():
+            self._blocks[name], self._buffers[name] = create_buffer(shape, dtype)
+
+        worker_layout = {
+            name: (self._blocks[name].name, shape, dtype) for name, (shape, dtype) in layout.items()
+        }
+        for remote in self.remotes:
+            remote.send((worker_layout, self.info_keys))
+
+        super().__init__(n_envs, observation_space, action_space)
+
+    def reset(self):
+        self._buffers["seeds"][:] = [-1 if seed is None else seed for seed in self._seeds]
+        self._run_command(RESET)
+        self._reset_seeds()
+        self._reset_options()
+        return self._get_observations("obs:")
+
+    def step_async(self, actions):
+        self._buffers["actions"][:] = np.asarray(actions).reshape(self._buffers["actions"].shape)
+        self._send_command(STEP)
+        self.waiting = True
+
+    def step_wait(self):
+        self._wait_workers()
+        self.waiting = False
+
+        dones = self._buffers["dones"].copy()
+        infos = []
+        for index in range(self.num_envs):
+            info = {key: int(value) for key, value in zip(self.info_keys, self._buffers["infos"][index])}
+            info["TimeLimit.truncated"] = bool(self._buffers["truncated"][index])
+            if dones[index]:
+                info["terminal_observation"] = self._get_env_observation("terminal:", index)
+            infos.append(info)
+
+        return self._get_observations("obs:"), self._buffers["rewards"].copy(), dones, infos
+
+    def close(self):
+        if self.closed:
+            return
+        # Workers still busy with a step read the command once they are done
+        self._send_command(CLOSE)
+        for process in self.processes:
+            process.join()
+        for block in self._blocks.values():
+            block.close()
+            block.unlink()
+        self.closed = True
+
+    def get_attr(self, attr_name, indices=None):
+        return self._remote_call("get_attr", attr_name, indices)
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._remote_call("set_attr", (attr_name, value), indices)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return self._remote_call("env_method", (method_name, method_args, method_kwargs), indices)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+    def _send_command(self, command, indices=None):
+        """Write a command for the selected workers and wake them up."""
+        indices = list(self._get_indices(indices))
+        self._buffers["commands"][indices] = command
+        for index in indices:
+            self.wake_events[index].set()
+        return indices
+
+    def _wait_workers(self, indices=None):
+        for index in self._get_indices(indices):
+            self.ready_events[index].wait()
+            self.ready_events[index].clear()
+            if self._buffers["errors"][index]:
+                raise RuntimeError(f"Environment worker {index} crashed, see its traceback above")
+
+    def _run_command(self, command, indices=None):
+        indices = self._send_command(command, indices)
+        self._wait_workers(indices)
+
+    def _remote_call(self, name, data, indices):
+        """Rare calls going through the pipes: get_attr, set_attr, env_method."""
+        indices = self._send_command(REMOTE, indices)
+        for index in indices:
+            self.remotes[index].send((name, data))
+        results = [self.remotes[index].recv() for index in indices]
+        self._wait_workers(indices)
+        return results
+
+    def _get_observations(self, prefix):
+        """Copy of the observations of all environments."""
+        return dict_to_obs(self.observation_space, {
+            key: self._buffers[prefix + ("" if key is None else key)].copy() for key in self.keys
+        })
+
+    def _get_env_observation(self, prefix, index):
+        """Copy of the observation of one environment."""
+        return dict_to_obs(self.observation_space, {
+            key: self._buffers[prefix + ("" if key is None else key)][index].copy() for key in self.keys
+        })
@@ -0,0 +1,93 @@
+import pickle
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# This module only depends on NumPy so the worker processes do not have to import
+# stable_baselines3 (and torch) to run a SnakeEnv.
+
+# Commands written by the main process in the shared command buffer
+STEP, RESET, REMOTE, CLOSE = 0, 1, 2, 3
+
+
+def create_buffer(shape, dtype):
+    """Allocate a NumPy array in a new shared memory block."""
+    size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def attach_buffer(name, shape, dtype):
+    """Open a NumPy array allocated by create_buffer in another process."""
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def worker(index, remote, parent_remote, pickled_env_fn, wake_event, ready_event):
+    """Run one environment, reading actions and writing results in the shared buffers."""
+    parent_remote.close()
+    env = pickle.loads(pickled_env_fn)()
+    remote.send((env.observation_space, env.action_space))
+
+    # Attach to the buffers allocated by the main process
+    layout, info_keys = remote.recv()
+    blocks = {}
+    buffers = {}
+    for name, (shm_name, shape, dtype) in layout.items():
+        blocks[name], buffers[name] = attach_buffer(shm_name, shape, dtype)
+    keys = [key for key in layout if key.startswith("obs:")]
+
+    def write_observation(prefix, observation):
+        for key in keys:
+            value = observation if key == "obs:" else observation[key[4:]]
+            buffers[prefix + key[4:]][index] = value
+
+    try:
+        while True:
+            wake_event.wait()
+            wake_event.clear()
+            command = buffers["commands"][index]
+
+            if command == STEP:
+                observation, reward, terminated, truncated, info = env.step(buffers["actions"][index])
+                done = terminated or truncated
+                if done:
+                    # Save final observation where the main process can get it, then reset
+                    write_observation("terminal:", observation)
+                    observation, _ = env.reset()
+                write_observation("obs:", observation)
+                buffers["rewards"][index] = reward
+                buffers["dones"][index] = done
+                buffers["truncated"][index] = truncated and not terminated
+                for i, key in enumerate(info_keys):
+                    buffers["infos"][index, i] = info.get(key, 0)
+            elif command == RESET:
+                seed = int(buffers["seeds"][index])
+                observation, _ = env.reset(seed=seed if seed >= 0 else None)
+                write_observation("obs:", observation)
+            elif command == REMOTE:
+                # Rare calls (get_attr, env_method...) still go through the pipe
+                name, data = remote.recv()
+                if name == "env_method":
+                    method = getattr(env, data[0])
+                    remote.send(method(*data[1], **data[2]))
+                elif name == "get_attr":
+                    remote.send(getattr(env, data))
+                elif name == "set_attr":
+                    remote.send(setattr(env, data[0], data[1]))
+            elif command == CLOSE:
+                env.close()
+                break
+
+            ready_event.set()
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        # Let the main process know instead of waiting for a result forever
+        buffers["errors"][index] = True
+        raise
+    finally:
+        for block in blocks.values():
+            block.close()
+        remote.close()
+        ready_event.set()
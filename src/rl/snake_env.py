@@ -1,6 +1,7 @@
 import gymnasium as gym
 import os
 import sys
+from time import perf_counter
 import numpy as np
 from gymnasium import spaces
 from src.core.game import game
@@ -10,9 +11,169 @@ root_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__fi
 if root_path not in sys.path:
     sys.path.append(root_path)
 
+# Number of values in the feature vector of the compact observation:
+# 4 directions (one-hot), dx, dy and 4 dangers
+NUM_FEATURES = 10
+
+# With uint8 observations, dx and dy (in [-1, 1]) are stored as round(value * 127) + 128
+# and decoded with (q - 128) / 127, so the error is at most 1/254. As dx and dy are
+# multiples of 1/width and 1/height, every value stays distinct up to 127x127 grids.
+QUANTIZATION_SCALE = 127
+QUANTIZATION_OFFSET = 128
+
+# Egocentric observation: body, head, apple, behind head and wall channels of a window
+# centred on the head, and 2 global features appended to the 10 of the compact mode:
+# snake length and steps without food, as fractions of the cells and of max_steps_without_food
+NUM_WINDOW_CHANNELS = 5
+NUM_GLOBAL_FEATURES = 2
+
+# Phases timed by SnakeEnv.enable_profiling, times are exclusive (a phase does not
+# include the phases it calls): "step" is the reward logic left in step itself,
+# "history" the ring buffer writes and "combine" the views returned as observation
+PROFILE_PHASES = ("step", "move", "distance", "visited", "observation", "history", "combine")
+
+def quantize_direction(value):
+    """Quantize a direction to the food (dx or dy) for uint8 observations."""
+    return np.rint(np.multiply(value, QUANTIZATION_SCALE)) + QUANTIZATION_OFFSET
+
+def make_observation_space(grid_size, observation_mode="full", observation_dtype=np.float32, history_length=4,
+                           window_size=None):
+    """Observation space of SnakeEnv (and VecSnakeEnv) for a given mode and dtype."""
+    observation_dtype = np.dtype(observation_dtype)
+    # Quantized values (dx, dy) use the whole uint8 range
+    if observation_dtype == np.uint8:
+        low, high = 0, 255
+    else:
+        low, high = -1, 1
+
+    if observation_mode == "egocentric":
+        # Same size whatever the grid: 5 channels of window_size x window_size * 4 history states,
+        # and 12 features * 4 history states
+        return spaces.Dict({
+            "window": spaces.Box(
+                low=0,
+                high=1,
+                shape=(NUM_WINDOW_CHANNELS * history_length, window_size, window_size),
+                dtype=observation_dtype
+            ),
+            "features": spaces.Box(
+                low=low,
+                high=high,
+                shape=((NUM_FEATURES + NUM_GLOBAL_FEATURES) * history_length,),
+                dtype=observation_dtype
+            ),
+        })
+
+    if observation_mode == "compact":
+        # 4 spatial channels * 4 history states, and 10 features * 4 history states.
+        # The grid is binary (high=1), which also keeps SB3 from treating it as an image.
+        return spaces.Dict({
+            "grid": spaces.Box(
+                low=0,
+                high=1,
+                shape=(4 * history_length, grid_size[1], grid_size[0]),
+                dtype=observation_dtype
+            ),
+            "features": spaces.Box(
+                low=low,
+                high=high,
+                shape=(NUM_FEATURES * history_length,),
+                dtype=observation_dtype
+            ),
+        })
+
+    # Define flattened observation space (including history)
+    # Total size is 4400 (11 channels * 10x10 grid * 4 history states)
+    return spaces.Box(
+        low=0,
+        high=high,
+        shape=(11 * grid_size[0] * grid_size[1] * history_length,),
+        dtype=observation_dtype
+    )
+
+def aggregate_profiles(profiles):
+    """Sums the profiles of several environments, e.g. vec_env.env_method("get_profile")."""
+    total = {phase: {"time": 0.0, "calls": 0} for phase in PROFILE_PHASES}
+    for profile in profiles:
+        for phase, values in profile.items():
+            total[phase]["time"] += values["time"]
+            total[phase]["calls"] += values["calls"]
+    return total
+
+def format_profile(profile):
+    """One line per phase: total time, share of the time spent in step and time per call."""
+    total_time = sum(values["time"] for values in profile.values()) or 1.0
+    lines = []
+    for phase, values in profile.items():
+        per_call = values["time"] / values["calls"] * 1e6 if values["calls"] else 0.0
+        lines.append(f"{phase:>12}: {values['time']:9.3f} s {values['time'] / total_time:6.1%} "
+                     f"{per_call:8.2f} us/call ({values['calls']} calls)")
+    return "\n".join(lines)
+
+def get_observation_settings(observation_space):
+    """Observation mode and dtype matching an observation space (e.g. the one of a trained model)."""
+    if isinstance(observation_space, spaces.Dict):
+        dtype = str(observation_space["features"].dtype)
+        if "window" in observation_space.spaces:
+            window_size = observation_space["window"].shape[-1]
+            return {"observation_mode": "egocentric", "observation_dtype": dtype, "window_size": window_size}
+        return {"observation_mode": "compact", "observation_dtype": dtype}
+    return {"observation_mode": "full", "observation_dtype": str(observation_space.dtype)}
+
+def get_grid_size(observation_space):
+    """
+    Grid size (width, height) an observation space was made for, None for egocentric observations.
+
+    The flat full observation only gives width * height, so the grid is assumed square: a ValueError
+    is raised when the size is not the one of a square grid, the grid size must then be given.
+    """
+    if isinstance(observation_space, spaces.Dict):
+        if "window" in observation_space.spaces:
+            return None
+        return observation_space["grid"].shape[2], observation_space["grid"].shape[1]
+    # 11 channels * 4 states of a square grid
+    cells = observation_space.shape[0] // 44
+    side = int(round(np.sqrt(cells)))
+    if side * side * 44 != observation_space.shape[0]:
+        raise ValueError(
+            f"The full observation of {observation_space.shape[0]} values was made for a non-square grid "
+            f"of {cells} cells, its grid size (width, height) must be given"
+        )
+    return side, side
+
 class SnakeEnv(gym.Env):
-    def __init__(self, grid_size=(10, 10), max_steps_without_food=300):
+    def __init__(self, grid_size=(10, 10), max_steps_without_food=300, observation_mode="full",
+                 observation_dtype="float32", window_size=11, copy_observations=True):
+        """
+        Snake environment.
+
+        :param grid_size: Size of the grid (width, height).
+        :param max_steps_without_food: Steps allowed between two apples.
+        :param observation_mode: "full" for the flattened 11 channels observation,
+            "compact" for a Dict observation with the 4 spatial channels ("grid")
+            and the direction, dx, dy and danger values as a small vector ("features"),
+            "egocentric" for large grids: like compact, but the spatial channels are a
+            window_size x window_size crop centred on the head ("window", with a wall
+            channel for the cells outside the grid) and the features include the snake
+            length and the steps without food. Its size does not depend on the grid.
+        :param observation_dtype: "float32", or "uint8" for 4x smaller observations
+            (binary values unchanged, dx and dy quantized, see quantize_direction).
+        :param window_size: Side of the window of the egocentric observation (odd).
+        :param copy_observations: Return a copy of the observation from step and reset. False returns views
+            on the history buffer, valid until the next step, for callers that copy them at once (the
+            workers of the vectorized environments).
+        """
+        if observation_mode not in ("full", "compact", "egocentric"):
+            raise ValueError(f"Unknown observation mode: {observation_mode}")
+        if observation_dtype not in ("float32", "uint8"):
+            raise ValueError(f"Unknown observation dtype: {observation_dtype}")
+        if observation_mode == "egocentric" and window_size % 2 == 0:
+            raise ValueError(f"The window size must be odd to be centred on the head: {window_size}")
         self.grid_size = grid_size
+        self.observation_mode = observation_mode
+        self.observation_dtype = np.dtype(observation_dtype)
+        self.window_size = window_size if observation_mode == "egocentric" else None
+        self.copy_observations = copy_observations
 
         self.game = game(grid_size[0], grid_size[1])
         self.game.init_grid()
@@ -20,23 +181,39 @@ class SnakeEnv(gym.Env):
         self.game.update_snake()
 
         # Number of channels: 11 (body, head, apple, behind head, 4 directions, dx, dy, danger)
-        self.num_channels = 11
+        # In compact mode only the 4 spatial channels are kept, the others go to the feature vector
+        if observation_mode == "compact":
+            self.num_channels = 4
+            self.num_features = NUM_FEATURES
+        elif observation_mode == "egocentric":
+            self.num_channels = NUM_WINDOW_CHANNELS
+            self.num_features = NUM_FEATURES + NUM_GLOBAL_FEATURES
+        else:
+            self.num_channels = 11
+            self.num_features = 0
 
         # History of the last 4 states
         self.history_length = 4
-        # Create 4 arrays of zeros with size 1100 (11 channels * 10x10 grid)
-        self.history = [np.zeros((self.num_channels * grid_size[0] * grid_size[1],), dtype=np.float32) for _ in range(self.history_length)]
+        # Ring buffer of frames (11 channels * 10x10 grid each), every frame is written twice
+        # (at position i and i + 4) so the last 4 frames are always a contiguous slice.
+        # Two buffers are alternated on each reset so the final observation of an episode
+        # stays valid after the next reset.
+        frame_size = (window_size, window_size) if self.window_size else (grid_size[1], grid_size[0])
+        frames_shape = (2 * self.history_length, self.num_channels, *frame_size)
+        features_shape = (2 * self.history_length, self.num_features)
+        self._history_buffers = [
+            (np.zeros(frames_shape, dtype=self.observation_dtype), np.zeros(features_shape, dtype=self.observation_dtype))
+            for _ in range(2)
+        ]
+        self._history_buffer_index = 0
+        self.history, self.feature_history = self._history_buffers[0]
+        self._history_position = self.history_length - 1
 
         # Define action space
         self.action_space = spaces.Discrete(4)
 
-        # Define flattened observation space (including history)
-        # Total size is 4400 (11 channels * 10x10 grid * 4 history states)
-        self.observation_space = spaces.Box(
-            low=0,
-            high=1,
-            shape=(self.num_channels * grid_size[0] * grid_size[1] * self.history_length,),
-            dtype=np.float32
+        self.observation_space = make_observation_space(
+            grid_size, observation_mode, self.observation_dtype, self.history_length, self.window_size
         )
 
         # Calculate maximum possible distance in the grid (diagonal)
@@ -44,13 +221,29 @@ class SnakeEnv(gym.Env):
         self.previous_food_eaten = len(self.game.snake)
         self.max_steps_without_food = max_steps_without_food
         self.steps_without_food = 0
-        self.visited_positions = set()
         self.apples_eaten = 0
 
+        # Squared distance by (|dx|, |dy|): the reward only compares distances, which squared distances
+        # do the same way, and a list lookup is about 25x cheaper than np.linalg.norm on 2 values
+        self._squared_distances = [[dx * dx + dy * dy for dy in range(grid_size[1])] for dx in range(grid_size[0])]
+
+        # Cells visited by the head during the episode (1 byte per cell), cleared in place at each reset
+        self.visited = bytearray(grid_size[0] * grid_size[1])
+        self._no_visit = bytes(grid_size[0] * grid_size[1])
+
+        # Scratch vector used to encode the features of the full observation
+        self._features = np.zeros(NUM_FEATURES, dtype=self.observation_dtype)
+        self._danger = np.zeros(4, dtype=np.float32)
+
+        # Per-phase timing, None while profiling is disabled
+        self._profile = None
+        self._profile_in_info = False
+        self._profile_child_time = 0.0
+
     def seed(self, seed=None):
         # Set random seed to reproduce the same sequences
         if seed is not None:
-            np.random.seed(seed)
+            self.game.seed(seed)
 
     def reset(self, seed=None, options=None):
         if seed is not None:
@@ -60,33 +253,36 @@ class SnakeEnv(gym.Env):
         self.game.update_snake()
         self.previous_food_eaten = len(self.game.snake)
         self.steps_without_food = 0
-        self.visited_positions = set()
-        self.visited_positions.add(tuple(self.game.snakehead))
+        self.clear_visited()
         self.apples_eaten = 0
 
-        # Reset history with zeros
-        self.history = [np.zeros_like(self.history[0]) for _ in range(self.history_length)]
-
-        observation = self._get_observation()
-        self._update_history(observation)
+        # Reset history with zeros, reusing the buffer not returned by the last step
+        self._history_buffer_index = 1 - self._history_buffer_index
+        self.history, self.feature_history = self._history_buffers[self._history_buffer_index]
+        self.history.fill(0)
+        self.feature_history.fill(0)
+        if self.observation_dtype == np.uint8:
+            # Empty states have dx = dy = 0, which is QUANTIZATION_OFFSET once quantized
+            if self.observation_mode == "full":
+                self.history[:, 8:10] = QUANTIZATION_OFFSET
+            # Quantized features (dx, dy and the global features of the egocentric mode)
+            self.feature_history[:, 4:6] = QUANTIZATION_OFFSET
+            self.feature_history[:, NUM_FEATURES:] = QUANTIZATION_OFFSET
+        self._history_position = self.history_length - 1
+
+        self._update_history()
 
         # Return observation and an empty dictionary (Gymnasium format)
-        return self._get_combined_observation(), {}
+        return self._return_observation(), {}
 
     def step(self, action):
         # Calculate distance between head and food before movement
-        old_distance = np.linalg.norm([
-            self.game.snakehead[0] - self.game.food[0],
-            self.game.snakehead[1] - self.game.food[1]
-        ])
+        old_distance = self._get_food_distance()
 
         self.game.move(action)
 
         # Calculate new distance after movement
-        new_distance = np.linalg.norm([
-            self.game.snakehead[0] - self.game.food[0],
-            self.game.snakehead[1] - self.game.food[1]
-        ])
+        new_distance = self._get_food_distance()
 
         reward = -0.001
         done = False
@@ -104,10 +300,8 @@ class SnakeEnv(gym.Env):
                 reward -= 0.1
             self.steps_without_food += 1
 
-        if tuple(self.game.snakehead) in self.visited_positions:
+        if self._visit_head():
             reward -= 0.1
-        else:
-            self.visited_positions.add(tuple(self.game.snakehead))
 
         if len(self.game.snake) > 0 and self.game.snakehead == self.game.snake[0]:
             reward -= 10
@@ -123,97 +317,288 @@ class SnakeEnv(gym.Env):
 
         truncated = False
         info = {"apples_eaten": self.apples_eaten}
+        if self._profile_in_info:
+            info["profile"] = self.get_profile()
 
-        observation = self._get_observation()
-        self._update_history(observation)
+        self._update_history()
 
-        return self._get_combined_observation(), reward, done, truncated, info
+        return self._return_observation(), reward, done, truncated, info
 
-    def _get_observation(self):
-        # Convert game grid to NumPy array
-        grid = np.array(self.game.grid)
-        head = self.game.snakehead
+    def _get_food_distance(self):
+        """Squared distance between the head and the food (0 once the grid is full and there is no food)."""
         food = self.game.food
+        if food is None:
+            return 0
+        head = self.game.snakehead
+        return self._squared_distances[abs(head[0] - food[0])][abs(head[1] - food[1])]
 
-        # Calculate relative directions to food (normalized)
-        dx = (food[0] - head[0]) / self.grid_size[0]
-        dy = (food[1] - head[1]) / self.grid_size[1]
-
-        direction = self._get_direction()
+    def _visit_head(self):
+        """Mark the head position as visited, returns True if it already was."""
+        head = self.game.snakehead
+        cell = head[1] * self.grid_size[0] + head[0]
+        if self.visited[cell]:
+            return True
+        self.visited[cell] = 1
+        return False
+
+    def clear_visited(self):
+        """Forget the visited cells, except the current head position."""
+        self.visited[:] = self._no_visit
+        self._visit_head()
+
+    def enable_profiling(self, include_in_info=False):
+        """
+        Time the phases of step (see PROFILE_PHASES) until disable_profiling is called.
+
+        The timed methods are replaced on the instance only, so a disabled
+        profiler costs nothing. With SubprocVecEnv, use
+        env_method("enable_profiling") and aggregate_profiles(env_method("get_profile")).
+
+        :param include_in_info: Also return the cumulative profile in the info dict of each step.
+        """
+        if self._profile is None:
+            self._profile = {phase: [0.0, 0] for phase in PROFILE_PHASES}
+            self.step = self._timed("step", self.step)
+            self.game.move = self._timed("move", self.game.move)
+            self._get_food_distance = self._timed("distance", self._get_food_distance)
+            self._visit_head = self._timed("visited", self._visit_head)
+            self._encode_state = self._timed("observation", self._encode_state)
+            self._update_history = self._timed("history", self._update_history)
+            self._get_combined_observation = self._timed("combine", self._get_combined_observation)
+        self._profile_in_info = include_in_info
+
+    def disable_profiling(self):
+        """Restore the untimed methods and drop the collected times."""
+        if self._profile is None:
+            return
+        for name in ("step", "_get_food_distance", "_visit_head", "_encode_state",
+                     "_update_history", "_get_combined_observation"):
+            delattr(self, name)
+        del self.game.move
+        self._profile = None
+        self._profile_in_info = False
+
+    def get_profile(self):
+        """Cumulative time (seconds) and number of calls of each phase since the last reset_profile."""
+        if self._profile is None:
+            return {}
+        return {phase: {"time": time, "calls": calls} for phase, (time, calls) in self._profile.items()}
+
+    def reset_profile(self):
+        if self._profile is not None:
+            for values in self._profile.values():
+                values[0] = 0.0
+                values[1] = 0
+
+    def _timed(self, phase, function):
+        """Wrap function to add its exclusive time (without the timed calls it makes) to phase."""
+        values = self._profile[phase]
+
+        def timed(*args, **kwargs):
+            outer_child_time = self._profile_child_time
+            self._profile_child_time = 0.0
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                values[0] += elapsed - self._profile_child_time
+                values[1] += 1
+                self._profile_child_time = outer_child_time + elapsed
+        return timed
+
+    def _get_observation(self, out=None):
+        """Encode the current state in 11 channels, written into out (shape (11, H, W)) when given."""
+        if out is None:
+            out = np.zeros((11, self.grid_size[1], self.grid_size[0]), dtype=self.observation_dtype)
+
+        self._get_spatial_channels(out=out[:4])
+        features = self._get_features(out=self._features)
+
+        # Channels for current direction (one-hot encoding), filled with 1s according to direction
+        # and channels for relative direction to food (normalized), filled with the same value
+        out[4:10] = features[:6, None, None]
+
+        # Danger vector placed in the first row of the last channel
+        out[10].fill(0)
+        out[10, 0, :4] = features[6:]
+
+        # Flattened view of all channels, a vector of size 1100
+        return out.reshape(-1)
+
+    def _get_spatial_channels(self, out=None):
+        """Encode body, head, apple and behind head channels, written into out (shape (4, H, W)) when given."""
+        if out is None:
+            out = np.zeros((4, self.grid_size[1], self.grid_size[0]), dtype=self.observation_dtype)
+
+        # The game grid is already a NumPy array
+        grid = self.game.grid
 
         # Create binary channels for game elements
         # Transform cells with value 1 to 1.0, others to 0.0
-        body_channel = (grid == 1).astype(np.float32)
-        head_channel = (grid == 2).astype(np.float32)
-        apple_channel = (grid == 3).astype(np.float32)
+        np.equal(grid, 1, out=out[0])  # Body
+        np.equal(grid, 2, out=out[1])  # Head
+        np.equal(grid, 3, out=out[2])  # Apple
 
         # Channel for segment just behind the head
-        behind_head_channel = np.zeros(grid.shape, dtype=np.float32)
+        out[3].fill(0)
         if len(self.game.snake) > 0:
             behind_head = self.game.snake[0]
-            behind_head_channel[behind_head[1], behind_head[0]] = 1
+            out[3, behind_head[1], behind_head[0]] = 1
 
-        # Channels for current direction (one-hot encoding)
-        direction_channels = np.zeros((4, grid.shape[0], grid.shape[1]), dtype=np.float32)
-        if 0 <= direction < 4:
-            # Fill an entire channel with 1s according to direction
-            direction_channels[direction, :, :] = 1
-
-        # Channels for direction to food
-        # Fill the entire grid with the same value
-        dx_channel = np.full(grid.shape, dx, dtype=np.float32)
-        dy_channel = np.full(grid.shape, dy, dtype=np.float32)
-
-        # New vector: danger for each action
-        danger_vector = self._get_danger_vector()
-
-        # List of all information channels
-        channels = [
-            body_channel,
-            head_channel,
-            apple_channel,
-            behind_head_channel,
-            *direction_channels,  # Unpack the 4 direction channels
-            dx_channel,
-            dy_channel,
-        ]
+        return out
+
+    def _get_window_channels(self, out=None):
+        """
+        Encode body, head, apple, behind head and wall channels of the window centred on the head.
+
+        Written into out (shape (5, K, K)) when given. Only the K x K cells of the
+        window are read, so the cost does not depend on the grid size.
+        """
+        size = self.window_size
+        if out is None:
+            out = np.zeros((NUM_WINDOW_CHANNELS, size, size), dtype=self.observation_dtype)
+
+        width, height = self.grid_size
+        head_x, head_y = self.game.snakehead
+        # Top left corner of the window on the grid, and the part of the window inside the grid
+        left, top = head_x - size // 2, head_y - size // 2
+        x0, x1 = max(left, 0), min(left + size, width)
+        y0, y1 = max(top, 0), min(top + size, height)
+        cells = self.game.grid[y0:y1, x0:x1]
+        inside = (slice(y0 - top, y1 - top), slice(x0 - left, x1 - left))
+
+        out[:4].fill(0)
+        np.equal(cells, 1, out=out[0][inside])  # Body
+        np.equal(cells, 2, out=out[1][inside])  # Head
+        np.equal(cells, 3, out=out[2][inside])  # Apple
+
+        # Segment just behind the head, always inside the window
+        if len(self.game.snake) > 0:
+            behind_head = self.game.snake[0]
+            out[3, behind_head[1] - top, behind_head[0] - left] = 1
 
-        # Add danger_vector as an additional channel
-        danger_channel = np.zeros(grid.shape, dtype=np.float32)
-        danger_channel[0, :4] = danger_vector  # Place danger vector in first row
-        channels.append(danger_channel)
+        # Walls: every cell outside the grid
+        out[4].fill(1)
+        out[4][inside] = 0
+        return out
 
-        # Flatten all channels into a single 1D vector of size 1100
-        flattened_obs = np.concatenate([ch.flatten() for ch in channels])
-        return flattened_obs
+    def _get_features(self, out=None):
+        """Encode direction (one-hot), dx, dy to food and danger vector in a vector of 10 values."""
+        if out is None:
+            out = np.zeros(self.num_features or NUM_FEATURES, dtype=self.observation_dtype)
 
-    def _get_danger_vector(self):
+        head = self.game.snakehead
+        food = self.game.food
+
+        out[:4] = 0
+        direction = self._get_direction()
+        if 0 <= direction < 4:
+            out[direction] = 1
+
+        # Relative direction to food (normalized), 0 once the grid is full and there is no food:
+        # the head is on the last apple eaten, as in VecSnakeEnv which keeps its position
+        if food is None:
+            dx = dy = 0.0
+        else:
+            dx = (food[0] - head[0]) / self.grid_size[0]
+            dy = (food[1] - head[1]) / self.grid_size[1]
+        if self.observation_dtype == np.uint8:
+            dx = quantize_direction(dx)
+            dy = quantize_direction(dy)
+        out[4] = dx
+        out[5] = dy
+
+        self._get_danger_vector(out=out[6:NUM_FEATURES])
+
+        if self.observation_mode == "egocentric":
+            # Global state, lost outside the window
+            length = (len(self.game.snake) + 1) / (self.grid_size[0] * self.grid_size[1])
+            hunger = self.steps_without_food / self.max_steps_without_food
+            if self.observation_dtype == np.uint8:
+                length = quantize_direction(length)
+                hunger = quantize_direction(hunger)
+            out[NUM_FEATURES] = length
+            out[NUM_FEATURES + 1] = hunger
+        return out
+
+    def action_masks(self):
+        """
+        Moves that do not end the game at once (the danger vector inverted), used by MaskablePPO.
+
+        :return: Boolean array [up, down, left, right], all True when every move is fatal.
+        """
+        masks = self._get_danger_vector(out=self._danger) == 0
+        if not masks.any():
+            # The game is lost anyway, a masked distribution needs at least one action
+            masks[:] = True
+        return masks
+
+    def _get_danger_vector(self, out=None):
         """Calculate a vector indicating dangerous actions."""
         head_x, head_y = self.game.snakehead
         # Create a vector of 4 zeros for the 4 directions
-        danger = np.zeros(4, dtype=np.float32)  # Vector for 4 actions: [up, down, left, right]
+        if out is None:
+            out = np.zeros(4, dtype=np.float32)  # Vector for 4 actions: [up, down, left, right]
 
         # Check each direction using check_collision
-        if self.game.check_collision(head_x, head_y - 1):  # Up
-            danger[0] = 1
-        if self.game.check_collision(head_x, head_y + 1):  # Down
-            danger[1] = 1
-        if self.game.check_collision(head_x - 1, head_y):  # Left
-            danger[2] = 1
-        if self.game.check_collision(head_x + 1, head_y):  # Right
-            danger[3] = 1
-
-        return danger
-
-    def _update_history(self, observation):
-        """Update history with new observation."""
-        self.history.pop(0)  # Remove oldest state
-        self.history.append(observation)  # Add new state
+        out[0] = self.game.check_collision(head_x, head_y - 1)  # Up
+        out[1] = self.game.check_collision(head_x, head_y + 1)  # Down
+        out[2] = self.game.check_collision(head_x - 1, head_y)  # Left
+        out[3] = self.game.check_collision(head_x + 1, head_y)  # Right
+
+        return out
+
+    def _update_history(self):
+        """Write the current state in the ring buffer, replacing the oldest state."""
+        self._history_position = (self._history_position + 1) % self.history_length
+        position = self._history_position
+        self._encode_state(position)
+        self.history[position + self.history_length] = self.history[position]
+        if self.num_features:
+            self.feature_history[position + self.history_length] = self.feature_history[position]
+
+    def _encode_state(self, position):
+        """Encode the current state in the slot position of the ring buffer."""
+        if self.observation_mode == "compact":
+            self._get_spatial_channels(out=self.history[position])
+            self._get_features(out=self.feature_history[position])
+        elif self.observation_mode == "egocentric":
+            self._get_window_channels(out=self.history[position])
+            self._get_features(out=self.feature_history[position])
+        else:
+            self._get_observation(out=self.history[position])
 
     def _get_combined_observation(self):
-        """Combine historical observations into one."""
-        # Concatenate the 4 historical observations into a single vector of size 4400
-        return np.concatenate(self.history)
+        """
+        Combine historical observations into one.
+
+        Returns a view of size 4400 (4 states, oldest first) on the ring buffer,
+        or a dict of views in compact mode. It is only valid until the next step,
+        copy it to keep it longer.
+        """
+        start = self._history_position + 1
+        end = start + self.history_length
+        if self.observation_mode == "compact":
+            return {
+                "grid": self.history[start:end].reshape(-1, self.grid_size[1], self.grid_size[0]),
+                "features": self.feature_history[start:end].reshape(-1),
+            }
+        if self.observation_mode == "egocentric":
+            return {
+                "window": self.history[start:end].reshape(-1, self.window_size, self.window_size),
+                "features": self.feature_history[start:end].reshape(-1),
+            }
+        return self.history[start:end].reshape(-1)
+
+    def _return_observation(self):
+        """Observation returned by step and reset, copied unless copy_observations is False."""
+        observation = self._get_combined_observation()
+        if not self.copy_observations:
+            return observation
+        if isinstance(observation, dict):
+            return {key: value.copy() for key, value in observation.items()}
+        return observation.copy()
 
     def _get_direction(self):
         if len(self.game.snake) == 0:
@@ -0,0 +1,349 @@
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+
+from src.rl.snake_env import NUM_FEATURES, QUANTIZATION_OFFSET, make_observation_space, quantize_direction
+
+# Head movement for each action (0: up, 1: down, 2: left, 3: right)
+ACTION_DX = np.array([0, 0, -1, 1], dtype=np.int64)
+ACTION_DY = np.array([-1, 1, 0, 0], dtype=np.int64)
+
+# Grid cell values, same as game.grid (Head = 2, Body = 1, Food = 3)
+EMPTY, BODY, HEAD, FOOD = 0, 1, 2, 3
+
+
+class VecSnakeEnv(VecEnv):
+    """
+    Batched Snake environment that steps N games at once with NumPy.
+
+    The state of every game is stored in struct-of-arrays buffers (head
+    coordinates, body ring buffers, food, counters) and the whole batch is
+    advanced with vectorized movement, collision, food and reward logic.
+    Rewards and observations follow SnakeEnv.step exactly.
+
+    :param num_envs: Number of games played in parallel.
+    :param grid_size: Size of the grid (width, height).
+    :param max_steps_without_food: Steps allowed between two apples.
+    :param seed: Seed of the random generator used to place the food.
+    :param observation_mode: "full" or "compact", see SnakeEnv.
+    :param observation_dtype: "float32" or "uint8", see SnakeEnv.
+    """
+
+    def __init__(self, num_envs, grid_size=(10, 10), max_steps_without_food=300, seed=None,
+                 observation_mode="full", observation_dtype="float32"):
+        if observation_mode not in ("full", "compact"):
+            raise ValueError(f"Unknown observation mode: {observation_mode}")
+        if observation_dtype not in ("float32", "uint8"):
+            raise ValueError(f"Unknown observation dtype: {observation_dtype}")
+        self.grid_size = grid_size
+        self.observation_mode = observation_mode
+        self.observation_dtype = np.dtype(observation_dtype)
+        self.width, self.height = grid_size
+        self.max_steps_without_food = max_steps_without_food
+        self.render_mode = None
+
+        # Same layout as SnakeEnv: 11 channels (or 4 channels and 10 features) and a history of 4 states
+        self.num_channels = 4 if observation_mode == "compact" else 11
+        self.num_features = NUM_FEATURES if observation_mode == "compact" else 0
+        self.history_length = 4
+        self.num_cells = self.width * self.height
+
+        observation_space = make_observation_space(
+            grid_size, observation_mode, self.observation_dtype, self.history_length
+        )
+        super().__init__(num_envs, observation_space, spaces.Discrete(4))
+
+        self.rng = np.random.default_rng(seed)
+        self._env_ids = np.arange(num_envs)
+
+        # Game state of all the environments
+        self.grid = np.zeros((num_envs, self.height, self.width), dtype=np.int8)
+        self.head_x = np.zeros(num_envs, dtype=np.int64)
+        self.head_y = np.zeros(num_envs, dtype=np.int64)
+        self.food_x = np.zeros(num_envs, dtype=np.int64)
+        self.food_y = np.zeros(num_envs, dtype=np.int64)
+
+        # Body segments stored as flat cell indices (y * width + x) in a ring buffer.
+        # The newest segment (just behind the head) is at body_ptr - 1, the tail at body_ptr - body_length.
+        self.body = np.zeros((num_envs, self.num_cells), dtype=np.int64)
+        self.body_ptr = np.zeros(num_envs, dtype=np.int64)
+        self.body_length = np.zeros(num_envs, dtype=np.int64)
+
+        # Episode counters
+        self.steps_without_food = np.zeros(num_envs, dtype=np.int64)
+        self.apples_eaten = np.zeros(num_envs, dtype=np.int64)
+        self.visited = np.zeros((num_envs, self.num_cells), dtype=bool)
+
+        # Stacked history of observations (oldest first)
+        self.history = np.zeros(
+            (num_envs, self.history_length, self.num_channels, self.height, self.width),
+            dtype=self.observation_dtype
+        )
+        self.feature_history = np.zeros(
+            (num_envs, self.history_length, self.num_features), dtype=self.observation_dtype
+        )
+
+        self._actions = None
+
+    def reset(self):
+        if self._seeds[0] is not None:
+            self.rng = np.random.default_rng(self._seeds[0])
+        self._reset_seeds()
+        self._reset_options()
+
+        self._reset_envs(self._env_ids)
+        return self._get_combined_observation()
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        ids = self._env_ids
+        actions = self._actions
+
+        # Squared distance between head and food before movement
+        old_distance = (self.head_x - self.food_x) ** 2 + (self.head_y - self.food_y) ** 2
+
+        next_x = self.head_x + ACTION_DX[actions]
+        next_y = self.head_y + ACTION_DY[actions]
+
+        # Collision with walls or body (the tail still counts, as in game.check_collision)
+        collision = self._check_collision(next_x, next_y)
+        alive = ~collision
+        eat_food = alive & (next_x == self.food_x) & (next_y == self.food_y)
+
+        # Move the snakes that did not collide
+        moving = ids[alive]
+        old_head = self.head_y[moving] * self.width + self.head_x[moving]
+        self.grid[moving, self.head_y[moving], self.head_x[moving]] = BODY
+        self.body[moving, self.body_ptr[moving]] = old_head
+        self.body_ptr[moving] = (self.body_ptr[moving] + 1) % self.num_cells
+        self.body_length[moving] += 1
+
+        # Remove the tail of the snakes that did not eat
+        shrinking = ids[alive & ~eat_food]
+        tail = self.body[shrinking, (self.body_ptr[shrinking] - self.body_length[shrinking]) % self.num_cells]
+        self.grid[shrinking, tail // self.width, tail % self.width] = EMPTY
+        self.body_length[shrinking] -= 1
+
+        self.head_x[moving] = next_x[moving]
+        self.head_y[moving] = next_y[moving]
+        self.grid[moving, self.head_y[moving], self.head_x[moving]] = HEAD
+
+        # Place new food, a full grid means the game is won (and over)
+        win = np.zeros(self.num_envs, dtype=bool)
+        if eat_food.any():
+            win[ids[eat_food]] = ~self._place_food(ids[eat_food])
+
+        new_distance = (self.head_x - self.food_x) ** 2 + (self.head_y - self.food_y) ** 2
+
+        rewards = np.full(self.num_envs, -0.001)
+        rewards += np.where(eat_food, 50.0, np.where(new_distance < old_distance, 0.1, -0.1))
+        self.steps_without_food = np.where(eat_food, 0, self.steps_without_food + 1)
+        self.apples_eaten += eat_food
+
+        head = self.head_y * self.width + self.head_x
+        rewards -= 0.1 * self.visited[ids, head]
+        self.visited[ids, head] = True
+
+        game_over = collision | win
+        timeout = self.steps_without_food >= self.max_steps_without_food
+        rewards -= 10 * game_over
+        rewards -= 5 * timeout
+        dones = game_over | timeout
+
+        self._update_history(ids)
+        observations = self._get_combined_observation()
+
+        infos = [{"apples_eaten": int(apples), "TimeLimit.truncated": False} for apples in self.apples_eaten]
+
+        # Automatically reset finished games, as the SB3 vectorized environments do
+        if dones.any():
+            done_ids = ids[dones]
+            for i in done_ids:
+                infos[i]["terminal_observation"] = self._get_env_observation(observations, i)
+            self._reset_envs(done_ids)
+            if self.observation_mode == "compact":
+                observations["grid"][done_ids] = self.history[done_ids].reshape(len(done_ids), -1, self.height, self.width)
+                observations["features"][done_ids] = self.feature_history[done_ids].reshape(len(done_ids), -1)
+            else:
+                observations[done_ids] = self.history[done_ids].reshape(len(done_ids), -1)
+
+        return observations, rewards.astype(np.float32), dones, infos
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name, indices=None):
+        """Return attribute of the batched environment, once per selected environment."""
+        value = getattr(self, attr_name)
+        return [value for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        """Call a method of the batched environment, once per selected environment."""
+        if method_name == "action_masks":
+            # Computed for all the environments at once, one row per selected environment
+            return list(self.action_masks()[list(self._get_indices(indices))])
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+    def _reset_envs(self, env_ids):
+        """Start a new game in the selected environments."""
+        self.grid[env_ids] = EMPTY
+        self.body_ptr[env_ids] = 0
+        self.body_length[env_ids] = 0
+        self.steps_without_food[env_ids] = 0
+        self.apples_eaten[env_ids] = 0
+        self.visited[env_ids] = False
+
+        # Snake at the center of the grid with 2 body segments, as in game.init_snake
+        firstx = int(self.width / 2)
+        firsty = int(self.height / 2)
+        self.head_x[env_ids] = firstx
+        self.head_y[env_ids] = firsty
+        self.grid[env_ids, firsty, firstx] = HEAD
+        for segment_x in (firstx - 2, firstx - 1):
+            self.grid[env_ids, firsty, segment_x] = BODY
+            self.body[env_ids, self.body_ptr[env_ids]] = firsty * self.width + segment_x
+            self.body_ptr[env_ids] += 1
+            self.body_length[env_ids] += 1
+
+        self.visited[env_ids, firsty * self.width + firstx] = True
+        self._place_food(env_ids)
+
+        # Reset history with zeros
+        self.history[env_ids] = 0
+        self.feature_history[env_ids] = 0
+        if self.observation_dtype == np.uint8:
+            # Empty states have dx = dy = 0, which is QUANTIZATION_OFFSET once quantized
+            self.history[env_ids, :, 8:10] = QUANTIZATION_OFFSET
+            self.feature_history[env_ids, :, 4:6] = QUANTIZATION_OFFSET
+        self._update_history(env_ids)
+
+    def _place_food(self, env_ids):
+        """Place food uniformly on an empty cell, return which environments still had room."""
+        free = (self.grid[env_ids] == EMPTY).reshape(len(env_ids), -1)
+        # The free cell with the highest random key is uniformly distributed
+        keys = np.where(free, self.rng.random(free.shape), -1.0)
+        cells = keys.argmax(axis=1)
+        has_room = free.any(axis=1)
+
+        placed = env_ids[has_room]
+        cells = cells[has_room]
+        self.food_x[placed] = cells % self.width
+        self.food_y[placed] = cells // self.width
+        self.grid[placed, self.food_y[placed], self.food_x[placed]] = FOOD
+        return has_room
+
+    def _check_collision(self, x, y, env_ids=None):
+        """Check if positions would cause a collision with walls or body"""
+        if env_ids is None:
+            env_ids = self._env_ids
+        outside = (x < 0) | (x >= self.width) | (y < 0) | (y >= self.height)
+        inside_x = np.clip(x, 0, self.width - 1)
+        inside_y = np.clip(y, 0, self.height - 1)
+        return outside | (self.grid[env_ids, inside_y, inside_x] == BODY)
+
+    def action_masks(self):
+        """Moves that do not end each game at once, shape (num_envs, 4) (see SnakeEnv.action_masks)."""
+        masks = self._get_danger_vector(self._env_ids) == 0
+        masks[~masks.any(axis=1)] = True
+        return masks
+
+    def _get_danger_vector(self, env_ids):
+        """Calculate for each environment a vector indicating dangerous actions."""
+        danger = np.empty((len(env_ids), 4), dtype=np.float32)
+        head_x = self.head_x[env_ids]
+        head_y = self.head_y[env_ids]
+        for action in range(4):
+            danger[:, action] = self._check_collision(
+                head_x + ACTION_DX[action], head_y + ACTION_DY[action], env_ids
+            )
+        return danger
+
+    def _get_direction(self, env_ids):
+        """Direction channel index computed from the head and the segment behind it (see SnakeEnv._get_direction)"""
+        neck = self._get_neck(env_ids)
+        step_x = self.head_x[env_ids] - neck % self.width
+        step_y = self.head_y[env_ids] - neck // self.width
+        direction = np.full(len(env_ids), -1, dtype=np.int64)
+        direction[step_y > 0] = 0
+        direction[step_y < 0] = 1
+        direction[step_x > 0] = 2
+        direction[step_x < 0] = 3
+        return direction
+
+    def _get_neck(self, env_ids):
+        """Cell of the segment just behind the head."""
+        return self.body[env_ids, (self.body_ptr[env_ids] - 1) % self.num_cells]
+
+    def _get_spatial_channels(self, frame, env_ids):
+        """Write body, head, apple and behind head channels into frame[:, :4] (frame must be zeroed)."""
+        grid = self.grid[env_ids]
+        frame[:, 0] = grid == BODY
+        frame[:, 1] = grid == HEAD
+        frame[:, 2] = grid == FOOD
+
+        neck = self._get_neck(env_ids)
+        frame[np.arange(len(env_ids)), 3, neck // self.width, neck % self.width] = 1
+
+    def _get_features(self, env_ids):
+        """Direction (one-hot), dx, dy to food and danger vector of each environment, shape (n, 10)."""
+        features = np.zeros((len(env_ids), NUM_FEATURES), dtype=np.float32)
+        direction = self._get_direction(env_ids)
+        has_direction = direction >= 0
+        features[np.arange(len(env_ids))[has_direction], direction[has_direction]] = 1
+        dx = (self.food_x[env_ids] - self.head_x[env_ids]) / self.width
+        dy = (self.food_y[env_ids] - self.head_y[env_ids]) / self.height
+        if self.observation_dtype == np.uint8:
+            dx = quantize_direction(dx)
+            dy = quantize_direction(dy)
+        features[:, 4] = dx
+        features[:, 5] = dy
+        features[:, 6:] = self._get_danger_vector(env_ids)
+        return features
+
+    def _update_history(self, env_ids):
+        """Shift the history and write the current state of the selected environments."""
+        if len(env_ids) == self.num_envs:
+            # Whole batch: shift in place and write the new state directly into the history
+            self.history[:, :-1] = self.history[:, 1:]
+            frame = self.history[:, -1]
+            frame[:] = 0
+        else:
+            self.history[env_ids, :-1] = self.history[env_ids, 1:]
+            frame = np.zeros((len(env_ids), self.num_channels, self.height, self.width), dtype=self.observation_dtype)
+
+        self._get_spatial_channels(frame, env_ids)
+        features = self._get_features(env_ids)
+
+        if self.observation_mode == "compact":
+            self.feature_history[env_ids, :-1] = self.feature_history[env_ids, 1:]
+            self.feature_history[env_ids, -1] = features
+        else:
+            frame[:, 4:10] = features[:, :6, None, None]
+            frame[:, 10, 0, :4] = features[:, 6:]
+
+        if len(env_ids) != self.num_envs:
+            self.history[env_ids, -1] = frame
+
+    def _get_combined_observation(self):
+        """Flatten the history of every environment into a vector of size 4400 (for a 10x10 grid), or a dict in compact mode."""
+        if self.observation_mode == "compact":
+            return {
+                "grid": self.history.reshape(self.num_envs, -1, self.height, self.width).copy(),
+                "features": self.feature_history.reshape(self.num_envs, -1).copy(),
+            }
+        return self.history.reshape(self.num_envs, -1).copy()
+
+    def _get_env_observation(self, observations, env_id):
+        """Copy of the observation of one environment from the batched observations."""
+        if self.observation_mode == "compact":
+            return {key: value[env_id].copy() for key, value in observations.items()}
+        return observations[env_id].copy()
@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+# Add parent directory to path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+def test_report_mode_does_not_import_torch():
+    """evaluate_models.py --report reads the cache in milliseconds: importing the script must not load torch."""
+    code = "import sys; sys.path.append(sys.argv[1]); import scripts.evaluate_models; print('torch' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code, parent_path], capture_output=True, text=True, check=True)
+    assert output.stdout.strip().splitlines()[-1] == "False"
+
+def test_episode_end():
+    from scripts.evaluate_models import get_episode_end
+    assert get_episode_end(5, 10, False, False) == (False, False)
+    assert get_episode_end(5, 10, True, False) == (True, False)
+    assert get_episode_end(10, 10, False, False) == (True, True)
+    # Ending the game on the last allowed step still counts as a timeout
+    assert get_episode_end(10, 10, True, False) == (True, True)
+
+def test_play_games_reports_the_episodes_of_play_episodes():
+    """The same policy gets the same apples, steps and timeouts from evaluate_models.py and play_games.py."""
+    from stable_baselines3 import PPO
+    from scripts.evaluate_models import play_episodes
+    from scripts.play_games import play_games
+    from src.rl.snake_env import SnakeEnv
+
+    model = PPO("MlpPolicy", SnakeEnv((6, 6)), seed=0, device="cpu")
+    seeds = list(range(32))
+    # This policy dies within 4 steps: episodes that reach the limit also end on it, the case that differed
+    expected = play_episodes(model, seeds, max_steps=4, grid_size=(6, 6))
+    assert {timeout for _, _, timeout in expected} == {True, False}
+    results, _, _ = play_games(model, num_games=8, episodes_per_game=4, max_steps=4, grid_size=(6, 6))
+    assert [result[1:] for result in results] == expected
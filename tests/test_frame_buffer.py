@@ -0,0 +1,51 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+import torch as th
+
+# Add parent directory to path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+from scripts.train_snake import make_model
+from src.rl.vec_snake_env import VecSnakeEnv
+
+def train_one_rollout(observation_mode, frame_stack_buffer):
+    """PPO after one rollout and one update on a small grid, where episodes end inside the rollout."""
+    env = VecSnakeEnv(4, grid_size=(6, 6), seed=0, observation_mode=observation_mode)
+    model = make_model(env, observation_mode, frame_stack_buffer=frame_stack_buffer, n_steps=64, batch_size=32,
+                       n_epochs=2, seed=0, device="cpu")
+    model.learn(total_timesteps=64 * 4)
+    return model
+
+def assert_tensors_equal(value, expected):
+    if isinstance(expected, dict):
+        assert value.keys() == expected.keys()
+        for key in expected:
+            assert th.equal(value[key], expected[key]), key
+    else:
+        assert th.equal(value, expected)
+
+@pytest.mark.parametrize("observation_mode", ["full", "compact"])
+def test_same_minibatches_and_update_as_rollout_buffer(observation_mode):
+    """FrameStore buffers give the minibatches of the standard rollout buffer, so the update is the same."""
+    expected = train_one_rollout(observation_mode, frame_stack_buffer=False)
+    model = train_one_rollout(observation_mode, frame_stack_buffer=True)
+    assert type(model.rollout_buffer).__name__.startswith("FrameStack")
+    assert model.rollout_buffer.episode_starts[1:].any()
+
+    # Same minibatches (same shuffling) from the rollout left in each buffer
+    np.random.seed(0)
+    expected_batches = list(expected.rollout_buffer.get(32))
+    np.random.seed(0)
+    batches = list(model.rollout_buffer.get(32))
+    assert len(batches) == len(expected_batches)
+    for batch, expected_batch in zip(batches, expected_batches):
+        for field in expected_batch._fields:
+            assert_tensors_equal(getattr(batch, field), getattr(expected_batch, field))
+
+    # Same weights after the update
+    for name, value in expected.policy.state_dict().items():
+        assert th.equal(model.policy.state_dict()[name], value), name
@@ -0,0 +1,78 @@
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+# Add parent directory to path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+from src.core.game import game
+from src.rl.snake_env import SnakeEnv
+
+# (dx, dy) of the actions 0: up, 1: down, 2: left, 3: right
+MOVES = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+
+def reference_collision(g, x, y):
+    """check_collision before the occupancy bitmap: bounds, then a scan of the body list."""
+    if x < 0 or x >= g.width or y < 0 or y >= g.height:
+        return True
+    return [x, y] in list(g.snake)
+
+def reference_danger(g):
+    headx, heady = g.snakehead
+    return np.array([reference_collision(g, headx + dx, heady + dy) for dx, dy in MOVES], dtype=np.float32)
+
+def check_all_cells(g):
+    # Every cell of the board and a ring of cells outside it
+    for x in range(-1, g.width + 1):
+        for y in range(-1, g.height + 1):
+            assert g.check_collision(x, y) == reference_collision(g, x, y), (x, y)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_trajectories(seed):
+    """Random games, mostly safe moves so the snake grows and bends: same collisions and dangers as the list scan."""
+    rng = random.Random(seed)
+    width, height = rng.choice([(6, 6), (8, 5), (10, 10)])
+    env = SnakeEnv((width, height))
+    env.reset(seed=seed)
+    episodes = 0
+    for _ in range(3000):
+        g = env.game
+        check_all_cells(g)
+        danger = env._get_danger_vector().copy()
+        np.testing.assert_array_equal(danger, reference_danger(g))
+
+        safe = [action for action in range(4) if not danger[action]]
+        action = rng.choice(safe) if safe and rng.random() < 0.95 else rng.randrange(4)
+        headx, heady = g.snakehead
+        dx, dy = MOVES[action]
+        expected_over = reference_collision(g, headx + dx, heady + dy)
+
+        _, _, terminated, truncated, _ = env.step(action)
+        if expected_over:
+            assert g.game_over
+        if terminated or truncated:
+            episodes += 1
+            env.reset(seed=seed * 1000 + episodes)
+    assert episodes > 0
+
+def test_tail_cell_is_an_obstacle():
+    """The tail still counts as an obstacle on the step it would move away, as with the list scan."""
+    g = game(5, 5, seed=0)
+    # Head at (2, 2), body going down, left and up: the tail (1, 2) is left of the head
+    g.set_snake([2, 2], [[2, 3], [1, 3], [1, 2]])
+    assert g.check_collision(1, 2) == reference_collision(g, 1, 2) == True
+    g.move(2)
+    assert g.game_over
+
+    # Once the tail has moved on, its old cell is free again
+    g = game(5, 5, seed=0)
+    g.set_snake([2, 2], [[2, 3], [1, 3], [1, 2]])
+    g.food = [4, 4]
+    g.move(0)
+    assert not g.game_over
+    assert g.check_collision(1, 2) == reference_collision(g, 1, 2) == False
+    check_all_cells(g)
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Add parent directory to path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+from scripts.export_policy import collect_observations, predict
+from scripts.train_snake import make_model, make_vec_env
+from src.rl.inference_server import stack_observations
+from src.rl.policy_export import export_policy, load_policy
+
+def count_distinct(observations):
+    if isinstance(observations[0], dict):
+        return len({b"".join(obs[key].tobytes() for key in sorted(obs)) for obs in observations})
+    return len({obs.tobytes() for obs in observations})
+
+@pytest.mark.parametrize("observation_mode, observation_dtype", [
+    ("full", "float32"), ("full", "uint8"), ("compact", "float32"), ("compact", "uint8"),
+])
+def test_slim_policy_matches_sb3(tmp_path, observation_mode, observation_dtype):
+    """The exported policy predicts the actions of model.predict on distinct observations of played episodes."""
+    env = make_vec_env(2, "batched", observation_mode, observation_dtype)
+    model = make_model(env, observation_mode, observation_dtype, n_steps=64, batch_size=64, seed=0, device="cpu")
+    # One update so that the policy is not the initial one
+    model.learn(total_timesteps=128)
+    env.close()
+
+    observations, masks = collect_observations(model, 300)
+    # Each step keeps its own observation: a policy that loops repeats some of them, but views on the
+    # history buffer of SnakeEnv would leave at most 8 distinct ones
+    assert count_distinct(observations) > 100
+
+    policy = export_policy(model, str(tmp_path / "model.policy.pt"))
+    loaded = load_policy(str(tmp_path / "model.policy.pt"))
+    expected = np.array([predict(model, obs, mask)[0] for obs, mask in zip(observations, masks)])
+    for slim in (policy, loaded):
+        single = np.array([predict(slim, obs, mask)[0] for obs, mask in zip(observations, masks)])
+        np.testing.assert_array_equal(single, expected)
+        batch, _ = predict(slim, stack_observations(observations), masks)
+        np.testing.assert_array_equal(batch, predict(model, stack_observations(observations), masks)[0])
@@ -0,0 +1,32 @@
+import os
+import sys
+
+from stable_baselines3 import PPO
+
+# Add parent directory to path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+from scripts.checkpoint_writer import CheckpointWriter
+from scripts.save_callback import SaveAndLogCallback
+from src.rl.vec_snake_env import VecSnakeEnv
+
+def train(tmp_path, telemetry, checkpoints):
+    env = VecSnakeEnv(16, grid_size=(6, 6), seed=0)
+    model = PPO("MlpPolicy", env, n_steps=64, batch_size=256, n_epochs=1, seed=0, device="cpu")
+    callback = SaveAndLogCallback(
+        save_freqs=[1024], save_path=str(tmp_path), verbose=0,
+        telemetry_file=str(tmp_path / "telemetry.jsonl") if telemetry else None,
+        checkpoint_writer=CheckpointWriter(str(tmp_path), verbose=0) if checkpoints else None,
+    )
+    model.learn(total_timesteps=4096, callback=callback)
+    return callback
+
+def test_episode_lists_do_not_grow_without_their_consumer(tmp_path):
+    """Finished episodes are only kept for the telemetry rows and the checkpoint scores that are written."""
+    callback = train(tmp_path, telemetry=False, checkpoints=True)
+    assert callback._finished_lengths == [] and callback._finished_apples == []
+
+    callback = train(tmp_path, telemetry=True, checkpoints=False)
+    assert callback._checkpoint_apples == []
+    assert os.path.exists(tmp_path / "telemetry.jsonl")
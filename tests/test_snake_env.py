@@ -0,0 +1,89 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Add parent directory to path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+from src.rl.snake_env import SnakeEnv, get_grid_size
+
+def copy_observation(observation):
+    if isinstance(observation, dict):
+        return {key: value.copy() for key, value in observation.items()}
+    return observation.copy()
+
+def assert_observations_equal(observation, expected):
+    if isinstance(expected, dict):
+        for key in expected:
+            np.testing.assert_array_equal(observation[key], expected[key])
+    else:
+        np.testing.assert_array_equal(observation, expected)
+
+@pytest.mark.parametrize("observation_mode", ["full", "compact", "egocentric"])
+@pytest.mark.parametrize("observation_dtype", ["float32", "uint8"])
+def test_stored_observations_are_not_overwritten(observation_mode, observation_dtype):
+    """Observations kept by the caller (e.g. collected for a benchmark) stay as returned after later steps and resets."""
+    env = SnakeEnv((8, 6), observation_mode=observation_mode, observation_dtype=observation_dtype)
+    rng = np.random.default_rng(0)
+    obs, _ = env.reset(seed=0)
+    stored = [(obs, copy_observation(obs))]
+    for _ in range(200):
+        obs, _, terminated, truncated, _ = env.step(int(rng.integers(4)))
+        stored.append((obs, copy_observation(obs)))
+        if terminated or truncated:
+            obs, _ = env.reset()
+            stored.append((obs, copy_observation(obs)))
+    for obs, expected in stored:
+        assert_observations_equal(obs, expected)
+
+def test_views_without_copy():
+    """copy_observations=False returns views on the history buffer (the zero-copy path of the vectorized envs)."""
+    env = SnakeEnv(copy_observations=False)
+    obs, _ = env.reset(seed=0)
+    assert np.shares_memory(obs, env.history)
+    env = SnakeEnv()
+    obs, _ = env.reset(seed=0)
+    assert not np.shares_memory(obs, env.history)
+
+@pytest.mark.parametrize("observation_mode", ["full", "compact", "egocentric"])
+@pytest.mark.parametrize("observation_dtype", ["float32", "uint8"])
+def test_won_game_without_food(observation_mode, observation_dtype):
+    """Eating the last apple fills the grid: the game is won and the observation encodes dx = dy = 0."""
+    env = SnakeEnv((4, 2), observation_mode=observation_mode, observation_dtype=observation_dtype, window_size=3)
+    env.reset(seed=0)
+    # Head at (0, 0), body filling the grid except (1, 0), where the food is placed
+    env.game.set_snake([0, 0], [[0, 1], [1, 1], [2, 1], [3, 1], [3, 0], [2, 0]])
+    env.game.update_snake()
+    env.previous_food_eaten = len(env.game.snake)
+    assert env.game.food == [1, 0]
+
+    obs, reward, terminated, truncated, info = env.step(3)
+    assert env.game.win and env.game.food is None
+    assert terminated and info["apples_eaten"] == 1
+    # +50 for the apple, -10 for the end of the game, as in VecSnakeEnv
+    assert reward == pytest.approx(50 - 0.001 - 10)
+
+    features = env._get_features()
+    zero = 128 if observation_dtype == "uint8" else 0
+    assert features[4] == zero and features[5] == zero
+    if observation_mode == "full":
+        # dx and dy planes of the newest state
+        newest = obs.reshape(4, 11, 2, 4)[-1]
+        assert (newest[8] == zero).all() and (newest[9] == zero).all()
+    else:
+        np.testing.assert_array_equal(obs["features"][-env.num_features:], features)
+
+@pytest.mark.parametrize("observation_mode", ["full", "compact"])
+def test_grid_size_of_observation_space(observation_mode):
+    """The grid of a space is recovered, a full observation of a non-square grid asks for it instead of guessing."""
+    assert get_grid_size(SnakeEnv((6, 6), observation_mode=observation_mode).observation_space) == (6, 6)
+    space = SnakeEnv((8, 5), observation_mode=observation_mode).observation_space
+    if observation_mode == "compact":
+        assert get_grid_size(space) == (8, 5)
+    else:
+        with pytest.raises(ValueError):
+            get_grid_size(space)
+    assert get_grid_size(SnakeEnv((8, 5), observation_mode="egocentric").observation_space) is None
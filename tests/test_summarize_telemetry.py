@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+from scripts.summarize_telemetry import summarize
+
+def make_row(num_timesteps, update_seconds, rss_mb=100.0):
+    return {"num_timesteps": num_timesteps, "steps": 1000, "collect_seconds": 1.0, "update_seconds": update_seconds,
+            "episodes": 10, "mean_episode_length": 50.0, "mean_apples": 2.0, "rss_mb": rss_mb}
+
+def test_last_rollout_without_update_time_is_left_out_of_the_throughput():
+    """The final rollout has no update time, counting it as pure collection would inflate the last window."""
+    rows = [make_row(1000, 1.0), make_row(2000, 1.0), make_row(3000, 1.0), make_row(4000, None, rss_mb=None)]
+    summary = summarize(rows, 2000)
+    assert [window["steps_per_second"] for window in summary] == pytest.approx([500.0, 500.0])
+    assert [window["collect_share"] for window in summary] == pytest.approx([0.5, 0.5])
+    # Its episodes and memory still count
+    assert summary[-1]["end"] == 4000 and summary[-1]["rss_mb"] == 100.0
+
+    summary = summarize([make_row(1000, None)], 1000)
+    assert summary[0]["steps_per_second"] is None and summary[0]["collect_share"] is None
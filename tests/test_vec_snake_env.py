@@ -0,0 +1,101 @@
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+# Add parent directory to path
+parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_path)
+
+from src.rl.snake_env import SnakeEnv
+from src.rl.vec_snake_env import EMPTY, FOOD, VecSnakeEnv
+
+# Non-square, so that a swapped width and height shows up
+GRID_SIZE = (7, 5)
+
+class ChosenFoodVecSnakeEnv(VecSnakeEnv):
+    """VecSnakeEnv placing the food of environment i with choosers[i], like the matching SnakeEnv."""
+
+    def __init__(self, choosers, *args, **kwargs):
+        self.choosers = choosers
+        super().__init__(len(choosers), *args, **kwargs)
+
+    def _place_food(self, env_ids):
+        has_room = []
+        for env_id in env_ids:
+            free = np.flatnonzero(self.grid[env_id] == EMPTY)
+            has_room.append(len(free) > 0)
+            if len(free):
+                cell = free[self.choosers[env_id].randrange(len(free))]
+                self.food_x[env_id], self.food_y[env_id] = cell % self.width, cell // self.width
+                self.grid[env_id, self.food_y[env_id], self.food_x[env_id]] = FOOD
+        return np.array(has_room, dtype=bool)
+
+def choose_food(env, chooser):
+    """Place the food of a SnakeEnv with chooser, on the free cell of the same rank as ChosenFoodVecSnakeEnv."""
+    g = env.game
+    place_food = g.place_food
+
+    def _place_food():
+        if not g.free_cells:
+            return place_food()
+        free = sorted(g.free_cells)
+        cell = free[chooser.randrange(len(free))]
+        g.food = [cell % g.width, cell // g.width]
+    g.place_food = _place_food
+
+def assert_observations_equal(observation, expected):
+    if isinstance(expected, dict):
+        assert observation.keys() == expected.keys()
+        for key in expected:
+            np.testing.assert_array_equal(observation[key], expected[key])
+    else:
+        np.testing.assert_array_equal(observation, expected)
+
+def get_env_observation(observations, index):
+    if isinstance(observations, dict):
+        return {key: value[index] for key, value in observations.items()}
+    return observations[index]
+
+@pytest.mark.parametrize("observation_mode", ["full", "compact"])
+@pytest.mark.parametrize("observation_dtype", ["float32", "uint8"])
+def test_same_steps_as_snake_env(observation_mode, observation_dtype):
+    """With the same food positions, VecSnakeEnv gives the observations, rewards, dones and masks of SnakeEnv."""
+    num_envs = 4
+    rng = random.Random(0)
+    vec_env = ChosenFoodVecSnakeEnv([random.Random(i) for i in range(num_envs)], GRID_SIZE,
+                                    observation_mode=observation_mode, observation_dtype=observation_dtype)
+    envs = []
+    for i in range(num_envs):
+        env = SnakeEnv(GRID_SIZE, observation_mode=observation_mode, observation_dtype=observation_dtype)
+        choose_food(env, random.Random(i))
+        envs.append(env)
+
+    observations = vec_env.reset()
+    for i, env in enumerate(envs):
+        assert_observations_equal(get_env_observation(observations, i), env.reset()[0])
+
+    episodes = apples = 0
+    for _ in range(1500):
+        masks = vec_env.action_masks()
+        for i, env in enumerate(envs):
+            np.testing.assert_array_equal(masks[i], env.action_masks())
+        # Mostly allowed moves, so that the snakes grow and the games last
+        actions = [rng.choice(np.flatnonzero(mask)) if rng.random() < 0.9 else rng.randrange(4) for mask in masks]
+
+        observations, rewards, dones, infos = vec_env.step(np.array(actions))
+        for i, env in enumerate(envs):
+            obs, reward, terminated, truncated, info = env.step(int(actions[i]))
+            assert rewards[i] == pytest.approx(reward, abs=1e-5)
+            assert dones[i] == (terminated or truncated)
+            assert infos[i]["apples_eaten"] == info["apples_eaten"]
+            if dones[i]:
+                episodes += 1
+                apples += info["apples_eaten"]
+                assert_observations_equal(infos[i]["terminal_observation"], obs)
+                obs, _ = env.reset()
+            assert_observations_equal(get_env_observation(observations, i), obs)
+    # The trajectories went through the interesting cases
+    assert episodes > 10 and apples > 10